@@ -1,24 +1,86 @@
 import sys
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
 import fire
 from loguru import logger
 
 from ktoolbox import __version__
 from ktoolbox.cli import KToolBoxCli
-from ktoolbox.utils import logger_init, uvloop_init
+from ktoolbox.monitor import tracer, profiler
+from ktoolbox.utils import logger_init, uvloop_init, generate_msg
+
+
+def pop_option(argv: List[str], name: str, flag: bool = False) -> Tuple[List[str], Union[str, bool, None]]:
+    """
+    Take a global option out of command line arguments
+
+    :param argv: Command line arguments
+    :param name: Option name, e.g. ``--trace``
+    :param flag: Option has no value, e.g. ``--profile-memory``
+    :return: Remaining arguments, and the option value (``True`` for flag) or ``None`` if not given
+    """
+    for i, arg in enumerate(argv):
+        if arg == name:
+            if flag:
+                return argv[:i] + argv[i + 1:], True
+            if i + 1 < len(argv):
+                return argv[:i] + argv[i + 2:], argv[i + 1]
+        elif not flag and arg.startswith(f"{name}="):
+            return argv[:i] + argv[i + 1:], arg[len(name) + 1:]
+    return argv, None
+
+
+def _write_reports(trace_path: Optional[Path], profile_path: Optional[Path]):
+    """Stop tracer and profiler, and write their reports"""
+    if trace_path:
+        tracer.stop()
+        try:
+            tracer.write(trace_path)
+        except OSError as e:
+            logger.error(generate_msg("Failed to write trace file", path=trace_path, exception=e))
+        else:
+            logger.info(f"Trace written to {trace_path}, stage summary:\n{tracer.format_summary()}")
+    if profile_path:
+        profiler.stop()
+        try:
+            profiler.write(profile_path)
+        except OSError as e:
+            logger.error(generate_msg("Failed to write profile", path=profile_path, exception=e))
+        else:
+            logger.info(f"Profile written to {profile_path}, report written to {profile_path}.txt")
 
 
 def main():
+    trace_path = None
+    profile_path = None
     try:
         # Handle -v flag before Fire takes over
         if len(sys.argv) > 1 and sys.argv[1] in ['-v', '--version']:
             print(__version__)
             return
-            
+
+        # Handle global options before Fire takes over, they work for every command
+        argv, trace = pop_option(sys.argv[1:], "--trace")
+        argv, profile = pop_option(argv, "--profile")
+        argv, profile_memory = pop_option(argv, "--profile-memory", flag=True)
+        sys.argv[1:] = argv
+        trace_path = Path(trace) if trace else None
+        profile_path = Path(profile) if profile else None
+
         logger_init(cli_use=True)
         uvloop_init()
+        if profile_memory and not profile_path:
+            logger.warning("--profile-memory is ignored without --profile")
+        if trace_path:
+            tracer.start()
+        if profile_path:
+            profiler.start(memory=bool(profile_memory))
         fire.Fire(KToolBoxCli)
     except KeyboardInterrupt:
         logger.error("KToolBox was interrupted by the user")
+    finally:
+        _write_reports(trace_path, profile_path)
 
 
 if __name__ == "__main__":
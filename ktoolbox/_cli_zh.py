@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Union, overload
+from typing import Union, overload, Tuple
 
 import ktoolbox.cli
 
@@ -174,7 +174,10 @@ class KToolBoxCli(ktoolbox.cli.KToolBoxCli):
             start_time: str = None,
             end_time: str = None,
             keywords: str = None,
-            keywords_exclude: str = None
+            keywords_exclude: str = None,
+            preflight: bool = False,
+            dry_run: bool = False,
+            force: bool = False
     ):
         """
         同步创作者所有帖子（通过 URL）
@@ -187,6 +190,9 @@ class KToolBoxCli(ktoolbox.cli.KToolBoxCli):
         :param end_time: 帖子发布时间范围结束
         :param keywords: 按标题过滤帖子，逗号分隔关键词
         :param keywords_exclude: 按标题排除帖子，逗号分隔关键词
+        :param preflight: 下载前探测文件大小，按 ``min_file_size`` 和 ``max_file_size`` 过滤文件，并显示包含总大小和预计耗时的计划
+        :param dry_run: 仅显示预检计划，不下载，也不向下载路径写入任何内容
+        :param force: 即使创作者自上次成功同步（相同选项）后没有更新，也进行同步
         """
         ...
 
@@ -202,7 +208,10 @@ class KToolBoxCli(ktoolbox.cli.KToolBoxCli):
             start_time: str = None,
             end_time: str = None,
             keywords: str = None,
-            keywords_exclude: str = None
+            keywords_exclude: str = None,
+            preflight: bool = False,
+            dry_run: bool = False,
+            force: bool = False
     ):
         """
         同步创作者所有帖子（通过参数）
@@ -216,6 +225,9 @@ class KToolBoxCli(ktoolbox.cli.KToolBoxCli):
         :param end_time: 帖子发布时间范围结束
         :param keywords: 按标题过滤帖子，逗号分隔关键词
         :param keywords_exclude: 按标题排除帖子，逗号分隔关键词
+        :param preflight: 下载前探测文件大小，按 ``min_file_size`` 和 ``max_file_size`` 过滤文件，并显示包含总大小和预计耗时的计划
+        :param dry_run: 仅显示预检计划，不下载，也不向下载路径写入任何内容
+        :param force: 即使创作者自上次成功同步（相同选项）后没有更新，也进行同步
         """
         ...
 
@@ -233,7 +245,10 @@ class KToolBoxCli(ktoolbox.cli.KToolBoxCli):
             offset: int = 0,
             length: int = None,
             keywords: str = None,
-            keywords_exclude: str = None
+            keywords_exclude: str = None,
+            preflight: bool = False,
+            dry_run: bool = False,
+            force: bool = False
     ):
         """
         同步创作者所有帖子
@@ -254,6 +269,9 @@ class KToolBoxCli(ktoolbox.cli.KToolBoxCli):
         :param length: 获取帖子数量，默认为全部
         :param keywords: 按标题过滤帖子，逗号分隔关键词
         :param keywords_exclude: 按标题排除帖子，逗号分隔关键词
+        :param preflight: 下载前探测文件大小，按 ``min_file_size`` 和 ``max_file_size`` 过滤文件，并显示包含总大小和预计耗时的计划
+        :param dry_run: 仅显示预检计划，不下载，也不向下载路径写入任何内容
+        :param force: 即使创作者自上次成功同步（相同选项）后没有更新，也进行同步
         """
         return await super().sync_creator(
             url=url,
@@ -267,5 +285,62 @@ class KToolBoxCli(ktoolbox.cli.KToolBoxCli):
             offset=offset,
             length=length,
             keywords=keywords,
-            keywords_exclude=keywords_exclude
+            keywords_exclude=keywords_exclude,
+            preflight=preflight,
+            dry_run=dry_run,
+            force=force
+        )
+
+    @staticmethod
+    async def bucket_gc(*, dry_run: bool = False, workers: int = 8):
+        """
+        删除存储桶中不再被任何已下载文件引用的文件
+
+        与下载路径中的文件存在硬链接，或记录在存储桶索引中且下载路径中的文件仍存在的，将被保留。
+
+        :param dry_run: 仅报告将被删除的文件
+        :param workers: 扫描存储桶的线程数
+        """
+        return await super().bucket_gc(dry_run=dry_run, workers=workers)
+
+    @staticmethod
+    async def bucket_verify(*, workers: int = 4):
+        """
+        根据文件名中的 SHA-256 哈希值校验存储桶中的文件
+
+        损坏的文件将在存储桶索引中被标记，并会被重新下载。
+
+        :param workers: 计算哈希的线程数
+        """
+        return await super().bucket_verify(workers=workers)
+
+    @staticmethod
+    async def bench(
+            scenarios: Tuple[str] = None,
+            *,
+            output: Path = None,
+            baseline: Path = None,
+            tolerance: float = 0.1,
+            scale: float = 1.0
+    ):
+        """
+        在本地模拟服务器上对完整的 ``sync_creator`` 工作负载进行基准测试
+
+        报告每个场景的 文件/秒、MB/秒、API 调用/秒、CPU 时间、峰值 RSS 和事件循环延迟。\
+        若任一指标相比 ``baseline`` 出现退化，则以退出码 1 退出。
+
+        * 场景：``tiny-images``、``huge-videos``、``high-error-rate``、``mostly-existing``
+
+        :param scenarios: 要运行的场景，以逗号分隔，默认运行所有场景
+        :param output: 将结果写入 JSON 文件
+        :param baseline: 用于对比的历史结果 JSON 文件
+        :param tolerance: 相比 ``baseline`` 允许的相对退化幅度，例如 ``0.1`` 表示 10%
+        :param scale: 缩放场景的作品数量，例如 ``0.1`` 用于快速运行
+        """
+        return await super().bench(
+            scenarios,
+            output=output,
+            baseline=baseline,
+            tolerance=tolerance,
+            scale=scale
         )
@@ -38,4 +38,6 @@ class DataStorageNameEnum(Enum):
     PostData = "post.json"
     CreatorIndicesData = "creator-indices.ktoolbox"
     JobListData = "job-list.ktoolbox"
+    PreflightCacheData = "preflight-cache.ktoolbox"
+    SyncStateData = "sync-state.ktoolbox"
     LogData = "ktoolbox.log"
@@ -1,5 +1,7 @@
 from .base import *
 from .fetch import *
+from .filter import *
 from .job import *
 from .search import *
+from .template import *
 from .utils import *
@@ -1,11 +1,20 @@
-from typing import AsyncGenerator, List, Any
+from datetime import datetime
+from typing import AsyncGenerator, List, Any, Iterable, Dict
+
+from loguru import logger
 
 from ktoolbox.api.model import Post
 from ktoolbox.api.posts import get_creator_post
-from ktoolbox.api.utils import SEARCH_STEP
-from ktoolbox.utils import BaseRet
+from ktoolbox.api.utils import SEARCH_STEP, SEARCH_QUERY_MIN_LENGTH
+from ktoolbox.monitor import tracer
+from ktoolbox.utils import BaseRet, generate_msg
 
-__all__ = ["FetchInterruptError", "fetch_creator_posts"]
+__all__ = [
+    "FetchInterruptError",
+    "fetch_creator_posts",
+    "can_search_keywords_on_server",
+    "fetch_creator_posts_by_keywords"
+]
 
 
 class FetchInterruptError(Exception):
@@ -16,18 +25,25 @@ class FetchInterruptError(Exception):
         self.ret = ret
 
 
-async def fetch_creator_posts(service: str, creator_id: str, o: int = 0) -> AsyncGenerator[List[Post], Any]:
+async def fetch_creator_posts(
+        service: str,
+        creator_id: str,
+        o: int = 0,
+        q: str = None
+) -> AsyncGenerator[List[Post], Any]:
     """
     Fetch posts from a creator
 
     :param service: The service where the post is located
     :param creator_id: The ID of the creator
     :param o: Result offset, stepping of 50 is enforced
+    :param q: Search query
     :return: Async generator of several list of posts
     :raise FetchInterruptError: Exception for interrupt of data fetching
     """
     while True:
-        ret = await get_creator_post(service=service, creator_id=creator_id, o=o)
+        with tracer.span("fetch_creator_posts", o=o):
+            ret = await get_creator_post(service=service, creator_id=creator_id, q=q, o=o)
         if ret:
             yield ret.data
             if len(ret.data) < SEARCH_STEP:
@@ -36,3 +52,45 @@ async def fetch_creator_posts(service: str, creator_id: str, o: int = 0) -> Asyn
                 o += SEARCH_STEP
         else:
             raise FetchInterruptError(ret=ret)
+
+
+def can_search_keywords_on_server(keywords: Iterable[str]) -> bool:
+    """
+    Check if every keyword can be sent as a server-side search query
+
+    :param keywords: Keywords to search
+    """
+    keywords = list(keywords)
+    return bool(keywords) and all(len(x.strip()) >= SEARCH_QUERY_MIN_LENGTH for x in keywords)
+
+
+async def fetch_creator_posts_by_keywords(service: str, creator_id: str, keywords: Iterable[str]) -> List[Post]:
+    """
+    Fetch posts from a creator with one server-side search query (``q``) for each keyword
+
+    Results of all queries are deduplicated by post ID and sorted by publish date (newest first), \
+    same as the order of a full listing. The server search is not guaranteed to have the same \
+    semantics as local keyword filtering, so the result should still be filtered locally.
+
+    :param service: The service where the post is located
+    :param creator_id: The ID of the creator
+    :param keywords: Keywords to search
+    :return: List of posts
+    :raise FetchInterruptError: Exception for interrupt of data fetching
+    """
+    posts: Dict[str, Post] = {}
+    for keyword in sorted(set(keywords)):
+        page_count = 0
+        async for part in fetch_creator_posts(service=service, creator_id=creator_id, q=keyword.strip()):
+            page_count += 1
+            for post in part:
+                posts.setdefault(post.id, post)
+        logger.debug(
+            generate_msg(
+                "Fetched posts by server-side search",
+                keyword=keyword,
+                pages=page_count,
+                total_posts=len(posts)
+            )
+        )
+    return sorted(posts.values(), key=lambda x: x.published or x.added or datetime.min, reverse=True)
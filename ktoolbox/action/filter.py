@@ -0,0 +1,166 @@
+import os
+import re
+from fnmatch import translate
+from functools import lru_cache
+from typing import Iterable, Optional, FrozenSet, Literal, Pattern, Tuple
+
+from ktoolbox.configuration import config
+
+__all__ = ["KeywordMatchMode", "GlobSet", "FilenameFilter", "KeywordMatcher"]
+
+KeywordMatchMode = Literal["substring", "word", "regex"]
+
+_GLOB_META = frozenset("*?[")
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """
+    Build a regex alternation of literal words, factored by common prefixes.
+
+    ``re`` tries alternatives one by one at each position, so sharing prefixes
+    keeps a large keyword set close to a single pass over the text.
+
+    :param words: Literal words, must not be empty strings
+    :return: Regex source
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if "" in node:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+
+class GlobSet:
+    """
+    A set of Unix shell-style patterns compiled for matching in one pass,
+    same semantics as ``fnmatch.fnmatch`` against each pattern.
+
+    - Patterns without wildcards are matched by set lookup
+    - Patterns like ``*.png`` are matched by ``str.endswith``
+    - The others are translated and combined into one regex
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        names = set()
+        suffixes = set()
+        regex_patterns = []
+        for pattern in patterns:
+            pattern = os.path.normcase(pattern)
+            if not _GLOB_META.intersection(pattern):
+                names.add(pattern)
+            elif pattern.startswith("*") and not _GLOB_META.intersection(pattern[1:]):
+                suffixes.add(pattern[1:])
+            else:
+                regex_patterns.append(pattern)
+        self._names: FrozenSet[str] = frozenset(names)
+        self._suffixes: Tuple[str, ...] = tuple(sorted(suffixes))
+        self._regex: Optional[Pattern[str]] = re.compile(
+            "|".join(f"(?:{translate(x)})" for x in regex_patterns)
+        ) if regex_patterns else None
+        self._empty = not (names or suffixes or regex_patterns)
+
+    def __bool__(self):
+        return not self._empty
+
+    def match(self, name: str) -> bool:
+        """Check if ``name`` matches any of the patterns"""
+        name = os.path.normcase(name)
+        return (
+                name in self._names
+                or (bool(self._suffixes) and name.endswith(self._suffixes))
+                or (self._regex is not None and self._regex.match(name) is not None)
+        )
+
+
+class FilenameFilter:
+    """
+    Reusable predicate for ``JobConfiguration.allow_list`` and ``JobConfiguration.block_list``
+
+    A filename passes if it matches the allow list (or the allow list is empty)
+    and doesn't match the block list.
+    """
+
+    def __init__(self, allow_list: Iterable[str] = (), block_list: Iterable[str] = ()):
+        self._allow = GlobSet(allow_list)
+        self._block = GlobSet(block_list)
+
+    def __call__(self, filename: str) -> bool:
+        return (not self._allow or self._allow.match(filename)) and not self._block.match(filename)
+
+    @classmethod
+    def from_config(cls) -> "FilenameFilter":
+        """Get the compiled filter of current configuration, compiled once for the same lists"""
+        return _compile_filename_filter(frozenset(config.job.allow_list), frozenset(config.job.block_list))
+
+
+class KeywordMatcher:
+    """
+    Reusable predicate for matching text against a set of keywords (case-insensitive)
+
+    - ``substring``: Match if any keyword is a substring of the text
+    - ``word``: Match if any keyword appears as a whole word in the text
+    - ``regex``: Keywords are regex patterns, match if any of them is found in the text
+    """
+
+    def __init__(self, keywords: Iterable[str] = (), mode: KeywordMatchMode = "substring"):
+        keywords = set(keywords)
+        self._mode = mode
+        self._empty = not keywords
+        self._always = False
+        self._regex: Optional[Pattern[str]] = None
+        if not keywords:
+            return
+        if mode == "regex":
+            self._regex = re.compile("|".join(f"(?:{x})" for x in sorted(keywords)), re.IGNORECASE)
+        else:
+            words = {x.lower() for x in keywords}
+            if "" in words:
+                self._always = True
+                return
+            pattern = _trie_pattern(words)
+            if mode == "word":
+                pattern = rf"(?<!\w)(?:{pattern})(?!\w)"
+            self._regex = re.compile(pattern)
+
+    def __bool__(self):
+        return not self._empty
+
+    def __call__(self, text: Optional[str]) -> bool:
+        """
+        Check if the text matches any keyword
+
+        Always ``True`` if there is no keyword.
+        """
+        if self._empty or self._always:
+            return True
+        text = text or ""
+        if self._mode != "regex":
+            text = text.lower()
+        return self._regex.search(text) is not None
+
+    @classmethod
+    def from_keywords(cls, keywords: Optional[Iterable[str]]) -> "KeywordMatcher":
+        """Get the compiled matcher of keywords with ``JobConfiguration.keywords_match_mode``"""
+        return _compile_keyword_matcher(frozenset(keywords or ()), config.job.keywords_match_mode)
+
+
+@lru_cache(maxsize=32)
+def _compile_filename_filter(allow_list: FrozenSet[str], block_list: FrozenSet[str]) -> FilenameFilter:
+    return FilenameFilter(allow_list, block_list)
+
+
+@lru_cache(maxsize=32)
+def _compile_keyword_matcher(keywords: FrozenSet[str], mode: KeywordMatchMode) -> KeywordMatcher:
+    return KeywordMatcher(keywords, mode)
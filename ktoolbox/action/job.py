@@ -1,8 +1,9 @@
+import asyncio
 from datetime import datetime
-from fnmatch import fnmatch
+from functools import partial
 from itertools import count
 from pathlib import Path
-from typing import List, Union, Optional, Set
+from typing import List, Union, Optional, Set, Dict
 from urllib.parse import urlparse
 
 import aiofiles
@@ -10,24 +11,58 @@ from loguru import logger
 from pathvalidate import sanitize_filename, is_valid_filename
 
 from ktoolbox._enum import PostFileTypeEnum, DataStorageNameEnum
-from ktoolbox.action import ActionRet, fetch_creator_posts, FetchInterruptError
+from ktoolbox.action import ActionRet, fetch_creator_posts, FetchInterruptError, FilenameFilter, \
+    can_search_keywords_on_server, fetch_creator_posts_by_keywords
 from ktoolbox.action.utils import generate_post_path_name, filter_posts_by_date, generate_filename, \
-    filter_posts_by_keywords, filter_posts_by_keywords_exclude, generate_grouped_post_path, extract_content_images
+    filter_posts_by_keywords, filter_posts_by_keywords_exclude, generate_grouped_post_path, extract_post_content, \
+    extract_post_contents, ContentExtraction
 from ktoolbox.api.model import Post, Attachment, Revision
 from ktoolbox.api.posts import get_post_revisions as get_post_revisions_api, get_post as get_post_api
 from ktoolbox.configuration import config
+from ktoolbox.filesystem import fs_executor
 from ktoolbox.job import Job, CreatorIndices
-from ktoolbox.utils import extract_external_links, generate_msg
+from ktoolbox.monitor import traced, profiler
+from ktoolbox.utils import generate_msg
 
 __all__ = ["create_job_from_post", "create_job_from_creator"]
 
 
+async def _fetch_post_content(post: Union[Post, Revision]) -> Union[Post, Revision]:
+    """
+    Fetch the full post data with content from get_post API
+
+    :raise FetchInterruptError: If fetching post content fails
+    """
+    get_post_ret = await get_post_api(
+        service=post.service,
+        creator_id=post.user,
+        post_id=post.id,
+        revision_id=post.revision_id if isinstance(post, Revision) else None
+    )
+    if not get_post_ret:
+        logger.error(
+            generate_msg(
+                "Failed to fetch post content",
+                post_name=post.title or "Unknown",
+                post_id=post.id,
+                creator_id=post.user,
+                service=post.service
+            )
+        )
+        raise FetchInterruptError(ret=get_post_ret)
+    return get_post_ret.data.post
+
+
+@traced()
 async def create_job_from_post(
         post: Union[Post, Revision],
         post_path: Path,
         *,
         post_dir: bool = True,
-        dump_post_data: bool = True
+        dump_post_data: bool = True,
+        write_files: bool = True,
+        full_post: Optional[Union[Post, Revision]] = None,
+        extraction: Optional[ContentExtraction] = None
 ) -> List[Job]:
     """
     Create a list of download job from a post data
@@ -36,30 +71,39 @@ async def create_job_from_post(
     :param post_path: Path of the post directory, which needs to be sanitized
     :param post_dir: Whether to create post directory
     :param dump_post_data: Whether to dump post data (post.json) in post directory
+    :param write_files: Whether to create directories and write post data, content and external links files. \
+    Set to ``False`` for only planning jobs (e.g. dry run)
+    :param full_post: Post data with content fetched in advance, used if ``post`` has no content
+    :param extraction: Extraction of the content done in advance, e.g. by ``extract_post_contents``
     :raise FetchInterruptError: If fetching post content fails
     """
-    post_path.mkdir(parents=True, exist_ok=True)
+    mkdir_calls = [partial(post_path.mkdir, parents=True, exist_ok=True)]
 
     # Load ``PostStructureConfiguration``
     if post_dir:
         attachments_path = post_path / config.job.post_structure.attachments  # attachments
-        attachments_path.mkdir(exist_ok=True)
         content_path = post_path / config.job.post_structure.content  # content
-        content_path.parent.mkdir(exist_ok=True)
         external_links_path = post_path / config.job.post_structure.external_links  # external_links
-        external_links_path.parent.mkdir(exist_ok=True)
+        mkdir_calls += [
+            partial(attachments_path.mkdir, exist_ok=True),
+            partial(content_path.parent.mkdir, exist_ok=True),
+            partial(external_links_path.parent.mkdir, exist_ok=True)
+        ]
     else:
         attachments_path = post_path
         content_path = None
         external_links_path = None
+    if write_files:
+        await fs_executor.batch("mkdir", *mkdir_calls)
 
-    if dump_post_data:
+    if dump_post_data and write_files:
         async with aiofiles.open(str(post_path / DataStorageNameEnum.PostData.value), "w", encoding="utf-8") as f:
             await f.write(
                 post.model_dump_json(indent=config.json_dump_indent)
             )
 
     # Filter and create jobs for ``Post.attachment``
+    file_filter = FilenameFilter.from_config()
     jobs: List[Job] = []
     sequential_counter = 1  # Counter for sequential filenames
     if config.job.download_attachments:
@@ -69,17 +113,7 @@ async def create_job_from_post(
             file_path_obj = Path(attachment.name) if is_valid_filename(attachment.name) else Path(
                 urlparse(attachment.path).path
             )
-            if (not config.job.allow_list or any(
-                    map(
-                        lambda x: fnmatch(file_path_obj.name, x),
-                        config.job.allow_list
-                    )
-            )) and not any(
-                map(
-                    lambda x: fnmatch(file_path_obj.name, x),
-                    config.job.block_list
-                )
-            ):
+            if file_filter(file_path_obj.name):
                 # Check if file extension should be excluded from sequential naming
                 should_use_sequential = (config.job.sequential_filename and
                                          file_path_obj.suffix.lower() not in config.job.sequential_filename_excludes)
@@ -105,17 +139,7 @@ async def create_job_from_post(
             urlparse(post.file.path).path
         )
         post_file_name = Path(generate_filename(post, post_file_name.name, config.job.post_structure.file))
-        if (not config.job.allow_list or any(
-                map(
-                    lambda x: fnmatch(post_file_name.name, x),
-                    config.job.allow_list
-                )
-        )) and not any(
-            map(
-                lambda x: fnmatch(post_file_name.name, x),
-                config.job.block_list
-            )
-        ):
+        if file_filter(post_file_name.name):
             jobs.append(
                 Job(
                     path=post_path,
@@ -131,46 +155,33 @@ async def create_job_from_post(
     ):
         # If post has no content, fetch it from get_post API
         if not post.content:
-            get_post_ret = await get_post_api(
-                service=post.service,
-                creator_id=post.user,
-                post_id=post.id,
-                revision_id=post.revision_id if isinstance(post, Revision) else None
-            )
-            if get_post_ret:
-                post = get_post_ret.data.post
-            else:
-                logger.error(
-                    generate_msg(
-                        "Failed to fetch post content",
-                        post_name=post.title or "Unknown",
-                        post_id=post.id,
-                        creator_id=post.user,
-                        service=post.service
-                    )
-                )
-                raise FetchInterruptError(ret=get_post_ret)
+            post = full_post or await _fetch_post_content(post)
 
         # If post content is still empty, skip content extraction
         if post.content:
             # Write content file
-            if config.job.extract_content:
+            if config.job.extract_content and write_files:
                 async with aiofiles.open(content_path, "w", encoding=config.downloader.encoding) as f:
                     await f.write(post.content)
 
-            # Extract and write external links file
-            if config.job.extract_external_links:
-                external_links = extract_external_links(post.content, config.job.external_link_patterns)
-                if external_links:
-                    async with aiofiles.open(external_links_path, "w", encoding=config.downloader.encoding) as f:
-                        # Write each link on a separate line
-                        for link in sorted(external_links):
-                            await f.write(f"{link}\n")
+            # Extract content images and external links in one pass
+            if extraction is None:
+                extraction = extract_post_content(
+                    post.content,
+                    config.job.external_link_patterns if config.job.extract_external_links else None,
+                    parse_html=config.job.extract_content_images
+                )
+
+            # Write external links file
+            if config.job.extract_external_links and extraction.external_links and write_files:
+                async with aiofiles.open(external_links_path, "w", encoding=config.downloader.encoding) as f:
+                    # Write each link on a separate line
+                    for link in sorted(extraction.external_links):
+                        await f.write(f"{link}\n")
 
             # Extract content images
             if config.job.extract_content_images:
-                content_image_sources = extract_content_images(post.content)
-                for image_src in content_image_sources:
+                for image_src in extraction.image_sources:
                     if not image_src or not image_src.strip():
                         continue
 
@@ -200,17 +211,7 @@ async def create_job_from_post(
 
                     alt_filename = generate_filename(post, basic_filename, config.job.filename_format)
 
-                    if (not config.job.allow_list or any(
-                            map(
-                                lambda x: fnmatch(alt_filename, x),
-                                config.job.allow_list
-                            )
-                    )) and not any(
-                        map(
-                            lambda x: fnmatch(alt_filename, x),
-                            config.job.block_list
-                        )
-                    ):
+                    if file_filter(alt_filename):
                         # Regenerate filename with correct counter
                         should_use_sequential = (config.job.sequential_filename and
                                                  image_file_path.suffix.lower() not in config.job.sequential_filename_excludes)
@@ -231,6 +232,7 @@ async def create_job_from_post(
     return jobs
 
 
+@traced()
 async def create_job_from_creator(
         service: str,
         creator_id: str,
@@ -244,7 +246,8 @@ async def create_job_from_creator(
         start_time: Optional[datetime],
         end_time: Optional[datetime],
         keywords: Optional[Set[str]] = None,
-        keywords_exclude: Optional[Set[str]] = None
+        keywords_exclude: Optional[Set[str]] = None,
+        write_files: bool = True
 ) -> ActionRet[List[Job]]:
     """
     Create a list of download job from a creator
@@ -262,6 +265,8 @@ async def create_job_from_creator(
     :param end_time: End time of the time range
     :param keywords: Set of keywords to filter posts by title (case-insensitive)
     :param keywords_exclude: Set of keywords to exclude posts by title (case-insensitive)
+    :param write_files: Whether to write ``CreatorIndices`` and files of posts, \
+    see ``create_job_from_post``. Set to ``False`` for only planning jobs (e.g. dry run)
     """
     mix_posts = config.job.mix_posts if mix_posts is None else mix_posts
 
@@ -275,25 +280,44 @@ async def create_job_from_creator(
         page_num = length // 50 + 1
         page_counter = iter(range(page_num))
 
+    # Push keywords down to server-side search only when the result is the same as a full listing
+    server_search = (
+            config.job.keywords_server_search
+            and all_pages
+            and offset == 0
+            and config.job.keywords_match_mode != "regex"
+            and can_search_keywords_on_server(keywords or ())
+    )
+    if config.job.keywords_server_search and keywords and not server_search:
+        logger.debug("Server-side keyword search is not applicable, fetching all posts")
+
     try:
-        async for part in fetch_creator_posts(service=service, creator_id=creator_id, o=start_offset):
-            if next(page_counter, None) is not None:
-                post_list += part
-            else:
-                break
+        if server_search:
+            post_list = await fetch_creator_posts_by_keywords(
+                service=service,
+                creator_id=creator_id,
+                keywords=keywords
+            )
+        else:
+            async for part in fetch_creator_posts(service=service, creator_id=creator_id, o=start_offset):
+                if next(page_counter, None) is not None:
+                    post_list += part
+                else:
+                    break
     except FetchInterruptError as e:
         return ActionRet(**e.ret.model_dump(mode="python"))
 
-    if not all_pages:
-        post_list = post_list[offset % 50:][:length]
-    else:
-        post_list = post_list[offset % 50:]
+    if not server_search:
+        if not all_pages:
+            post_list = post_list[offset % 50:][:length]
+        else:
+            post_list = post_list[offset % 50:]
 
     # Filter posts by publish time
     if start_time or end_time:
         post_list = list(filter_posts_by_date(post_list, start_time, end_time))
 
-    # Filter posts by keywords
+    # Filter posts by keywords (also after server-side search, for exactness)
     if keywords:
         post_list = list(filter_posts_by_keywords(post_list, keywords))
 
@@ -302,9 +326,10 @@ async def create_job_from_creator(
         post_list = list(filter_posts_by_keywords_exclude(post_list, keywords_exclude))
 
     logger.info(f"Get {len(post_list)} posts after filtering, start creating jobs")
+    profiler.stage("listing")
 
     # Filter posts and generate ``CreatorIndices``
-    if not mix_posts:
+    if not mix_posts and write_files:
         if save_creator_indices:
             # Generate posts_path with year/month grouping if enabled
             posts_path = {}
@@ -333,6 +358,31 @@ async def create_job_from_creator(
             "`job.extract_content` or `job.extract_external_links` or `job.extract_content_images` is enabled "
             "and will fetch post content one by one, which may take time. Disable if not needed.")
 
+    # Fetch contents first and parse them in bulk, revisions are still parsed one by one
+    full_posts: Dict[str, Post] = {}
+    extractions: Dict[str, ContentExtraction] = {}
+    if not mix_posts and (config.job.extract_external_links or config.job.extract_content_images):
+        for post in post_list:
+            if post.content:
+                full_posts[post.id] = post
+            elif post.substring:
+                try:
+                    full_posts[post.id] = await _fetch_post_content(post)
+                except FetchInterruptError as e:
+                    return ActionRet(**e.ret.model_dump(mode="python"))
+        content_posts = [post for post in full_posts.values() if post.content]
+        if content_posts:
+            results = await asyncio.get_running_loop().run_in_executor(
+                None,
+                partial(
+                    extract_post_contents,
+                    [post.content for post in content_posts],
+                    config.job.external_link_patterns if config.job.extract_external_links else None,
+                    parse_html=config.job.extract_content_images
+                )
+            )
+            extractions = {post.id: extraction for post, extraction in zip(content_posts, results)}
+
     job_list: List[Job] = []
     for post in post_list:
         # Get post path
@@ -349,7 +399,10 @@ async def create_job_from_creator(
                 post=post,
                 post_path=post_path,
                 post_dir=not mix_posts,
-                dump_post_data=not mix_posts
+                dump_post_data=not mix_posts,
+                write_files=write_files,
+                full_post=full_posts.get(post.id),
+                extraction=extractions.get(post.id)
             )
         except FetchInterruptError as e:
             return ActionRet(**e.ret.model_dump(mode="python"))
@@ -371,7 +424,8 @@ async def create_job_from_creator(
                                 revision_jobs = await create_job_from_post(
                                     post=revision,
                                     post_path=revision_path,
-                                    dump_post_data=True
+                                    dump_post_data=True,
+                                    write_files=write_files
                                 )
                             except FetchInterruptError as e:
                                 return ActionRet(**e.ret.model_dump(mode="python"))
@@ -379,4 +433,5 @@ async def create_job_from_creator(
             except Exception as e:
                 logger.warning(f"Failed to fetch revisions for post {post.id}: {e}")
 
+    profiler.stage("job_creation")
     return ActionRet(data=job_list)
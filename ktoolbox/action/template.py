@@ -0,0 +1,193 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+from string import Formatter
+from typing import Tuple, Optional, Any, Dict, Callable
+
+from pathvalidate import sanitize_filename
+
+from ktoolbox.api.model import Post
+from ktoolbox.configuration import config, JobConfiguration
+
+__all__ = [
+    "TIME_FORMAT",
+    "POST_TEMPLATE_FIELDS",
+    "DATE_TEMPLATE_FIELDS",
+    "TemplateError",
+    "PostTemplate",
+    "DateTemplate",
+    "compile_post_template",
+    "compile_date_template",
+    "validate_templates",
+    "cached_sanitize_filename"
+]
+
+TIME_FORMAT = "%Y-%m-%d"
+
+POST_TEMPLATE_FIELDS: Tuple[str, ...] = ("id", "user", "service", "title", "added", "published", "edited")
+"""Available properties for ``post_dirname_format``, ``filename_format`` and ``PostStructureConfiguration.file``"""
+
+DATE_TEMPLATE_FIELDS: Tuple[str, ...] = ("year", "month")
+"""Available properties for ``year_dirname_format`` and ``month_dirname_format``"""
+
+_DATE_FIELDS = frozenset({"added", "published", "edited"})
+_FIELD_NAME_PATTERN = re.compile(r"[^.\[]*")
+_SAMPLE_POST = Post(
+    id="1",
+    user="1",
+    service="fanbox",
+    title="Title",
+    added=datetime(2024, 1, 1),
+    published=datetime(2024, 1, 1),
+    edited=datetime(2024, 1, 1)
+)
+
+
+class TemplateError(ValueError):
+    """Exception for invalid path or filename template"""
+    pass
+
+
+def _parse_fields(template: str, name: str) -> Tuple[Tuple[str, ...], bool]:
+    """
+    Get the property names and whether positional field (``{}``) is used in a template
+
+    :param template: Format string
+    :param name: Name of the configuration item (quoted), used in error message
+    :raise TemplateError: If the template has invalid syntax
+    """
+    fields = []
+    positional = False
+    try:
+        for _, field_name, format_spec, _ in Formatter().parse(template):
+            if field_name is None:
+                continue
+            if format_spec and "{" in format_spec:
+                raise TemplateError(f"{name} doesn't support nested replacement field: {format_spec!r}")
+            key = _FIELD_NAME_PATTERN.match(field_name).group(0)
+            if key == "" or key.isdigit():
+                positional = True
+            elif key not in fields:
+                fields.append(key)
+    except ValueError as e:
+        if isinstance(e, TemplateError):
+            raise
+        raise TemplateError(f"{name} is not a valid format string: {e}") from e
+    return tuple(fields), positional
+
+
+class PostTemplate:
+    """
+    Compiled post template, only computes the properties referenced in the template
+
+    Results are memoized by the values of the referenced properties.
+    """
+
+    def __init__(self, template: str, name: str, *, allow_positional: bool = False):
+        """
+        Compile and validate a post template
+
+        :param template: Format string, e.g. ``{title}_{}``
+        :param name: Name of the configuration item (quoted), used in error message
+        :param allow_positional: Allow positional field ``{}`` for basic filename
+        :raise TemplateError: If the template is invalid
+        """
+        self.template = template
+        self.name = name
+        self.fields, self.positional = _parse_fields(template, name)
+        if invalid := [x for x in self.fields if x not in POST_TEMPLATE_FIELDS]:
+            raise TemplateError(f"{name} contains invalid key: {', '.join(map(repr, invalid))}")
+        if self.positional and not allow_positional:
+            raise TemplateError(f"{name} doesn't support positional field `{{}}`")
+        self._format = lru_cache(maxsize=4096)(self._format_values)
+        try:
+            self(_SAMPLE_POST, "basic")
+        except (ValueError, TypeError, IndexError, AttributeError, KeyError) as e:
+            raise TemplateError(f"{name} can't be formatted: {e!r}") from e
+
+    def _format_values(self, values: Tuple[Any, ...], *args: str) -> str:
+        kwargs: Dict[str, Any] = {}
+        for field, value in zip(self.fields, values):
+            if field in _DATE_FIELDS:
+                value = value.strftime(TIME_FORMAT) if value else ""
+            kwargs[field] = value
+        return self.template.format(*args, **kwargs)
+
+    def __call__(self, post: Post, *args: str) -> str:
+        """
+        Render the template with a post
+
+        :param post: Post object
+        :param args: Positional arguments, e.g. basic filename
+        :return: Formatted string, not sanitized
+        """
+        return self._format(tuple(getattr(post, x) for x in self.fields), *args)
+
+
+class DateTemplate:
+    """Compiled year/month directory template, memoized by ``(year, month)``"""
+
+    def __init__(self, template: str, name: str):
+        """
+        Compile and validate a date template
+
+        :param template: Format string, e.g. ``{year}-{month:02d}``
+        :param name: Name of the configuration item (quoted), used in error message
+        :raise TemplateError: If the template is invalid
+        """
+        self.template = template
+        self.name = name
+        fields, positional = _parse_fields(template, name)
+        if invalid := [x for x in fields if x not in DATE_TEMPLATE_FIELDS]:
+            raise TemplateError(f"{name} contains invalid key: {', '.join(map(repr, invalid))}")
+        if positional:
+            raise TemplateError(f"{name} doesn't support positional field `{{}}`")
+        self._format: Callable[[int, int], str] = lru_cache(maxsize=1024)(
+            lambda year, month: cached_sanitize_filename(self.template.format(year=year, month=month))
+        )
+        try:
+            self(datetime(2024, 1, 1))
+        except (ValueError, TypeError, IndexError, AttributeError, KeyError) as e:
+            raise TemplateError(f"{name} can't be formatted: {e!r}") from e
+
+    def __call__(self, date: datetime) -> str:
+        """
+        Render the template with a date
+
+        :return: Sanitized directory name
+        """
+        return self._format(date.year, date.month)
+
+
+@lru_cache(maxsize=16)
+def compile_post_template(template: str, name: str, allow_positional: bool = False) -> PostTemplate:
+    """Compile a post template, cached for the same arguments"""
+    return PostTemplate(template, name, allow_positional=allow_positional)
+
+
+@lru_cache(maxsize=16)
+def compile_date_template(template: str, name: str) -> DateTemplate:
+    """Compile a date template, cached for the same arguments"""
+    return DateTemplate(template, name)
+
+
+@lru_cache(maxsize=65536)
+def cached_sanitize_filename(filename: str) -> str:
+    """``pathvalidate.sanitize_filename`` with memoization"""
+    return sanitize_filename(filename)
+
+
+def validate_templates(job_config: Optional[JobConfiguration] = None):
+    """
+    Compile all path and filename templates in ``JobConfiguration``, \
+    call it before any network work to fail fast on misconfiguration.
+
+    :param job_config: ``JobConfiguration`` to validate, defaults to ``config.job``
+    :raise TemplateError: If any template is invalid
+    """
+    job_config = job_config or config.job
+    compile_post_template(job_config.post_dirname_format, "`JobConfiguration.post_dirname_format`")
+    compile_post_template(job_config.filename_format, "`JobConfiguration.filename_format`", True)
+    compile_post_template(job_config.post_structure.file, "`PostStructureConfiguration.file`", True)
+    compile_date_template(job_config.year_dirname_format, "`JobConfiguration.year_dirname_format`")
+    compile_date_template(job_config.month_dirname_format, "`JobConfiguration.month_dirname_format`")
@@ -1,14 +1,20 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import partial
 from html.parser import HTMLParser
-from pathlib import Path
-from typing import Optional, List, Generator, Any, Tuple, Set
+from pathlib import Path, PurePath
+from typing import Optional, List, Generator, Any, Tuple, Set, NamedTuple, Iterable, Pattern
 
 from loguru import logger
-from pathvalidate import sanitize_filename
 
+from ktoolbox.action.filter import KeywordMatcher
+from ktoolbox.action.template import compile_post_template, compile_date_template, cached_sanitize_filename, \
+    TemplateError
 from ktoolbox.api.model import Post
 from ktoolbox.configuration import config
 from ktoolbox.job import CreatorIndices
+from ktoolbox.utils import extract_external_links, compile_external_link_patterns, clean_external_link
 
 __all__ = [
     "generate_post_path_name",
@@ -21,24 +27,68 @@ __all__ = [
     "match_post_keywords",
     "filter_posts_by_keywords",
     "filter_posts_by_keywords_exclude",
+    "ContentExtraction",
+    "extract_post_content",
+    "extract_post_contents",
     "extract_content_images"
 ]
 
-TIME_FORMAT = "%Y-%m-%d"
+_BULK_EXTRACTION_MIN_CONTENTS = 32
+"""Minimum number of contents for ``extract_post_contents`` to start a process pool by default"""
 
 
-class _ContentImageParser(HTMLParser):
-    """HTML parser to extract image sources from content"""
+class _ContentParser(HTMLParser):
+    """HTML parser to extract image sources, anchors and external links from content in one pass"""
 
-    def __init__(self):
+    def __init__(self, external_link_pattern: Optional[Pattern[str]] = None):
+        """
+        :param external_link_pattern: Combined regex of external links, \
+        matched against text and attribute values. ``None`` for skipping external links extraction
+        """
         super().__init__()
-        self.image_sources = []
+        self._external_link_pattern = external_link_pattern
+        self.image_sources: List[str] = []
+        self.anchors: List[str] = []
+        self.external_links: Set[str] = set()
+
+    def _match_external_links(self, text: str):
+        # Text and attribute values have been decoded by ``HTMLParser``
+        for match in self._external_link_pattern.finditer(text):
+            if url := clean_external_link(match.group(0), unescape=False):
+                self.external_links.add(url)
 
     def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
-        if tag.lower() == 'img':
-            for attr_name, attr_value in attrs:
-                if attr_name.lower() == 'src' and attr_value:
-                    self.image_sources.append(attr_value)
+        # ``HTMLParser`` has already lowercased tag and attribute names
+        if tag == 'img':
+            target, attr = self.image_sources, 'src'
+        elif tag == 'a':
+            target, attr = self.anchors, 'href'
+        else:
+            target, attr = None, None
+        for attr_name, attr_value in attrs:
+            if not attr_value:
+                continue
+            if attr_name == attr:
+                target.append(attr_value)
+            if self._external_link_pattern:
+                self._match_external_links(attr_value)
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        self.handle_starttag(tag, attrs)
+
+    def handle_data(self, data: str):
+        if self._external_link_pattern:
+            self._match_external_links(data)
+
+
+class ContentExtraction(NamedTuple):
+    """Result of ``extract_post_content``"""
+    image_sources: List[str]
+    """Image sources (``<img src>``) in content"""
+    anchors: List[str]
+    """Link targets (``<a href>``) in content"""
+    external_links: Set[str]
+    """External file sharing links in content"""
 
 
 def generate_post_path_name(post: Post) -> str:
@@ -47,20 +97,14 @@ def generate_post_path_name(post: Post) -> str:
         return post.id
     else:
         try:
-            return sanitize_filename(
-                config.job.post_dirname_format.format(
-                    id=post.id,
-                    user=post.user,
-                    service=post.service,
-                    title=post.title,
-                    added=post.added.strftime(TIME_FORMAT) if post.added else "",
-                    published=post.published.strftime(TIME_FORMAT) if post.published else "",
-                    edited=post.edited.strftime(TIME_FORMAT) if post.edited else ""
-                )
+            template = compile_post_template(
+                config.job.post_dirname_format,
+                "`JobConfiguration.post_dirname_format`"
             )
-        except KeyError as e:
-            logger.error(f"`JobConfiguration.post_dirname_format` contains invalid key: {e}")
+        except TemplateError as e:
+            logger.error(str(e))
             exit(1)
+        return cached_sanitize_filename(template(post))
 
 
 def generate_year_dirname(post: Post) -> str:
@@ -71,14 +115,11 @@ def generate_year_dirname(post: Post) -> str:
         return "unknown"
 
     try:
-        return sanitize_filename(
-            config.job.year_dirname_format.format(
-                year=post_date.year
-            )
-        )
-    except KeyError as e:
-        logger.error(f"`JobConfiguration.year_dirname_format` contains invalid key: {e}")
+        template = compile_date_template(config.job.year_dirname_format, "`JobConfiguration.year_dirname_format`")
+    except TemplateError as e:
+        logger.error(str(e))
         exit(1)
+    return template(post_date)
 
 
 def generate_month_dirname(post: Post) -> str:
@@ -89,15 +130,11 @@ def generate_month_dirname(post: Post) -> str:
         return "unknown"
 
     try:
-        return sanitize_filename(
-            config.job.month_dirname_format.format(
-                year=post_date.year,
-                month=post_date.month
-            )
-        )
-    except KeyError as e:
-        logger.error(f"`JobConfiguration.month_dirname_format` contains invalid key: {e}")
+        template = compile_date_template(config.job.month_dirname_format, "`JobConfiguration.month_dirname_format`")
+    except TemplateError as e:
+        logger.error(str(e))
         exit(1)
+    return template(post_date)
 
 
 def generate_grouped_post_path(post: Post, base_path: Path) -> Path:
@@ -123,25 +160,17 @@ def generate_grouped_post_path(post: Post, base_path: Path) -> Path:
 
 def generate_filename(post: Post, basic_name: str, filename_format: str) -> str:
     """Generate download filename"""
-    basic_name_path = Path(basic_name)
-    basic_name_filename = basic_name.replace(basic_name_path.suffix, "")
     try:
-        return sanitize_filename(
-            filename_format.format(
-                basic_name_filename,
-                id=post.id,
-                user=post.user,
-                service=post.service,
-                title=post.title,
-                added=post.added.strftime(TIME_FORMAT) if post.added else "",
-                published=post.published.strftime(TIME_FORMAT) if post.published else "",
-                edited=post.edited.strftime(TIME_FORMAT) if post.edited else ""
-            ) + basic_name_path.suffix
+        template = compile_post_template(
+            filename_format,
+            "`JobConfiguration.filename_format` or `PostStructureConfiguration.file`",
+            True
         )
-    except KeyError as e:
-        logger.error(
-            f"`JobConfiguration.filename_format` or `PostStructureConfiguration.file` contains invalid key: {e}")
+    except TemplateError as e:
+        logger.error(str(e))
         exit(1)
+    suffix = PurePath(basic_name).suffix
+    return cached_sanitize_filename(template(post, basic_name.replace(suffix, "")) + suffix)
 
 
 def _match_post_date(
@@ -207,19 +236,12 @@ def match_post_keywords(post: Post, keywords: Set[str]) -> bool:
     Check if the post contains any of the specified keywords.
 
     :param post: Target post object
-    :param keywords: Set of keywords to search for (case-insensitive)
+    :param keywords: Set of keywords to search for (case-insensitive), \
+    matched by ``JobConfiguration.keywords_match_mode``
     :return: Whether the post contains any of the keywords in title
     """
-    if not keywords:
-        return True
-
     # Only search in post title
-    searchable_text = ""
-    if post.title:
-        searchable_text = post.title.lower()
-
-    # Check if any keyword is found in the title
-    return any(keyword.lower() in searchable_text for keyword in keywords)
+    return KeywordMatcher.from_keywords(keywords)(post.title)
 
 
 def filter_posts_by_keywords(
@@ -236,7 +258,8 @@ def filter_posts_by_keywords(
         yield from post_list
         return
 
-    post_filter = filter(lambda x: match_post_keywords(x, keywords), post_list)
+    matcher = KeywordMatcher.from_keywords(keywords)
+    post_filter = filter(lambda x: matcher(x.title), post_list)
     yield from post_filter
 
 
@@ -255,25 +278,82 @@ def filter_posts_by_keywords_exclude(
         return
 
     # Exclude posts that match any of the exclude keywords
-    post_filter = filter(lambda x: not match_post_keywords(x, keywords_exclude), post_list)
+    matcher = KeywordMatcher.from_keywords(keywords_exclude)
+    post_filter = filter(lambda x: not matcher(x.title), post_list)
     yield from post_filter
 
 
-def extract_content_images(content: str) -> List[str]:
+def extract_post_content(
+        content: str,
+        external_link_patterns: Optional[List[str]] = None,
+        *,
+        parse_html: bool = True
+) -> ContentExtraction:
     """
-    Extract image sources from HTML content
+    Extract image sources, anchors and external links from HTML content in one pass
+
+    External links are matched against text and attribute values while parsing. \
+    If ``parse_html`` is ``False`` or the content fails to parse, they are matched against the raw content instead.
 
     :param content: HTML content string
-    :return: List of image source URLs/paths
+    :param external_link_patterns: Regex patterns for extracting external links, \
+    ``None`` for skipping external links extraction
+    :param parse_html: Parse HTML for image sources and anchors, \
+    set to ``False`` if only external links are needed
     """
     if not content:
-        return []
+        return ContentExtraction([], [], set())
 
-    parser = _ContentImageParser()
-    try:
-        parser.feed(content)
-    except Exception as e:
-        logger.warning(f"Failed to parse HTML content for images: {e}")
-        return []
+    if parse_html:
+        parser = _ContentParser(compile_external_link_patterns(tuple(external_link_patterns or ())))
+        try:
+            parser.feed(content)
+            parser.close()
+        except Exception as e:
+            logger.warning(f"Failed to parse HTML content: {e}")
+        else:
+            return ContentExtraction(parser.image_sources, parser.anchors, parser.external_links)
+
+    external_links = extract_external_links(content, external_link_patterns) if external_link_patterns else set()
+    return ContentExtraction([], [], external_links)
+
+
+def extract_post_contents(
+        contents: Iterable[str],
+        external_link_patterns: Optional[List[str]] = None,
+        *,
+        parse_html: bool = True,
+        max_workers: Optional[int] = None
+) -> List[ContentExtraction]:
+    """
+    Bulk version of ``extract_post_content``, parse contents in a process pool
 
-    return parser.image_sources
+    HTML parsing is CPU-bound pure Python code, so processes are used instead of threads.
+
+    :param contents: HTML content strings
+    :param external_link_patterns: Regex patterns for extracting external links
+    :param parse_html: Parse HTML for image sources and anchors
+    :param max_workers: Maximum number of worker processes, defaults to the number of CPUs. \
+    Contents are processed in current process if it's ``1``, \
+    or if it's not given and there are too few contents to pay off starting processes.
+    :return: Results in the same order as ``contents``
+    """
+    contents = list(contents)
+    func = partial(extract_post_content, external_link_patterns=external_link_patterns, parse_html=parse_html)
+    if max_workers is None and len(contents) < _BULK_EXTRACTION_MIN_CONTENTS:
+        max_workers = 1
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(contents) <= 1:
+        return list(map(func, contents))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, contents, chunksize=max(1, len(contents) // (max_workers * 4))))
+
+
+def extract_content_images(content: str) -> List[str]:
+    """
+    Extract image sources from HTML content
+
+    :param content: HTML content string
+    :return: List of image source URLs/paths
+    """
+    return extract_post_content(content).image_sources
@@ -1,3 +1,4 @@
+import time
 from abc import ABC, abstractmethod
 from typing import Literal, Generic, TypeVar, Optional, Callable
 from urllib.parse import urlunparse
@@ -11,6 +12,7 @@ from tenacity.stop import stop_base, stop_never, stop_after_attempt
 
 from ktoolbox._enum import RetCodeEnum
 from ktoolbox.configuration import config
+from ktoolbox.monitor import metrics, tracer
 from ktoolbox.utils import BaseRet, generate_msg
 
 __all__ = ["APITenacityStop", "APIRet", "BaseAPI"]
@@ -43,8 +45,14 @@ def _retry_error_callback(state: RetryCallState) -> "APIRet":
     return state.outcome.result()
 
 
+def _before_retry_sleep(_: RetryCallState):
+    """Count the retry of an API call"""
+    metrics.retries.labels("api").inc()
+
+
 def _retry(*args, **kwargs):
     """Wrap an API method with a new ``Retrying`` object"""
+    kwargs.setdefault("before_sleep", _before_retry_sleep)
     wrapper = tenacity.retry(
         stop=APITenacityStop(),
         wait=wait_fixed(config.api.retry_interval),
@@ -107,22 +115,28 @@ class BaseAPI(ABC, Generic[_T]):
             path = cls.path
         url_parts = [config.api.scheme, config.api.netloc, f"{config.api.path}{path}", '', '', '']
         url = str(urlunparse(url_parts))
+        started = time.perf_counter()
         try:
-            res = await cls.client.request(
-                method=cls.method,
-                url=url,
-                timeout=config.api.timeout,
-                follow_redirects=True,
-                **kwargs
-            )
+            with tracer.span(cls.__name__, "api"):
+                res = await cls.client.request(
+                    method=cls.method,
+                    url=url,
+                    timeout=config.api.timeout,
+                    follow_redirects=True,
+                    **kwargs
+                )
         except Exception as e:
+            metrics.api_requests.labels(cls.__name__, "error").inc()
             return APIRet(
                 code=RetCodeEnum.NetWorkError,
                 message=generate_msg(url=url),
                 exception=e
             )
         else:
+            metrics.api_requests.labels(cls.__name__, str(res.status_code)).inc()
             return cls.handle_res(res)
+        finally:
+            metrics.api_request_duration.labels(cls.__name__).observe(time.perf_counter() - started)
 
     @classmethod
     @abstractmethod
@@ -2,11 +2,14 @@ from urllib.parse import urlunparse
 
 from ktoolbox.configuration import config
 
-__all__ = ["SEARCH_STEP", "get_creator_icon", "get_creator_banner"]
+__all__ = ["SEARCH_STEP", "SEARCH_QUERY_MIN_LENGTH", "get_creator_icon", "get_creator_banner"]
 
 SEARCH_STEP = 50
 """Searching APIs result steps"""
 
+SEARCH_QUERY_MIN_LENGTH = 3
+"""Minimum length of search query (``q``) accepted by searching APIs"""
+
 
 def get_creator_icon(creator_id: str, service: str) -> str:
     """
@@ -0,0 +1,3 @@
+from .dataset import *
+from .server import *
+from .benchmark import *
@@ -0,0 +1,321 @@
+import asyncio
+import multiprocessing
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, asdict, replace
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Sequence, Type
+
+from loguru import logger
+from pathvalidate import sanitize_filename
+
+from ktoolbox import __version__
+from ktoolbox.action import create_job_from_creator, search_creator
+from ktoolbox.bench.dataset import generate_dataset, Dataset
+from ktoolbox.bench.server import StandInServer, ServerStats, use_stand_in
+from ktoolbox.configuration import config, Configuration
+from ktoolbox.downloader import percentile
+from ktoolbox.job import JobRunner
+from ktoolbox.utils import logger_init
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+__all__ = ["Scenario", "SCENARIOS", "BenchResult", "run_scenario", "run_benchmark", "compare_with_baseline"]
+
+
+@dataclass
+class Scenario:
+    """Workload and server behavior of a benchmark"""
+    name: str
+    description: str
+    posts: int
+    attachments: int
+    file_size: int
+    """Maximum file size, sizes are random between a half of it and it"""
+    latency: float = 0.0
+    bandwidth: Optional[float] = None
+    error_rate: float = 0.0
+    error_statuses: Sequence[int] = (429, 500, 503)
+    subdomains: Optional[int] = None
+    existing: float = 0.0
+    """Fraction of files already in the library before the sync"""
+
+    def scaled(self, scale: float) -> "Scenario":
+        """Get a copy with the number of posts scaled, e.g. ``0.1`` for a quick run"""
+        return replace(self, posts=max(int(self.posts * scale), 1))
+
+    def generate_dataset(self) -> Dataset:
+        return generate_dataset(posts=self.posts, attachments=self.attachments, file_size=self.file_size)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    x.name: x for x in [
+        Scenario("tiny-images", "Many tiny images", posts=250, attachments=3, file_size=16 * 1024, latency=0.005),
+        Scenario("huge-videos", "Few huge videos", posts=2, attachments=1, file_size=64 * 1024 * 1024),
+        Scenario(
+            "high-error-rate",
+            "Error responses and subdomain redirects",
+            posts=100,
+            attachments=1,
+            file_size=64 * 1024,
+            error_rate=0.05,
+            subdomains=4
+        ),
+        Scenario(
+            "mostly-existing",
+            "Library with most files downloaded",
+            posts=250,
+            attachments=3,
+            file_size=16 * 1024,
+            existing=0.9
+        )
+    ]
+}
+"""Built-in scenarios"""
+
+
+@dataclass
+class BenchResult:
+    """Result of a scenario, rates are per second of wall time"""
+    scenario: str
+    files: int
+    """Files downloaded"""
+    failed: int
+    duration: float
+    files_per_second: float
+    mb_per_second: float
+    api_calls_per_second: float
+    cpu_seconds: float
+    """CPU time of KToolBox (the server runs in another process)"""
+    peak_rss_mb: Optional[float]
+    """Peak resident memory of the process running the scenario, ``None`` if not available. \
+    Scenarios of ``run_benchmark`` run in their own processes, so it's the peak of the scenario."""
+    loop_lag_mean: float
+    loop_lag_p99: float
+    loop_lag_max: float
+    bytes: int
+    api_calls: int
+    injected_errors: int
+
+
+def _serve(scenario: Scenario, conn: Connection):
+    """Serve the scenario in a child process, so that the server doesn't compete with KToolBox for CPU and GIL"""
+    server = StandInServer(
+        scenario.generate_dataset(),
+        latency=scenario.latency,
+        bandwidth=scenario.bandwidth,
+        error_rate=scenario.error_rate,
+        error_statuses=scenario.error_statuses,
+        subdomains=scenario.subdomains
+    ).start()
+    conn.send(server.netloc)
+    # Respond statistics to each message, until ``None`` for stopping
+    while True:
+        message = conn.recv()
+        conn.send(server.stats())
+        if message is None:
+            break
+    server.stop()
+
+
+def _receive(conn: Connection, process: multiprocessing.Process) -> Any:
+    """Receive from the server process, raise ``RuntimeError`` instead of waiting forever if it exited"""
+    while not conn.poll(0.5):
+        if not process.is_alive():
+            raise RuntimeError(f"Benchmark server exited unexpectedly with code {process.exitcode}")
+    return conn.recv()
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+async def _sample_loop_lag(lags: List[float], interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(loop.time() - expected, 0.0))
+
+
+async def _sync(service: str, creator_id: str, path: Path, fraction: float = 1.0) -> Optional[JobRunner]:
+    """
+    Sync a creator like ``KToolBoxCli.sync_creator``
+
+    :param fraction: Fraction of jobs to run, e.g. for preparing a partly downloaded library
+    :return: The finished ``JobRunner``, ``None`` if failed to get the creator or posts
+    """
+    creator_ret = await search_creator(id=creator_id, service=service)
+    if not creator_ret or (creator := next(creator_ret.data, None)) is None:
+        return None
+    creator_path = path / sanitize_filename(creator.name)
+    creator_path.mkdir(exist_ok=True)
+    ret = await create_job_from_creator(
+        service=service,
+        creator_id=creator_id,
+        path=creator_path,
+        all_pages=True,
+        start_time=None,
+        end_time=None
+    )
+    if not ret:
+        return None
+    runner = JobRunner(job_list=ret.data[:int(len(ret.data) * fraction)], progress=False)
+    await runner.start()
+    return runner
+
+
+def run_scenario(scenario: Scenario) -> BenchResult:
+    """
+    Run a ``sync_creator`` workload of the scenario against a stand-in server in a child process
+
+    It starts and stops its own event loop, so it can't be called in a running one.
+    """
+    context = multiprocessing.get_context("spawn")
+    conn, child_conn = context.Pipe()
+    process = context.Process(target=_serve, args=(scenario, child_conn), daemon=True)
+    process.start()
+    try:
+        netloc = _receive(conn, process)
+        creator = scenario.generate_dataset().creators[0]
+        with tempfile.TemporaryDirectory(prefix="ktoolbox-bench-") as directory, \
+                use_stand_in(netloc, bool(scenario.subdomains)):
+            # Measure KToolBox itself rather than the politeness limit of requests
+            config.downloader = config.downloader.model_copy(update={"tps_limit": 1000})
+            path = Path(directory)
+            if scenario.existing:
+                asyncio.run(_sync(creator.service, creator.id, path, scenario.existing))
+            conn.send("setup")
+            setup_stats: ServerStats = _receive(conn, process)
+            lags: List[float] = []
+
+            async def measured():
+                sampler = asyncio.create_task(_sample_loop_lag(lags))
+                try:
+                    return await _sync(creator.service, creator.id, path)
+                finally:
+                    sampler.cancel()
+
+            cpu_started = time.process_time()
+            started = time.perf_counter()
+            runner = asyncio.run(measured())
+            duration = time.perf_counter() - started
+            cpu_seconds = time.process_time() - cpu_started
+        conn.send(None)
+        stats: ServerStats = _receive(conn, process)
+    finally:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+
+    if runner is None:
+        raise RuntimeError(f"Failed to list posts of scenario {scenario.name}")
+    lags.sort()
+    api_calls = stats.api_requests - setup_stats.api_requests
+    sent = stats.bytes_sent - setup_stats.bytes_sent
+    files = runner.done_size - runner.failed_count - runner.existed_count
+    return BenchResult(
+        scenario=scenario.name,
+        files=files,
+        failed=runner.failed_count,
+        duration=duration,
+        files_per_second=files / duration,
+        mb_per_second=sent / 2 ** 20 / duration,
+        api_calls_per_second=api_calls / duration,
+        cpu_seconds=cpu_seconds,
+        peak_rss_mb=_peak_rss_mb(),
+        loop_lag_mean=sum(lags) / len(lags) if lags else 0.0,
+        loop_lag_p99=percentile(lags, 99) or 0.0,
+        loop_lag_max=lags[-1] if lags else 0.0,
+        bytes=sent,
+        api_calls=api_calls,
+        injected_errors=stats.errors - setup_stats.errors
+    )
+
+
+def _run_isolated(
+        scenario: Scenario,
+        configuration: Configuration,
+        policy: Type[asyncio.AbstractEventLoopPolicy],
+        conn: Connection
+):
+    """Run a scenario in a child process with the configuration and event loop policy of the parent"""
+    for name in type(configuration).model_fields:
+        setattr(config, name, getattr(configuration, name))
+    logger_init(cli_use=True)
+    asyncio.set_event_loop_policy(policy())
+    try:
+        conn.send((run_scenario(scenario), None))
+    except Exception as e:
+        conn.send((None, e))
+
+
+def run_benchmark(scenarios: Sequence[Scenario]) -> Dict[str, Any]:
+    """
+    Run scenarios and get the results with environment information, ready to be dumped as JSON
+
+    Each scenario runs in its own process, so that CPU time and peak RSS don't depend on the scenarios before it.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for scenario in scenarios:
+        logger.info(f"Running benchmark scenario {scenario.name}: {scenario.description}")
+        conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_run_isolated,
+            args=(scenario, config, type(asyncio.get_event_loop_policy()), child_conn)
+        )
+        process.start()
+        try:
+            result, exception = _receive(conn, process)
+        finally:
+            process.join()
+        if exception is not None:
+            raise exception
+        results[scenario.name] = asdict(result)
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "job_count": config.job.count,
+        "results": results
+    }
+
+
+_HIGHER_IS_BETTER = ("files_per_second", "mb_per_second", "api_calls_per_second")
+_LOWER_IS_BETTER = ("cpu_seconds", "peak_rss_mb", "loop_lag_p99")
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.1) -> List[str]:
+    """
+    Compare results of ``run_benchmark`` with a baseline of the same format
+
+    :param report: Current results
+    :param baseline: Baseline results, scenarios missing in either side are skipped
+    :param tolerance: Allowed relative regression, e.g. ``0.1`` for 10%
+    :return: Descriptions of regressions
+    """
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        for metric in _HIGHER_IS_BETTER + _LOWER_IS_BETTER:
+            current, expected = result.get(metric), base.get(metric)
+            if current is None or not expected:
+                continue
+            change = (current - expected) / expected
+            if (metric in _HIGHER_IS_BETTER and change < -tolerance) or \
+                    (metric in _LOWER_IS_BETTER and change > tolerance):
+                regressions.append(f"{name}: {metric} {expected:.4g} -> {current:.4g} ({change:+.1%})")
+    return regressions
@@ -0,0 +1,143 @@
+import hashlib
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Tuple, Optional, Iterator
+
+from ktoolbox.api.model import Creator, Post, Attachment, File
+
+__all__ = ["SyntheticFile", "Dataset", "generate_dataset"]
+
+_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+_EXTENSIONS = ("png", "jpg", "zip", "mp4", "psd")
+
+
+@dataclass
+class SyntheticFile:
+    """
+    File served by the stand-in server, its content is generated on demand from ``block``
+
+    The filename is the SHA-256 of the content, same as files on Kemono.
+    """
+    server_path: str
+    size: int
+    block: bytes
+    """Content is ``block`` repeated and cut to ``size``"""
+
+    def read(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """
+        Read a range of the content
+
+        :param start: Start offset
+        :param end: End offset (exclusive), the end of the file by default
+        """
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return b""
+        block_size = len(self.block)
+        skip = start % block_size
+        repeat = (skip + end - start) // block_size + 1
+        return (self.block * repeat)[skip:skip + end - start]
+
+    def iter_chunks(self, start: int = 0, end: Optional[int] = None, chunk_size: int = 65536) -> Iterator[bytes]:
+        """Read a range of the content by chunks"""
+        end = self.size if end is None else min(end, self.size)
+        for offset in range(start, end, chunk_size):
+            yield self.read(offset, min(offset + chunk_size, end))
+
+
+@dataclass
+class Dataset:
+    """Creators, posts and files served by the stand-in server"""
+    creators: List[Creator] = field(default_factory=list)
+    posts: Dict[Tuple[str, str], List[Post]] = field(default_factory=dict)
+    """``(service, creator_id)`` -> posts, newest first like the API"""
+    files: Dict[str, SyntheticFile] = field(default_factory=dict)
+    """Server path -> file"""
+
+    def find_post(self, service: str, creator_id: str, post_id: str) -> Optional[Post]:
+        for post in self.posts.get((service, creator_id), []):
+            if post.id == post_id:
+                return post
+        return None
+
+    @property
+    def total_size(self) -> int:
+        """Total bytes of files"""
+        return sum(x.size for x in self.files.values())
+
+
+def _synthetic_file(rng: random.Random, size: int) -> SyntheticFile:
+    block = rng.getrandbits(256 * 8).to_bytes(256, "big")
+    sha256 = hashlib.sha256()
+    file = SyntheticFile("", size, block)
+    for chunk in file.iter_chunks(chunk_size=1 << 20):
+        sha256.update(chunk)
+    digest = sha256.hexdigest()
+    file.server_path = f"/data/{digest[:2]}/{digest[2:4]}/{digest}.{rng.choice(_EXTENSIONS)}"
+    return file
+
+
+def generate_dataset(
+        creators: int = 1,
+        posts: int = 100,
+        attachments: int = 3,
+        file_size: int = 64 * 1024,
+        *,
+        service: str = "fanbox",
+        content: bool = False,
+        seed: int = 0
+) -> Dataset:
+    """
+    Generate a dataset with models of ``ktoolbox.api.model`` (generated from ``k_generator/openapi.json``)
+
+    :param creators: Number of creators
+    :param posts: Number of posts of each creator
+    :param attachments: Number of attachments of each post, besides the post file
+    :param file_size: Maximum file size, sizes are random between a half of it and it
+    :param service: Service of creators
+    :param content: Give posts HTML content (instead of only ``substring``) with an inline image
+    :param seed: Random seed, the same arguments always generate the same dataset
+    """
+    rng = random.Random(seed)
+    dataset = Dataset()
+    for creator_index in range(creators):
+        creator_id = str(10000 + creator_index)
+        creator_posts = []
+        for post_index in range(posts):
+            published = _EPOCH + timedelta(hours=post_index)
+            files = [_synthetic_file(rng, rng.randint(file_size // 2, file_size)) for _ in range(attachments + 1)]
+            for file in files:
+                dataset.files[file.server_path] = file
+            title = f"Post {post_index} of creator {creator_id}"
+            creator_posts.append(
+                Post(
+                    id=str(creator_index * posts + post_index + 1),
+                    user=creator_id,
+                    service=service,
+                    title=title,
+                    content=f'<p>{title}</p><img src="{files[0].server_path}">' if content else None,
+                    substring=title,
+                    shared_file=False,
+                    added=published,
+                    published=published,
+                    file=File(name=f"cover{files[0].server_path[-4:]}", path=files[0].server_path),
+                    attachments=[
+                        Attachment(name=f"{i}{x.server_path[-4:]}", path=x.server_path)
+                        for i, x in enumerate(files[1:], start=1)
+                    ]
+                )
+            )
+        creator_posts.reverse()
+        dataset.posts[(service, creator_id)] = creator_posts
+        dataset.creators.append(
+            Creator(
+                favorited=rng.randint(0, 1000),
+                id=creator_id,
+                indexed=_EPOCH,
+                name=f"creator-{creator_id}",
+                service=service,
+                updated=_EPOCH + timedelta(hours=posts)
+            )
+        )
+    return dataset
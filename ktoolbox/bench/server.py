@@ -0,0 +1,312 @@
+import json
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Sequence, Tuple, Any, Iterator
+from urllib.parse import urlparse, parse_qs, unquote
+
+from ktoolbox.api.utils import SEARCH_STEP
+from ktoolbox.bench.dataset import Dataset, SyntheticFile
+from ktoolbox.configuration import config
+
+__all__ = ["ServerStats", "StandInServer", "use_stand_in"]
+
+_API_ROUTES = [
+    (re.compile(r"^/creators(\.txt)?$"), "creators"),
+    (re.compile(r"^/app_version$"), "app_version"),
+    (re.compile(r"^/(?P<service>[^/]+)/user/(?P<creator_id>[^/]+)/posts$"), "posts"),
+    (re.compile(r"^/(?P<service>[^/]+)/user/(?P<creator_id>[^/]+)/announcements$"), "announcements"),
+    (re.compile(r"^/(?P<service>[^/]+)/user/(?P<creator_id>[^/]+)/post/(?P<post_id>[^/]+)$"), "post"),
+    (re.compile(r"^/(?P<service>[^/]+)/user/(?P<creator_id>[^/]+)/post/(?P<post_id>[^/]+)/revisions$"), "revisions")
+]
+_NODE_PATTERN = re.compile(r"^n(\d+)\.")
+
+
+@dataclass
+class ServerStats:
+    """Statistics of ``StandInServer``"""
+    api_requests: int = 0
+    file_requests: int = 0
+    bytes_sent: int = 0
+    """Bytes of file content sent"""
+    errors: int = 0
+    """Injected error responses"""
+    forbidden: int = 0
+    """403 responses from nodes that don't hold the file"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, *args: Any):
+        pass
+
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        # Reverse proxy form, e.g. ``/https://n1.kemono.cr/data/...``
+        if self.path.startswith(("/http://", "/https://")):
+            url = urlparse(self.path[1:])
+            host, path, query = url.hostname or "", url.path, url.query
+        else:
+            url = urlparse(self.path)
+            host, path, query = (self.headers.get("Host") or "").split(":")[0], url.path, url.query
+        stand_in.handle(self, host, unquote(path), parse_qs(query))
+
+    def send(self, status: int, body: bytes = b"", content_type: str = "application/json", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    stand_in: "StandInServer"
+
+
+class StandInServer:
+    """
+    Local stand-in of the Kemono API and file servers, for offline end-to-end and performance tests
+
+    API endpoints are served under ``APIConfiguration.path``, files under ``/data``. \
+    Requests in reverse proxy form (``/{url}``) are accepted too, which is how subdomains are simulated \
+    since ``n1.<host>`` of a local server can't be resolved.
+    """
+
+    def __init__(
+            self,
+            dataset: Dataset,
+            *,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            latency: float = 0.0,
+            bandwidth: Optional[float] = None,
+            error_rate: float = 0.0,
+            error_statuses: Sequence[int] = (403, 429, 500, 503),
+            range_support: bool = True,
+            subdomains: Optional[int] = None,
+            seed: int = 0
+    ):
+        """
+        :param dataset: Dataset to serve
+        :param host: Host to listen on
+        :param port: Port to listen on, ``0`` for a free port
+        :param latency: Seconds to wait before each response
+        :param bandwidth: Bytes per second of each file response, ``None`` for unlimited
+        :param error_rate: Probability of responding a random status of ``error_statuses`` to a file request
+        :param error_statuses: Injected error statuses
+        :param range_support: Honor ``Range`` requests of files
+        :param subdomains: Number of file server nodes (``n1``...). If set, each file is only on one node, \
+        other nodes respond 403, and hosts without a node prefix redirect to the node of the file.
+        :param seed: Random seed of error injection
+        """
+        self.dataset = dataset
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.range_support = range_support
+        self.subdomains = subdomains
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = ServerStats()
+        self._server = _Server((host, port), _Handler)
+        self._server.stand_in = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def netloc(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.netloc}"
+
+    def stats(self) -> ServerStats:
+        """Get a snapshot of statistics"""
+        with self._lock:
+            return ServerStats(**vars(self._stats))
+
+    def start(self) -> "StandInServer":
+        """Start serving in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ktoolbox-stand-in", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @contextmanager
+    def patch_config(self) -> Iterator["StandInServer"]:
+        """Point ``APIConfiguration`` and ``DownloaderConfiguration`` to this server, restored on exit"""
+        with use_stand_in(self.netloc, bool(self.subdomains)):
+            yield self
+
+    def _count(self, **kwargs: int):
+        with self._lock:
+            for name, value in kwargs.items():
+                setattr(self._stats, name, getattr(self._stats, name) + value)
+
+    def _node_of(self, file: SyntheticFile) -> int:
+        return int(file.server_path.rsplit("/", 1)[-1][:8], 16) % self.subdomains + 1
+
+    def handle(self, handler: _Handler, host: str, path: str, query: dict):
+        """Respond to a request"""
+        if self.latency:
+            time.sleep(self.latency)
+        api_path = config.api.path
+        if path.startswith(f"{api_path}/"):
+            self._count(api_requests=1)
+            self._handle_api(handler, path[len(api_path):], query)
+        elif (file := self.dataset.files.get(path)) is not None:
+            self._count(file_requests=1)
+            self._handle_file(handler, host, file)
+        else:
+            handler.send(404, b'{"error": "Not Found"}')
+
+    def _handle_api(self, handler: _Handler, path: str, query: dict):
+        for pattern, name in _API_ROUTES:
+            if match := pattern.match(path):
+                break
+        else:
+            return handler.send(404, b'{"error": "Not Found"}')
+        params = match.groupdict()
+        data: Any
+        if name == "creators":
+            data = [
+                {
+                    **x.model_dump(mode="json"),
+                    "indexed": int(x.indexed.timestamp()),
+                    "updated": int(x.updated.timestamp())
+                }
+                for x in self.dataset.creators
+            ]
+        elif name == "app_version":
+            return handler.send(200, b"stand-in", "text/plain")
+        elif name == "posts":
+            posts = self.dataset.posts.get((params["service"], params["creator_id"]))
+            if posts is None:
+                return handler.send(404, b'{"error": "Creator not found."}')
+            if q := (query.get("q") or [""])[0].lower():
+                posts = [x for x in posts if q in (x.title or "").lower()]
+            offset = int((query.get("o") or ["0"])[0])
+            offset -= offset % SEARCH_STEP
+            data = [
+                x.model_dump(mode="json", exclude={"content"}) for x in posts[offset:offset + SEARCH_STEP]
+            ]
+        elif name == "announcements":
+            data = []
+        else:
+            post = self.dataset.find_post(params["service"], params["creator_id"], params["post_id"])
+            if post is None:
+                return handler.send(404, b'{"error": "Post not found."}')
+            data = {"post": post.model_dump(mode="json"), "props": {}} if name == "post" else []
+        handler.send(200, json.dumps(data).encode())
+
+    def _handle_file(self, handler: _Handler, host: str, file: SyntheticFile):
+        if self.subdomains:
+            node_match = _NODE_PATTERN.match(host)
+            node = self._node_of(file)
+            if node_match is None:
+                # Redirect to the node of the file, in reverse proxy form
+                location = f"/https://n{node}.{host}{file.server_path}"
+                return handler.send(302, headers=[("Location", location)])
+            if int(node_match.group(1)) != node:
+                self._count(forbidden=1)
+                return handler.send(403, b"Forbidden", "text/plain")
+        if self.error_rate:
+            with self._lock:
+                status = self._random.choice(self.error_statuses) if self._random.random() < self.error_rate else None
+            if status is not None:
+                self._count(errors=1)
+                return handler.send(status, b"Injected error", "text/plain")
+
+        start, end, status = 0, file.size, 200
+        headers = [("Accept-Ranges", "bytes")] if self.range_support else []
+        if self.range_support and (range_header := handler.headers.get("Range")):
+            requested = _parse_range(range_header)
+            if requested is not None:
+                if requested[0] >= file.size:
+                    return handler.send(
+                        416, headers=[("Content-Range", f"bytes */{file.size}")], content_type="text/plain"
+                    )
+                start, end, status = requested[0], min(requested[1], file.size), 206
+                headers.append(("Content-Range", f"bytes {start}-{end - 1}/{file.size}"))
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/octet-stream")
+        handler.send_header("Content-Length", str(end - start))
+        handler.send_header("ETag", f'"{file.server_path.rsplit("/", 1)[-1][:16]}"')
+        for name, value in headers:
+            handler.send_header(name, value)
+        handler.end_headers()
+        chunk_size = 65536
+        if self.bandwidth:
+            chunk_size = max(int(self.bandwidth / 20), 1024)
+        sent = 0
+        started = time.monotonic()
+        try:
+            for chunk in file.iter_chunks(start, end, chunk_size):
+                handler.wfile.write(chunk)
+                sent += len(chunk)
+                if self.bandwidth:
+                    delay = sent / self.bandwidth - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            handler.close_connection = True
+        finally:
+            self._count(bytes_sent=sent)
+
+
+@contextmanager
+def use_stand_in(netloc: str, subdomains: bool = False) -> Iterator[None]:
+    """
+    Point ``APIConfiguration`` and ``DownloaderConfiguration`` to a stand-in server, restored on exit
+
+    :param netloc: Netloc of the server, e.g. ``127.0.0.1:8080``
+    :param subdomains: Whether the server simulates subdomain nodes
+    """
+    original_api, original_downloader = config.api, config.downloader
+    config.api = original_api.model_copy(update={"scheme": "http", "netloc": netloc})
+    if subdomains:
+        update = {"scheme": "https", "reverse_proxy": f"http://{netloc}/{{}}"}
+        config.api.files_netloc = "kemono.invalid"
+    else:
+        update = {"scheme": "http", "reverse_proxy": "{}"}
+        config.api.files_netloc = netloc
+    config.downloader = original_downloader.model_copy(update=update)
+    try:
+        yield
+    finally:
+        config.api, config.downloader = original_api, original_downloader
+
+
+def _parse_range(value: str) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=start-[end]`` range, return ``(start, end)`` with exclusive ``end``"""
+    match = re.fullmatch(r"bytes=(\d+)-(\d*)", value.strip())
+    if match is None:
+        return None
+    start = int(match.group(1))
+    end = int(match.group(2)) + 1 if match.group(2) else 1 << 62
+    return start, end
@@ -1,4 +1,6 @@
-from datetime import datetime
+import asyncio
+import json
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Union, overload, Tuple
 
@@ -9,12 +11,16 @@ from settings_doc import render, OutputFormat
 
 from ktoolbox import __version__
 from ktoolbox._enum import TextEnum
-from ktoolbox.action import create_job_from_post, create_job_from_creator, generate_post_path_name, FetchInterruptError
+from ktoolbox.action import create_job_from_post, create_job_from_creator, generate_post_path_name, FetchInterruptError, \
+    validate_templates, TemplateError
 from ktoolbox.action import search_creator as search_creator_action, search_creator_post as search_creator_post_action
 from ktoolbox.api.misc import get_app_version
 from ktoolbox.api.posts import get_post as get_post_api
+from ktoolbox.bench import SCENARIOS, run_benchmark, compare_with_baseline
 from ktoolbox.configuration import config
-from ktoolbox.job import JobRunner
+from ktoolbox.downloader import get_bucket_store
+from ktoolbox.filesystem import fs_executor
+from ktoolbox.job import JobRunner, run_preflight, PreflightCache, SyncState, sync_fingerprint
 from ktoolbox.utils import dump_search, parse_webpage_url, generate_msg, check_for_updates
 
 __all__ = ["KToolBoxCli"]
@@ -203,6 +209,13 @@ class KToolBoxCli:
         :param path: Download path, default is current directory
         :param dump_post_data: Whether to dump post data (post.json) in post directory
         """
+        # Reject invalid path and filename templates before any network work
+        try:
+            validate_templates()
+        except TemplateError as e:
+            logger.error(str(e))
+            return str(e)
+
         # Check for updates on first command run
         await KToolBoxCli._ensure_update_check()
         
@@ -281,7 +294,10 @@ class KToolBoxCli:
             offset: int = 0,
             length: int = None,
             keywords: Tuple[str] = None,
-            keywords_exclude: Tuple[str] = None
+            keywords_exclude: Tuple[str] = None,
+            preflight: bool = False,
+            dry_run: bool = False,
+            force: bool = False
     ):
         ...
 
@@ -299,7 +315,10 @@ class KToolBoxCli:
             offset: int = 0,
             length: int = None,
             keywords: Tuple[str] = None,
-            keywords_exclude: Tuple[str] = None
+            keywords_exclude: Tuple[str] = None,
+            preflight: bool = False,
+            dry_run: bool = False,
+            force: bool = False
     ):
         ...
 
@@ -317,7 +336,10 @@ class KToolBoxCli:
             offset: int = 0,
             length: int = None,
             keywords: Tuple[str] = None,
-            keywords_exclude: Tuple[str] = None
+            keywords_exclude: Tuple[str] = None,
+            preflight: bool = False,
+            dry_run: bool = False,
+            force: bool = False
     ):
         """
         Sync posts from a creator
@@ -344,7 +366,19 @@ class KToolBoxCli:
         :param length: The number of posts to fetch, defaults to fetching all posts after ``offset``.
         :param keywords: Comma-separated keywords to filter posts by title (case-insensitive)
         :param keywords_exclude: Comma-separated keywords to exclude posts by title (case-insensitive)
+        :param preflight: Probe file sizes before downloading, filter files by \
+            ``min_file_size`` & ``max_file_size``, and show the plan with total size and ETA
+        :param dry_run: Only show the preflight plan, don't download or write anything to the download path
+        :param force: Sync even if the creator hasn't been updated since the last successful sync \
+            with the same options
         """
+        # Reject invalid path and filename templates before any network work
+        try:
+            validate_templates()
+        except TemplateError as e:
+            logger.error(str(e))
+            return str(e)
+
         # Check for updates on first command run
         await KToolBoxCli._ensure_update_check()
         logger.info(repr(config))
@@ -362,6 +396,7 @@ class KToolBoxCli:
         path = path if isinstance(path, Path) else Path(path)
 
         # Get creator name
+        creator = None
         creator_name = creator_id
         creator_ret = await search_creator_action(id=creator_id, service=service)
         if creator_ret:
@@ -385,7 +420,8 @@ class KToolBoxCli:
             return creator_ret.message
 
         creator_path = path / sanitize_filename(creator_name)
-        creator_path.mkdir(exist_ok=True)
+        if not dry_run:
+            creator_path.mkdir(exist_ok=True)
 
         keywords = [keywords] if isinstance(keywords, str) else keywords
         keyword_set = set(keywords) if keywords else config.job.keywords
@@ -397,6 +433,28 @@ class KToolBoxCli:
         if keywords_exclude:
             logger.info(f"Excluding posts by keywords: {', '.join(keyword_exclude_set)}")
 
+        # Skip listing posts if nothing changed since the last successful sync
+        sync_state = SyncState.load(creator_path)
+        fingerprint = sync_fingerprint(
+            save_creator_indices=save_creator_indices,
+            mix_posts=mix_posts,
+            start_time=start_time,
+            end_time=end_time,
+            offset=offset,
+            length=length,
+            keywords=sorted(keyword_set),
+            keywords_exclude=sorted(keyword_exclude_set)
+        )
+        if creator and not force and not dry_run and sync_state.is_fresh(creator.updated, fingerprint):
+            logger.info(
+                generate_msg(
+                    "Creator has not been updated since the last sync, skipping (use `--force` to sync anyway)",
+                    updated=creator.updated,
+                    last_sync=sync_state.completed
+                )
+            )
+            return None
+
         ret = await create_job_from_creator(
             service=service,
             creator_id=creator_id,
@@ -409,11 +467,129 @@ class KToolBoxCli:
             start_time=datetime.strptime(start_time, "%Y-%m-%d") if start_time else None,
             end_time=datetime.strptime(end_time, "%Y-%m-%d") if end_time else None,
             keywords=keyword_set,
-            keywords_exclude=keyword_exclude_set
+            keywords_exclude=keyword_exclude_set,
+            write_files=not dry_run
         )
         if ret:
-            job_runner = JobRunner(job_list=ret.data)
-            await job_runner.start()
+            job_list = ret.data
+            if preflight or dry_run:
+                plan = await run_preflight(job_list, creator_path, save_cache=not dry_run)
+                logger.info(plan.summary())
+                if dry_run:
+                    return None
+                job_list = plan.jobs
+            job_runner = JobRunner(job_list=job_list)
+            failed_num = await job_runner.start()
+            if creator and not failed_num:
+                sync_state.creator_updated = creator.updated
+                sync_state.completed = datetime.now(timezone.utc)
+                sync_state.fingerprint = fingerprint
+                sync_state.save(creator_path)
+            if preflight and job_runner.throughput:
+                # Record throughput for the ETA of next preflight
+                preflight_cache = PreflightCache.load(creator_path)
+                preflight_cache.record_throughput(job_runner.throughput)
+                preflight_cache.save(creator_path)
             return None
         else:
             return ret.message
+
+    @staticmethod
+    async def bucket_gc(*, dry_run: bool = False, workers: int = 8):
+        """
+        Remove bucket files that are no longer referenced by any downloaded file
+
+        Files hardlinked to download paths, or recorded in bucket index and \
+        still existing at download paths, are kept.
+
+        :param dry_run: Only report what would be removed
+        :param workers: Number of threads for scanning bucket
+        """
+        store = get_bucket_store()
+        if not store.root.is_dir():
+            return generate_msg("Bucket path does not exist", path=store.root)
+        result = await fs_executor.run("bucket_gc", store.gc, workers, dry_run)
+        return generate_msg(
+            "Bucket garbage collection dry run finished" if dry_run else "Bucket garbage collection finished",
+            **vars(result)
+        )
+
+    @staticmethod
+    async def bucket_verify(*, workers: int = 4):
+        """
+        Verify bucket files by the SHA-256 hash in their filenames
+
+        Corrupt files are marked in bucket index and will be downloaded again.
+
+        :param workers: Number of threads for hashing
+        """
+        store = get_bucket_store()
+        if not store.root.is_dir():
+            return generate_msg("Bucket path does not exist", path=store.root)
+        result = await fs_executor.run("bucket_verify", store.verify_all, workers)
+        return generate_msg("Bucket verification finished", **vars(result))
+
+    @staticmethod
+    async def bench(
+            scenarios: Tuple[str] = None,
+            *,
+            output: Path = None,
+            baseline: Path = None,
+            tolerance: float = 0.1,
+            scale: float = 1.0
+    ):
+        """
+        Benchmark a full ``sync_creator`` workload against a local stand-in server
+
+        Report files/s, MB/s, API calls/s, CPU seconds, peak RSS and event loop lag of each scenario. \
+        Exit with code 1 if any metric regressed from ``baseline``.
+
+        * Scenarios: ``tiny-images``, ``huge-videos``, ``high-error-rate``, ``mostly-existing``
+
+        :param scenarios: Comma-separated scenarios to run, all scenarios by default
+        :param output: Write results to a JSON file
+        :param baseline: JSON file of previous results to compare with
+        :param tolerance: Allowed relative regression from ``baseline``, e.g. ``0.1`` for 10%
+        :param scale: Scale the number of posts of scenarios, e.g. ``0.1`` for a quick run
+        """
+        scenarios = scenarios.split(",") if isinstance(scenarios, str) else scenarios or list(SCENARIOS)
+        if unknown := [x for x in scenarios if x not in SCENARIOS]:
+            return generate_msg("Unknown benchmark scenarios", unknown=unknown, available=list(SCENARIOS))
+        baseline_report = None
+        if baseline:
+            try:
+                async with aiofiles.open(str(baseline), encoding="utf-8") as f:
+                    baseline_report = json.loads(await f.read())
+            except (OSError, ValueError) as e:
+                return generate_msg("Failed to load benchmark baseline", path=baseline, exception=e)
+        # Scenarios start their own event loops, so run them outside the current one
+        report = await asyncio.get_running_loop().run_in_executor(
+            None,
+            run_benchmark,
+            [SCENARIOS[x].scaled(scale) for x in scenarios]
+        )
+        for result in report["results"].values():
+            logger.info(
+                generate_msg(
+                    f"Benchmark scenario {result['scenario']} finished",
+                    files=result["files"],
+                    failed=result["failed"],
+                    files_per_second=f"{result['files_per_second']:.2f}",
+                    mb_per_second=f"{result['mb_per_second']:.2f}",
+                    api_calls_per_second=f"{result['api_calls_per_second']:.2f}",
+                    cpu_seconds=f"{result['cpu_seconds']:.2f}",
+                    peak_rss_mb=result["peak_rss_mb"] and f"{result['peak_rss_mb']:.1f}",
+                    loop_lag_p99=f"{result['loop_lag_p99'] * 1000:.1f}ms"
+                )
+            )
+        if output:
+            async with aiofiles.open(str(output), "w", encoding="utf-8") as f:
+                await f.write(json.dumps(report, indent=config.json_dump_indent))
+            logger.info(f"Benchmark results written to {output}")
+        if baseline_report is not None:
+            if regressions := compare_with_baseline(report, baseline_report, tolerance):
+                for regression in regressions:
+                    logger.error(f"Benchmark regression: {regression}")
+                raise SystemExit(1)
+            logger.success(f"No regression from baseline {baseline}")
+        return None
@@ -1,3 +1,9 @@
 from .base import *
+from .bucket import *
+from .proxy import *
+from .ratelimit import *
+from .record import *
+from .source import *
+from .staging import *
 from .downloader import *
 from .utils import *
@@ -0,0 +1,460 @@
+import errno
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Literal, Optional, Dict, Tuple, Iterator, List
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from loguru import logger
+
+from ktoolbox.configuration import config
+from ktoolbox.utils import sha256_from_filename
+
+__all__ = [
+    "LinkStrategy",
+    "BlobState",
+    "INDEX_FILENAME",
+    "GcResult",
+    "VerifyResult",
+    "BucketIndex",
+    "BucketStore",
+    "get_bucket_store",
+    "link_or_copy"
+]
+
+LinkStrategy = Literal["auto", "hardlink", "reflink", "copy"]
+BlobState = Literal["unverified", "verified", "corrupt"]
+
+INDEX_FILENAME = "index.sqlite3"
+"""Filename of the reference index in the root of bucket"""
+
+_FICLONE = 0x40049409
+"""``ioctl`` request of Linux for cloning a file (reflink)"""
+
+_FALLBACK_ERRNOS = frozenset(
+    x for x in (
+        errno.EXDEV,
+        errno.EPERM,
+        errno.EMLINK,
+        errno.EINVAL,
+        errno.ENOTTY,
+        errno.EOPNOTSUPP,
+        getattr(errno, "ENOTSUP", None),
+        getattr(errno, "EBADF", None)
+    ) if x is not None
+)
+"""Errors meaning that the strategy is not supported between the two paths"""
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _reflink(src: Path, dst: Path):
+    """Clone ``src`` to a new file ``dst`` which shares data blocks (copy-on-write)"""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "Reflink is not supported on this platform", str(dst))
+    with open(src, "rb") as src_file:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            fcntl.ioctl(dst_fd, _FICLONE, src_file.fileno())
+        except OSError:
+            os.close(dst_fd)
+            os.remove(dst)
+            raise
+        os.close(dst_fd)
+
+
+def _copy(src: Path, dst: Path):
+    """Copy ``src`` to a new file ``dst``, the partial copy never appears at ``dst``"""
+    if os.path.lexists(dst):
+        raise FileExistsError(errno.EEXIST, "File exists", str(dst))
+    part = dst.with_name(f"{dst.name}.part")
+    shutil.copyfile(src, part)
+    os.replace(part, dst)
+
+
+_STRATEGY_FUNCS = {
+    "reflink": _reflink,
+    "hardlink": os.link,
+    "copy": _copy
+}
+
+_AUTO_ORDER: Tuple[str, ...] = ("reflink", "hardlink", "copy")
+
+
+def link_or_copy(src: Path, dst: Path) -> LinkStrategy:
+    """
+    Materialize ``src`` at ``dst`` which must not exist, by hardlink, or copy if linking is impossible
+
+    :return: Strategy used
+    """
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError as e:
+        if e.errno not in _FALLBACK_ERRNOS:
+            raise
+    _copy(src, dst)
+    return "copy"
+
+
+@dataclass
+class GcResult:
+    """Result of bucket garbage collection"""
+    scanned: int = 0
+    """Number of blobs scanned"""
+    removed: int = 0
+    """Number of unreferenced blobs removed (or would be removed in dry run)"""
+    freed_bytes: int = 0
+    """Bytes of removed blobs"""
+    dead_refs: int = 0
+    """Number of index references whose path no longer holds the blob"""
+    errors: int = 0
+    """Number of blobs failed to check or remove"""
+
+
+@dataclass
+class VerifyResult:
+    """Result of bucket integrity verification"""
+    verified: int = 0
+    """Number of blobs whose content matches the SHA-256 in filename"""
+    corrupt: int = 0
+    """Number of blobs whose content doesn't match"""
+    skipped: int = 0
+    """Number of blobs without SHA-256 in filename"""
+    errors: int = 0
+    """Number of blobs failed to read"""
+
+
+class BucketIndex:
+    """
+    Persisted reference index of bucket, stored in SQLite.
+
+    * ``blobs``: blob key (path relative to bucket root) -> size, integrity state
+    * ``refs``: library path -> blob key and the strategy used to materialize it
+
+    The connection is opened on first use and shared between threads with a lock.
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS blobs (
+        key TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        state TEXT NOT NULL DEFAULT 'unverified',
+        added REAL NOT NULL,
+        checked REAL
+    );
+    CREATE TABLE IF NOT EXISTS refs (
+        path TEXT PRIMARY KEY,
+        key TEXT NOT NULL,
+        strategy TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS refs_key ON refs (key);
+    """
+
+    def __init__(self, path: Path):
+        """
+        :param path: Path of the SQLite database file
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Database connection, call it with ``_lock`` held"""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self._SCHEMA)
+        return self._conn
+
+    def add_blob(self, key: str, size: int, state: BlobState = "unverified"):
+        """Record a new or replaced blob"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO blobs (key, size, state, added) VALUES (?, ?, ?, ?)",
+                (key, size, state, time.time())
+            )
+
+    def remove_blob(self, key: str):
+        """Remove a blob and its references"""
+        with self._lock:
+            self.conn.execute("DELETE FROM blobs WHERE key = ?", (key,))
+            self.conn.execute("DELETE FROM refs WHERE key = ?", (key,))
+
+    def get_state(self, key: str) -> Optional[BlobState]:
+        """Get integrity state of a blob, ``None`` if it's not indexed"""
+        with self._lock:
+            row = self.conn.execute("SELECT state FROM blobs WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, state: BlobState, size: int):
+        """Update integrity state of a blob, index it if not indexed yet"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO blobs (key, size, state, added, checked) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET state = excluded.state, size = excluded.size, "
+                "checked = excluded.checked",
+                (key, size, state, time.time(), time.time())
+            )
+
+    def add_ref(self, path: Path, key: str, strategy: str):
+        """Record that ``path`` references the blob"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO refs (path, key, strategy) VALUES (?, ?, ?)",
+                (str(Path(path).absolute()), key, strategy)
+            )
+
+    def get_refs(self, key: str) -> List[Tuple[str, str]]:
+        """Get ``(path, strategy)`` of references of a blob"""
+        with self._lock:
+            return self.conn.execute("SELECT path, strategy FROM refs WHERE key = ?", (key,)).fetchall()
+
+    def remove_refs(self, paths: List[str]):
+        """Remove references by path"""
+        with self._lock:
+            self.conn.executemany("DELETE FROM refs WHERE path = ?", ((x,) for x in paths))
+
+    def close(self):
+        """Close the connection, it will be reopened on next use"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class BucketStore:
+    """
+    Content-addressed blob store of bucket mode
+
+    Blobs are stored at their server path (e.g. ``data/ab/cd/<sha256>.png``) under the bucket root, \
+    which is already sharded by the hash prefixes. Files in library are materialized from blobs \
+    by reflink, hardlink or copy, and recorded in ``BucketIndex``.
+
+    With ``auto`` strategy, the first working strategy in ``reflink``, ``hardlink``, ``copy`` \
+    is chosen once for each pair of filesystems.
+    """
+
+    def __init__(self, root: Path, strategy: LinkStrategy = "auto"):
+        """
+        :param root: Bucket root path
+        :param strategy: Strategy to materialize files
+        """
+        self.root = Path(root)
+        self.strategy = strategy
+        self.index = BucketIndex(self.root / INDEX_FILENAME)
+        self._strategies: Dict[Tuple[int, int], str] = {}
+        self._strategies_lock = threading.Lock()
+
+    def key_of(self, blob: Path) -> str:
+        """Get blob key (POSIX path relative to bucket root)"""
+        return Path(blob).relative_to(self.root).as_posix()
+
+    def _link(self, src: Path, dst: Path) -> str:
+        """
+        Materialize ``src`` at ``dst`` which must not exist
+
+        :return: Strategy used
+        """
+        if self.strategy != "auto":
+            _STRATEGY_FUNCS[self.strategy](src, dst)
+            return self.strategy
+        fs_pair = (os.stat(src).st_dev, os.stat(dst.parent).st_dev)
+        with self._strategies_lock:
+            known = self._strategies.get(fs_pair)
+        candidates = (known,) if known else _AUTO_ORDER
+        for strategy in candidates:
+            try:
+                _STRATEGY_FUNCS[strategy](src, dst)
+            except OSError as e:
+                if known or e.errno not in _FALLBACK_ERRNOS:
+                    raise
+                continue
+            if not known:
+                with self._strategies_lock:
+                    self._strategies[fs_pair] = strategy
+                logger.debug(f"Bucket uses {strategy} between filesystem {fs_pair[0]} and {fs_pair[1]}")
+            return strategy
+        raise OSError(errno.EOPNOTSUPP, "No strategy available", str(dst))  # unreachable, copy always works
+
+    def put(self, src: Path, blob: Path, dst: Path = None) -> str:
+        """
+        Store a downloaded file as blob, replacing the existing one (e.g. corrupt) if any
+
+        :param src: Downloaded file
+        :param blob: Blob path
+        :param dst: Library path to move ``src`` to afterward, recorded as a reference of the blob
+        :return: Strategy used
+        """
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        staging = blob.with_name(f"{blob.name}.put")
+        if os.path.lexists(staging):
+            os.remove(staging)
+        strategy = self._link(src, staging)
+        os.replace(staging, blob)
+        key = self.key_of(blob)
+        self.index.add_blob(key, os.stat(blob).st_size)
+        if dst is not None:
+            os.replace(src, dst)
+            self.index.add_ref(dst, key, strategy)
+        return strategy
+
+    def checkout(self, blob: Path, dst: Path) -> str:
+        """
+        Materialize a blob at library path and record the reference
+
+        :param blob: Blob path
+        :param dst: Library path, must not exist
+        :return: Strategy used
+        """
+        strategy = self._link(blob, dst)
+        self.index.add_ref(dst, self.key_of(blob), strategy)
+        return strategy
+
+    def is_usable(self, blob: Path) -> bool:
+        """Check if an existing blob can be used, i.e. not marked ``corrupt``"""
+        return self.index.get_state(self.key_of(blob)) != "corrupt"
+
+    def iter_blobs(self) -> Iterator[Path]:
+        """Iterate all blobs in bucket"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            directory = Path(dirpath)
+            for filename in filenames:
+                if directory == self.root and filename.startswith(INDEX_FILENAME):
+                    continue
+                if filename.endswith((".put", ".part", ".hlink")):
+                    continue
+                yield directory / filename
+
+    def verify(self, blob: Path) -> Optional[BlobState]:
+        """
+        Verify blob content with the SHA-256 in filename and record the state
+
+        :return: New state, ``None`` if the filename doesn't contain SHA-256
+        """
+        if not (expected := sha256_from_filename(blob.name)):
+            return None
+        digest = hashlib.sha256()
+        size = 0
+        with open(blob, "rb") as f:
+            while chunk := f.read(_HASH_CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+        state: BlobState = "verified" if digest.hexdigest() == expected else "corrupt"
+        self.index.set_state(self.key_of(blob), state, size)
+        return state
+
+    def verify_all(self, workers: int = 4) -> VerifyResult:
+        """Verify all blobs in parallel"""
+        result = VerifyResult()
+
+        def verify(blob: Path) -> Optional[str]:
+            try:
+                return self.verify(blob) or "skipped"
+            except OSError:
+                logger.exception(f"Failed to verify blob {blob}")
+                return "errors"
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ktoolbox-bucket") as executor:
+            for outcome in executor.map(verify, self.iter_blobs()):
+                setattr(result, outcome, getattr(result, outcome) + 1)
+        return result
+
+    @staticmethod
+    def _ref_alive(path: str, strategy: str, blob_stat: os.stat_result) -> bool:
+        """Check if the library path still holds the blob"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if strategy == "hardlink":
+            return (stat.st_dev, stat.st_ino) == (blob_stat.st_dev, blob_stat.st_ino)
+        return stat.st_size == blob_stat.st_size
+
+    def _collect(self, blob: Path, dry_run: bool) -> Tuple[int, int, int]:
+        """
+        Check one blob and remove it if unreferenced
+
+        :return: ``(removed, freed bytes, dead references)``
+        """
+        key = self.key_of(blob)
+        blob_stat = os.stat(blob)
+        refs = self.index.get_refs(key)
+        dead = [path for path, strategy in refs if not self._ref_alive(path, strategy, blob_stat)]
+        if dead and not dry_run:
+            self.index.remove_refs(dead)
+        # Hardlinks are counted by filesystem, which also covers blobs linked before the index existed
+        if blob_stat.st_nlink > 1 or len(dead) < len(refs):
+            return 0, 0, len(dead)
+        if not dry_run:
+            os.remove(blob)
+            self.index.remove_blob(key)
+        return 1, blob_stat.st_size, len(dead)
+
+    def gc(self, workers: int = 8, dry_run: bool = False) -> GcResult:
+        """
+        Remove blobs that no library file references, in parallel
+
+        A blob is referenced if it has other hardlinks, or any indexed \
+        reflink/copy reference still exists with the same size.
+
+        :param workers: Number of threads
+        :param dry_run: Only count, don't remove anything
+        """
+        result = GcResult()
+        removed_dirs = set()
+
+        def collect(blob: Path) -> Optional[Tuple[Path, int, int, int]]:
+            try:
+                return (blob, *self._collect(blob, dry_run))
+            except OSError:
+                logger.exception(f"Failed to collect blob {blob}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ktoolbox-bucket") as executor:
+            for outcome in executor.map(collect, self.iter_blobs()):
+                result.scanned += 1
+                if outcome is None:
+                    result.errors += 1
+                    continue
+                blob, removed, freed, dead = outcome
+                result.removed += removed
+                result.freed_bytes += freed
+                result.dead_refs += dead
+                if removed:
+                    removed_dirs.add(blob.parent)
+
+        # Prune empty shard directories
+        if not dry_run:
+            for directory in sorted(removed_dirs, key=lambda x: len(x.parts), reverse=True):
+                while directory != self.root and self.root in directory.parents:
+                    try:
+                        directory.rmdir()
+                    except OSError:
+                        break
+                    directory = directory.parent
+        return result
+
+
+@lru_cache(maxsize=4)
+def _get_bucket_store(root: Path, strategy: LinkStrategy) -> BucketStore:
+    return BucketStore(root, strategy)
+
+
+def get_bucket_store() -> BucketStore:
+    """Get ``BucketStore`` of ``DownloaderConfiguration.bucket_path``, shared for the same configuration"""
+    return _get_bucket_store(Path(config.downloader.bucket_path), config.downloader.bucket_link_strategy)
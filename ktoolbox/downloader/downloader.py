@@ -1,9 +1,10 @@
 import asyncio
-import os
+import time
+import weakref
 from asyncio import CancelledError, Lock
-from functools import cached_property
+from functools import cached_property, partial
 from pathlib import Path
-from typing import Callable, Any, Coroutine, Type, Optional, Set
+from typing import Callable, Any, Coroutine, Type, Optional, Set, Dict, Mapping, List
 from urllib.parse import urlparse, unquote
 
 import aiofiles
@@ -20,19 +21,67 @@ from ktoolbox._enum import RetCodeEnum
 from ktoolbox.api.model import Post
 from ktoolbox.configuration import config
 from ktoolbox.downloader.base import DownloaderRet
-from ktoolbox.downloader.utils import filename_from_headers, duplicate_file_check, utime_from_headers
+from ktoolbox.downloader.bucket import get_bucket_store, link_or_copy
+from ktoolbox.downloader.proxy import ProxyPool, PROXY_FAILURE_STATUS
+from ktoolbox.downloader.ratelimit import BandwidthLimiter
+from ktoolbox.downloader.record import TransferRecord
+from ktoolbox.downloader.source import ContentSourceChain
+from ktoolbox.downloader.staging import StagingArea, preallocate
+from ktoolbox.downloader.utils import filename_from_headers, async_duplicate_file_check, utime_from_headers, \
+    parse_content_range, validator_from_headers, read_validator, write_validator
+from ktoolbox.filesystem import fs_executor, DirectoryCache
+from ktoolbox.monitor import event_stream, metrics, tracer, traced
 from ktoolbox.utils import generate_msg
 
 __all__ = ["Downloader"]
 
 
+def _file_size(path: Path) -> int:
+    """Get file size, ``0`` if the file doesn't exist"""
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _before_retry_sleep(retry_state: tenacity.RetryCallState):
+    """Log and emit the retry of ``Downloader.run``"""
+    downloader: "Downloader" = retry_state.args[0]
+    message = retry_state.outcome.result().message if not retry_state.outcome.failed else None
+    exception = retry_state.outcome.exception()
+    downloader.record.retries += 1
+    downloader.record.retry_reasons.append(message or repr(exception))
+    logger.warning(
+        generate_msg(
+            f"Retrying ({retry_state.attempt_number})",
+            file=downloader.filename,
+            post_name=downloader.post.title if downloader.post else None,
+            post_id=downloader.post.id if downloader.post else None,
+            message=message,
+            exception=exception,
+            url=downloader.url
+        )
+    )
+    metrics.retries.labels("download").inc()
+    event_stream.emit(
+        "retry",
+        server_path=downloader.server_path,
+        attempt=retry_state.attempt_number,
+        host=httpx.URL(downloader._url).host,
+        message=message,
+        exception=repr(exception) if exception else None
+    )
+
+
 class Downloader:
     """
     :ivar _save_filename: The actual filename for saving.
     """
     succeeded_servers: Set[int] = set()
     failure_servers: Set[int] = set()
-    wait_lock = Lock()
+    range_support: Dict[str, bool] = {}
+    """Whether the host honors ``Range`` requests, ``host`` -> ``bool``"""
+    _wait_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Lock]" = weakref.WeakKeyDictionary()
 
     def __init__(
             self,
@@ -44,7 +93,12 @@ class Downloader:
             chunk_size: int = None,
             designated_filename: str = None,
             server_path: str = None,
-            post: Post = None
+            post: Post = None,
+            dir_cache: DirectoryCache = None,
+            bandwidth_limiter: BandwidthLimiter = None,
+            proxy_pool: ProxyPool = None,
+            content_sources: ContentSourceChain = None,
+            staging: StagingArea = None
     ):
         # noinspection GrazieInspection
         """
@@ -64,6 +118,14 @@ class Downloader:
         :param server_path: Server path of the file. if ``DownloaderConfiguration.use_bucket`` enabled, \
         it will be used as the save path.
         :param post: Post object, use for logging.
+        :param dir_cache: Directory cache for file existence checks, shared by downloaders of one run.
+        :param bandwidth_limiter: Bandwidth limiter applied to received chunks, shared by downloaders of one run.
+        :param proxy_pool: Pool of download egress endpoints, shared by downloaders of one run. \
+        Download directly with ``DownloaderConfiguration.reverse_proxy`` if not given.
+        :param content_sources: Content sources (e.g. peer caches) tried before the origin, \
+        after the bucket (if ``DownloaderConfiguration.use_bucket`` enabled).
+        :param staging: Staging area of temp files, shared by downloaders of one run. \
+        Created by ``DownloaderConfiguration.staging_path`` if not given.
         """
 
         self._url = self._initial_url = url
@@ -75,16 +137,28 @@ class Downloader:
         self._server_path = server_path  # /hash[:1]/hash2[1:3]/hash
         self._save_filename = designated_filename  # Prioritize the manually specified filename
         self._post = post
+        self._dir_cache = dir_cache
+        self._bandwidth_limiter = bandwidth_limiter
+        self._proxy_pool = proxy_pool or ProxyPool()
+        self._content_sources = content_sources
+        self._staging = staging if staging is not None else StagingArea.from_config()
 
         self._next_subdomain_index = 1
         self._finished_lock = asyncio.Lock()
         self._stop: bool = False
+        self._downloaded_bytes = 0
+        self._record = TransferRecord(server_path=server_path)
 
     @cached_property
     def url(self) -> str:
         """Download URL"""
         return self._url
 
+    @cached_property
+    def server_path(self) -> str:
+        """Server path of the file"""
+        return self._server_path
+
     @cached_property
     def path(self) -> Path:
         """Directory path to save the file"""
@@ -115,6 +189,25 @@ class Downloader:
         """Actual filename of the download file"""
         return self._save_filename
 
+    @property
+    def downloaded_bytes(self) -> int:
+        """Number of bytes received from server, including failed attempts"""
+        return self._downloaded_bytes
+
+    @property
+    def wait_lock(self) -> Lock:
+        """Lock shared by downloaders of the running event loop, to keep requests under ``tps_limit``"""
+        loop = asyncio.get_running_loop()
+        lock = self._wait_locks.get(loop)
+        if lock is None:
+            lock = self._wait_locks[loop] = Lock()
+        return lock
+
+    @property
+    def record(self) -> TransferRecord:
+        """Transfer record of the download, ``outcome`` and ``duration`` are left to the job runner"""
+        return self._record
+
     @property
     def finished(self) -> bool:
         """
@@ -140,19 +233,10 @@ class Downloader:
         ) | retry_if_exception(
             lambda x: isinstance(x, httpx.HTTPError)
         ),
-        before_sleep=lambda x: logger.warning(
-            generate_msg(
-                f"Retrying ({x.attempt_number})",
-                file=x.args[0].filename,
-                post_name=x.args[0].post.title if x.args[0].post else None,
-                post_id=x.args[0].post.id if x.args[0].post else None,
-                message=x.outcome.result().message if not x.outcome.failed else None,
-                exception=x.outcome.exception(),
-                url=x.args[0].url
-            )
-        ),
+        before_sleep=_before_retry_sleep,
         reraise=True
     )
+    @traced("Downloader.run", "download")
     async def run(
             self,
             *,
@@ -168,7 +252,8 @@ class Downloader:
         :param async_callable: Async callable for download finished
         :param tqdm_class: ``tqdm`` class to replace default ``tqdm.asyncio.tqdm``
         :param progress: Show progress bar
-        :return: ``DownloaderRet`` which contain the actual output filename
+        :return: ``DownloaderRet`` which contain the actual output filename, \
+        or the filename of the existing file for ``FileExisted`` (``None`` if skipped by size filtering)
         :raise CancelledError: Job cancelled
         """
         # Get filename to check if file exists (First-time duplicate file check)
@@ -185,35 +270,78 @@ class Downloader:
             bucket_file_path = config.downloader.bucket_path / server_relpath
 
         # Check if the file exists
-        file_existed, ret_msg = duplicate_file_check(save_filepath, bucket_file_path)
+        file_existed, ret_msg = await async_duplicate_file_check(
+            save_filepath, bucket_file_path, self._dir_cache
+        )
         if file_existed:
             return DownloaderRet(
                 code=RetCodeEnum.FileExisted,
                 message=generate_msg(
                     ret_msg,
                     path=save_filepath
-                )
+                ),
+                data=save_filepath.name
             )
 
         tqdm_class: Type[std_tqdm] = tqdm_class or tqdm.asyncio.tqdm
-        async with self.wait_lock:
-            await asyncio.sleep(1 / config.downloader.tps_limit)
-        async with self._finished_lock:
-            temp_filepath = Path(f"{save_filepath}.{config.downloader.temp_suffix}")
-            temp_size = temp_filepath.stat().st_size if temp_filepath.exists() else 0
 
-            async with self._client.stream(
+        # Try other content sources before the origin
+        if self._content_sources:
+            async with self._finished_lock:
+                ret = await self._fetch_from_sources(
+                    save_filepath,
+                    bucket_file_path,
+                    server_path_filename,
+                    sync_callable,
+                    async_callable,
+                    tqdm_class,
+                    progress
+                )
+            if ret is not None:
+                return ret
+
+        with tracer.span("Downloader.wait_lock", "download"):
+            async with self.wait_lock:
+                await asyncio.sleep(1 / config.downloader.tps_limit)
+        async with self._finished_lock, self._proxy_pool.lease(self._client) as lease:
+            temp_filepath = self._staging.temp_path(save_filepath)
+            validator_filepath = Path(f"{temp_filepath}.validator")
+            temp_size, validator = await fs_executor.batch(
+                "stat",
+                partial(_file_size, temp_filepath),
+                partial(read_validator, validator_filepath)
+            )
+
+            # Make sure the resumed temp file belongs to the same object by `If-Range`
+            url = lease.format(self._url)
+            host = httpx.URL(url).host
+            headers = {}
+            if range_requested := self.range_support.get(host, True):
+                headers["Range"] = f"bytes={temp_size}-"
+                if temp_size and validator:
+                    headers["If-Range"] = validator
+
+            request_started = time.perf_counter()
+            async with lease.client.stream(
                     method="GET",
-                    url=config.downloader.reverse_proxy.format(self._url),
+                    url=url,
                     follow_redirects=True,
                     timeout=config.downloader.timeout,
-                    headers={"Range": f"bytes={temp_size}-"}
+                    headers=headers
             ) as res:  # type: httpx.Response
+                self._record.ttfb = time.perf_counter() - request_started
+                self._record.url = str(res.url)
+                self._record.host = res.url.host
+                self._record.hosts.append(res.url.host)
+                self._record.status = res.status_code
+                if res.status_code in PROXY_FAILURE_STATUS:
+                    lease.failed = True
                 try:
                     subdomain_index = int(res.url.netloc.split(b".")[0][1:])
                 except ValueError:
                     subdomain_index = None
                 if res.status_code == 403:
+                    metrics.forbidden_responses.labels(res.url.host).inc()
                     if subdomain_index is not None:
                         self.succeeded_servers.discard(subdomain_index)
                         self.failure_servers.add(subdomain_index)
@@ -245,7 +373,11 @@ class Downloader:
                             filename=save_filepath
                         )
                     )
-                elif res.status_code != httpx.codes.PARTIAL_CONTENT:
+                elif res.status_code not in (
+                        httpx.codes.OK,
+                        httpx.codes.PARTIAL_CONTENT,
+                        httpx.codes.REQUESTED_RANGE_NOT_SATISFIABLE
+                ):
                     self._url = self._initial_url
                     return DownloaderRet(
                         code=RetCodeEnum.GeneralFailure,
@@ -260,24 +392,71 @@ class Downloader:
                         self.failure_servers.discard(subdomain_index)
                         self.succeeded_servers.add(subdomain_index)
 
+                # Decide whether to resume the temp file, restart it, or it's already complete
+                content_range = parse_content_range(res.headers.get("Content-Range"))
+                completed = False
+                if res.status_code == httpx.codes.PARTIAL_CONTENT:
+                    self.range_support[host] = True
+                    if not content_range or content_range[0] != temp_size:
+                        await fs_executor.batch(
+                            "truncate",
+                            partial(temp_filepath.unlink, missing_ok=True),
+                            partial(write_validator, validator_filepath, None)
+                        )
+                        return DownloaderRet(
+                            code=RetCodeEnum.GeneralFailure,
+                            message=generate_msg(
+                                "Unexpected partial content, restarting download",
+                                content_range=res.headers.get("Content-Range"),
+                                temp_size=temp_size,
+                                filename=save_filepath
+                            )
+                        )
+                elif res.status_code == httpx.codes.REQUESTED_RANGE_NOT_SATISFIABLE:
+                    # The temp file may be complete already, e.g. interrupted before renaming
+                    if not (temp_size and content_range and content_range[2] == temp_size):
+                        await fs_executor.batch(
+                            "truncate",
+                            partial(temp_filepath.unlink, missing_ok=True),
+                            partial(write_validator, validator_filepath, None)
+                        )
+                        return DownloaderRet(
+                            code=RetCodeEnum.GeneralFailure,
+                            message=generate_msg(
+                                "Requested range not satisfiable, restarting download",
+                                content_range=res.headers.get("Content-Range"),
+                                temp_size=temp_size,
+                                filename=save_filepath
+                            )
+                        )
+                    completed = True
+                else:
+                    # Full content, the server ignores `Range`, or the object changed (`If-Range` mismatch)
+                    if range_requested and "If-Range" not in headers:
+                        self.range_support[host] = False
+                    temp_size = 0
+
                 # Get filename for saving and check if file exists (Second-time duplicate file check)
                 # Priority order can be referenced from the constructor's documentation
                 self._save_filename = self._designated_filename or sanitize_filename(
                     filename_from_headers(res.headers)
                 ) or server_path_filename
                 save_filepath = self._path / self._save_filename
-                file_existed, ret_msg = duplicate_file_check(save_filepath, bucket_file_path)
+                file_existed, ret_msg = await async_duplicate_file_check(
+                    save_filepath, bucket_file_path, self._dir_cache
+                )
                 if file_existed:
                     return DownloaderRet(
                         code=RetCodeEnum.FileExisted,
                         message=generate_msg(
                             ret_msg,
                             path=save_filepath
-                        )
+                        ),
+                        data=self._save_filename
                     )
 
                 # Download
-                total_size = int(range_str.split("/")[-1]) if (range_str := res.headers.get("Content-Range")) else None
+                total_size = content_range[2] if content_range else None
                 
                 # Check file size filtering if enabled and we have the total size
                 if total_size is not None and (config.job.min_file_size is not None or config.job.max_file_size is not None):
@@ -335,41 +514,261 @@ class Downloader:
                         except ValueError:
                             # Invalid Content-Length, continue with download
                             pass
-                async with aiofiles.open(str(temp_filepath), "ab", self._buffer_size) as f:
-                    chunk_iterator = res.aiter_bytes(self._chunk_size)
-                    t = tqdm_class(
-                        desc=self._save_filename,
-                        total=total_size,
-                        initial=temp_size,
-                        disable=not progress,
-                        unit="B",
-                        unit_scale=True
+                self._record.source = "origin"
+                self._record.offset = temp_size
+                self._record.total = total_size
+                if not completed:
+                    event_stream.emit(
+                        "download_started",
+                        server_path=self._server_path,
+                        filename=self._save_filename,
+                        host=host,
+                        status=res.status_code,
+                        offset=temp_size,
+                        total=total_size
                     )
-                    async for chunk in chunk_iterator:
-                        if self._stop:
-                            raise CancelledError
-                        await f.write(chunk)
-                        t.update(len(chunk))  # Update progress bar
+                    if (new_validator := validator_from_headers(res.headers)) != validator:
+                        await fs_executor.run("validator", write_validator, validator_filepath, new_validator)
+                    async with aiofiles.open(str(temp_filepath), "ab" if temp_size else "wb", self._buffer_size) as f:
+                        if config.downloader.preallocate and total_size:
+                            await fs_executor.run(
+                                "preallocate", preallocate, f.fileno(), temp_size, total_size - temp_size
+                            )
+                        chunk_iterator = res.aiter_bytes(self._chunk_size)
+                        t = tqdm_class(
+                            desc=self._save_filename,
+                            total=total_size,
+                            initial=temp_size,
+                            disable=not progress,
+                            unit="B",
+                            unit_scale=True
+                        )
+                        creator = (self._post.service, self._post.user) if self._post else None
+                        transfer_started = time.perf_counter()
+                        received_before = self._downloaded_bytes
+                        try:
+                            async for chunk in chunk_iterator:
+                                if self._stop:
+                                    raise CancelledError
+                                if self._bandwidth_limiter:
+                                    await self._bandwidth_limiter.acquire(len(chunk), host=host, creator=creator)
+                                await f.write(chunk)
+                                self._downloaded_bytes += len(chunk)
+                                metrics.downloaded_bytes.inc(len(chunk))
+                                t.update(len(chunk))  # Update progress bar
+                        finally:
+                            self._record.transfer_time = time.perf_counter() - transfer_started
+                            self._record.transfer_bytes = self._downloaded_bytes - received_before
+                            self._record.bytes = self._downloaded_bytes
 
             # Download finished
-            if config.downloader.use_bucket:
-                bucket_file_path.parent.mkdir(parents=True, exist_ok=True)
-                os.link(temp_filepath, bucket_file_path)
-            final_filepath = self._path / self._save_filename
-            temp_filepath.rename(final_filepath)
+            return await self._finish(
+                temp_filepath,
+                bucket_file_path,
+                res.headers,
+                sync_callable,
+                async_callable,
+                cleanup=[validator_filepath]
+            )
 
-            # Set file time from headers
-            if config.downloader.keep_metadata:
-                try:
-                    utime_from_headers(res.headers, final_filepath)
-                except (OSError, ValueError, TypeError) as e:
-                    logger.warning(
-                        generate_msg(
-                            "Failed to set file time from headers",
-                            file=self._save_filename,
-                            exception=e
-                        )
+    @traced("Downloader.content_sources", "download")
+    async def _fetch_from_sources(
+            self,
+            save_filepath: Path,
+            bucket_file_path: Optional[Path],
+            server_path_filename: str,
+            sync_callable: Optional[Callable[["Downloader"], Any]],
+            async_callable: Optional[Callable[["Downloader"], Coroutine]],
+            tqdm_class: Type[std_tqdm],
+            progress: bool
+    ) -> Optional[DownloaderRet[str]]:
+        """
+        Fetch from ``self._content_sources``, the temp file of origin download is left untouched on miss
+
+        Transfers go through the bandwidth limiter and progress bar like origin downloads.
+
+        :return: ``DownloaderRet`` on hit, ``None`` on miss
+        """
+        temp_filepath = self._staging.temp_path(save_filepath)
+        source_filepath = Path(f"{temp_filepath}.source")
+        creator = (self._post.service, self._post.user) if self._post else None
+        t: Optional[std_tqdm] = None  # Created on the first chunk, so that misses don't show a progress bar
+        fetch_started = time.perf_counter()
+        transfer_started = fetch_started
+        received_before = self._downloaded_bytes
+
+        async def on_chunk(size: int, host: str):
+            nonlocal t, transfer_started, received_before
+            if self._stop:
+                raise CancelledError
+            # First chunk from a source, measured from the start of the fetch as sources are tried in turn
+            if host != self._record.host or t is None:
+                transfer_started = time.perf_counter()
+                received_before = self._downloaded_bytes
+                self._record.ttfb = transfer_started - fetch_started
+                self._record.host = host
+                self._record.hosts.append(host)
+            if self._bandwidth_limiter:
+                await self._bandwidth_limiter.acquire(size, host=host, creator=creator)
+            self._downloaded_bytes += size
+            self._record.bytes = self._downloaded_bytes
+            metrics.downloaded_bytes.inc(size)
+            if t is None:
+                t = tqdm_class(
+                    desc=self._save_filename or server_path_filename,
+                    disable=not progress,
+                    unit="B",
+                    unit_scale=True
+                )
+            t.update(size)
+
+        try:
+            source = await self._content_sources.fetch(self._server_path, source_filepath, on_chunk)
+        finally:
+            if t is not None:
+                t.close()
+        if source is None:
+            return None
+        self._record.transfer_bytes = self._downloaded_bytes - received_before
+        self._record.transfer_time = time.perf_counter() - transfer_started
+        size = await fs_executor.run("stat", _file_size, source_filepath)
+        if (config.job.min_file_size is not None and size < config.job.min_file_size) or \
+                (config.job.max_file_size is not None and size > config.job.max_file_size):
+            await fs_executor.run("unlink", source_filepath.unlink, missing_ok=True)
+            return DownloaderRet(
+                code=RetCodeEnum.FileExisted,  # Use FileExisted to indicate it was skipped intentionally
+                message=generate_msg(
+                    f"File skipped due to size filtering (size: {size} bytes)",
+                    path=save_filepath
+                )
+            )
+        logger.debug(generate_msg("Fetched from content source", source=source.name, path=save_filepath))
+        self._record.source = source.name
+        self._record.total = size
+        self._save_filename = self._save_filename or server_path_filename
+        return await self._finish(
+            source_filepath,
+            bucket_file_path,
+            {},
+            sync_callable,
+            async_callable,
+            cleanup=[temp_filepath, Path(f"{temp_filepath}.validator")]
+        )
+
+    @traced("Downloader.finish", "filesystem")
+    async def _finish(
+            self,
+            temp_filepath: Path,
+            bucket_file_path: Optional[Path],
+            headers: Mapping[str, str],
+            sync_callable: Optional[Callable[["Downloader"], Any]],
+            async_callable: Optional[Callable[["Downloader"], Coroutine]],
+            *,
+            cleanup: List[Path] = None
+    ) -> DownloaderRet[str]:
+        """
+        Move the completed temp file to the final path (and bucket), then run callbacks
+
+        :param temp_filepath: Completed temp file
+        :param bucket_file_path: Bucket file path if ``DownloaderConfiguration.use_bucket`` enabled
+        :param headers: Response headers for file time
+        :param cleanup: Other files to remove, e.g. the saved validator
+        """
+        final_filepath = self._path / self._save_filename
+        temp_filepath = await self._staging.promote(temp_filepath, final_filepath)
+        finish_calls = []
+        if config.downloader.use_bucket:
+            finish_calls.append(
+                partial(get_bucket_store().put, temp_filepath, bucket_file_path, final_filepath)
+            )
+        else:
+            finish_calls.append(partial(temp_filepath.rename, final_filepath))
+        finish_calls += [partial(x.unlink, missing_ok=True) for x in cleanup or []]
+        await fs_executor.batch("finish", *finish_calls)
+        if self._dir_cache:
+            self._dir_cache.add(final_filepath)
+            if config.downloader.use_bucket:
+                self._dir_cache.add(bucket_file_path)
+
+        # Set file time from headers
+        if config.downloader.keep_metadata:
+            try:
+                await fs_executor.run("utime", utime_from_headers, headers, final_filepath)
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(
+                    generate_msg(
+                        "Failed to set file time from headers",
+                        file=self._save_filename,
+                        exception=e
                     )
+                )
+
+        # Callbacks
+        if sync_callable:
+            sync_callable(self)
+        if async_callable:
+            await async_callable(self)
+
+        return DownloaderRet(
+            data=self._save_filename
+        ) if self._save_filename else DownloaderRet(
+            code=RetCodeEnum.GeneralFailure,
+            message=generate_msg(
+                "Download failed",
+                filename=self._designated_filename
+            )
+        )
+
+    @traced("Downloader.run_from", "filesystem")
+    async def run_from(
+            self,
+            src: Path,
+            *,
+            sync_callable: Callable[["Downloader"], Any] = None,
+            async_callable: Callable[["Downloader"], Coroutine] = None
+    ) -> DownloaderRet[str]:
+        """
+        Materialize the file from ``src`` downloaded by another downloader of the same server path, \
+        by hardlink, or copy if linking is impossible, instead of requesting the server
+
+        :param src: File downloaded for the same server path
+        :param sync_callable: Sync callable for download finished
+        :param async_callable: Async callable for download finished
+        :return: ``DownloaderRet`` which contain the actual output filename
+        :raise OSError: ``src`` is unavailable
+        """
+        self._save_filename = self._save_filename or src.name
+        save_filepath = self._path / self._save_filename
+        bucket_file_path: Optional[Path] = None
+        if config.downloader.use_bucket:
+            bucket_file_path = config.downloader.bucket_path / self._server_path[1:]
+
+        async with self._finished_lock:
+            file_existed, ret_msg = await async_duplicate_file_check(
+                save_filepath, bucket_file_path, self._dir_cache
+            )
+            if file_existed:
+                return DownloaderRet(
+                    code=RetCodeEnum.FileExisted,
+                    message=generate_msg(
+                        ret_msg,
+                        path=save_filepath
+                    ),
+                    data=self._save_filename
+                )
+            transfer_started = time.perf_counter()
+            _, _, size = await fs_executor.batch(
+                "link",
+                partial(self._path.mkdir, parents=True, exist_ok=True),
+                partial(link_or_copy, src, save_filepath),
+                partial(_file_size, save_filepath)
+            )
+            if self._dir_cache:
+                self._dir_cache.add(save_filepath)
+            # Nothing is received, so ``bytes`` stays 0 and the transfer is the materialization
+            self._record.source = "shared"
+            self._record.total = self._record.transfer_bytes = size
+            self._record.transfer_time = time.perf_counter() - transfer_started
 
             # Callbacks
             if sync_callable:
@@ -377,14 +776,6 @@ class Downloader:
             if async_callable:
                 await async_callable(self)
 
-            return DownloaderRet(
-                data=self._save_filename
-            ) if self._save_filename else DownloaderRet(
-                code=RetCodeEnum.GeneralFailure,
-                message=generate_msg(
-                    "Download failed",
-                    filename=self._designated_filename
-                )
-            )
+            return DownloaderRet(data=self._save_filename)
 
     __call__ = run
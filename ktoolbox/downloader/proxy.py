@@ -0,0 +1,224 @@
+import asyncio
+import inspect
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Optional, Dict, Deque
+
+import httpx
+from loguru import logger
+
+from ktoolbox.configuration import config, ProxyEndpoint
+from ktoolbox.utils import generate_msg
+
+__all__ = ["EndpointStats", "ProxyLease", "ProxyPool", "PROXY_FAILURE_STATUS"]
+
+PROXY_FAILURE_STATUS = frozenset({407, 502, 504})
+"""Response status codes counted as failure of the proxy endpoint"""
+
+_MAX_COOLDOWN_FACTOR = 10
+_HTTPX_PROXY_PARAM = "proxy" if "proxy" in inspect.signature(httpx.AsyncClient).parameters else "proxies"
+
+
+@dataclass
+class EndpointStats:
+    """Health and usage of a proxy endpoint"""
+    active: int = 0
+    """Number of downloads in process"""
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    ejections: int = 0
+    """Number of consecutive ejections, reset on success"""
+    ejected_until: float = 0.0
+    """``time.monotonic()`` when the endpoint is re-admitted"""
+
+
+class _Endpoint:
+    def __init__(self, endpoint: ProxyEndpoint):
+        self.config = endpoint
+        self.stats = EndpointStats()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def name(self) -> str:
+        """Endpoint name without credentials"""
+        if self.config.proxy:
+            url = httpx.URL(self.config.proxy)
+            return f"{url.scheme}://{url.host}" + (f":{url.port}" if url.port else "")
+        return self.config.reverse_proxy or "direct"
+
+    def ejected(self, now: float) -> bool:
+        return self.stats.ejected_until > now
+
+    def has_capacity(self) -> bool:
+        return self.config.max_connections is None or self.stats.active < self.config.max_connections
+
+    def client(self, default_client: httpx.AsyncClient) -> httpx.AsyncClient:
+        """HTTPX client through the proxy, or ``default_client`` if no proxy"""
+        if not self.config.proxy:
+            return default_client
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                verify=config.ssl_verify,
+                cookies={"session": config.api.session_key} if config.api.session_key else None,
+                **{_HTTPX_PROXY_PARAM: self.config.proxy}
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class ProxyLease:
+    """
+    An endpoint leased for one download attempt, use it with ``async with``
+
+    Set ``failed`` to report a failure caused by the endpoint, \
+    ``httpx.TransportError`` raised in the ``async with`` block is reported automatically.
+    """
+
+    def __init__(self, pool: "ProxyPool", default_client: httpx.AsyncClient):
+        self._pool = pool
+        self._default_client = default_client
+        self._endpoint: Optional[_Endpoint] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        """HTTPX client to use"""
+        self.failed = False
+        self._acquired = 0.0
+
+    @property
+    def name(self) -> str:
+        """Endpoint name, for logging"""
+        return self._endpoint.name
+
+    def format(self, url: str) -> str:
+        """Apply the reverse proxy template of endpoint"""
+        return (self._endpoint.config.reverse_proxy or config.downloader.reverse_proxy).format(url)
+
+    async def __aenter__(self) -> "ProxyLease":
+        self._endpoint = await self._pool.acquire()
+        self._acquired = time.monotonic()
+        self.client = self._endpoint.client(self._default_client)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._pool.release(
+            self._endpoint,
+            failed=self.failed or isinstance(exc_val, httpx.TransportError),
+            acquired=self._acquired
+        )
+
+
+class ProxyPool:
+    """
+    Weighted pool of reverse proxy templates and HTTP/SOCKS proxies for downloads
+
+    Each download goes to the healthy endpoint with the lowest load (active downloads / weight) \
+    under its ``max_connections``. Endpoints are ejected after consecutive failures and \
+    re-admitted after a cooldown, which doubles on each repeated ejection.
+    """
+
+    def __init__(self, endpoints: List[ProxyEndpoint] = None, *, eject_failures: int = 3, cooldown: float = 60.0):
+        """
+        :param endpoints: Endpoints, a direct endpoint with ``DownloaderConfiguration.reverse_proxy`` if empty
+        :param eject_failures: Number of consecutive failures to eject an endpoint
+        :param cooldown: Seconds before an ejected endpoint is re-admitted
+        """
+        self._endpoints = [_Endpoint(x) for x in endpoints or [ProxyEndpoint()]]
+        self._implicit = not endpoints
+        """Whether the pool only has the implicit direct endpoint, which is never ejected"""
+        self._eject_failures = eject_failures
+        self._cooldown = cooldown
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @classmethod
+    def from_config(cls) -> "ProxyPool":
+        """Create from ``DownloaderConfiguration``"""
+        return cls(
+            config.downloader.proxy_pool,
+            eject_failures=config.downloader.proxy_eject_failures,
+            cooldown=config.downloader.proxy_eject_cooldown
+        )
+
+    def stats(self) -> Dict[str, EndpointStats]:
+        """Get a snapshot of statistics, ``endpoint name`` -> ``EndpointStats``"""
+        return {x.name: EndpointStats(**vars(x.stats)) for x in self._endpoints}
+
+    def _select(self) -> Optional[_Endpoint]:
+        now = time.monotonic()
+        available = [x for x in self._endpoints if x.has_capacity()]
+        if not available:
+            return None
+        # Fall back to the endpoint re-admitted soonest if all are ejected
+        candidates = [x for x in available if not x.ejected(now)] or \
+            [min(available, key=lambda x: x.stats.ejected_until)]
+        return min(candidates, key=lambda x: (x.stats.active + 1) / x.config.weight)
+
+    def lease(self, default_client: httpx.AsyncClient) -> ProxyLease:
+        """
+        Lease an endpoint for ``async with``, it waits if all endpoints reach ``max_connections``
+
+        :param default_client: HTTPX client for endpoints without proxy
+        """
+        return ProxyLease(self, default_client)
+
+    async def acquire(self) -> _Endpoint:
+        """Take an endpoint, ``release`` it when done"""
+        while (endpoint := self._select()) is None:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        endpoint.stats.active += 1
+        return endpoint
+
+    def release(self, endpoint: _Endpoint, *, failed: bool, acquired: Optional[float] = None):
+        """
+        Return an endpoint and record the outcome
+
+        :param endpoint: Endpoint from ``acquire``
+        :param failed: Whether the download failed because of the endpoint
+        :param acquired: ``time.monotonic()`` when the endpoint was acquired, defaults to now
+        """
+        stats = endpoint.stats
+        stats.active -= 1
+        acquired = time.monotonic() if acquired is None else acquired
+        if failed:
+            stats.failures += 1
+            # There is no other endpoint to take over from the implicit direct endpoint, so never eject it. \
+            # Failures of leases acquired before re-admission (e.g. in flight when the endpoint was ejected) \
+            # belong to the outage that is already handled, so they don't escalate the ejection
+            if not self._implicit and acquired >= stats.ejected_until:
+                stats.consecutive_failures += 1
+                # A re-admitted endpoint is ejected again on its first failure
+                if stats.consecutive_failures >= self._eject_failures or stats.ejections:
+                    factor = min(2 ** stats.ejections, _MAX_COOLDOWN_FACTOR)
+                    stats.ejections += 1
+                    stats.consecutive_failures = 0
+                    stats.ejected_until = time.monotonic() + self._cooldown * factor
+                    logger.warning(
+                        generate_msg(
+                            "Proxy endpoint ejected",
+                            endpoint=endpoint.name,
+                            cooldown=f"{self._cooldown * factor:.0f}s"
+                        )
+                    )
+        else:
+            stats.successes += 1
+            stats.consecutive_failures = 0
+            stats.ejections = 0
+        while self._waiters:
+            if not (waiter := self._waiters.popleft()).done():
+                waiter.set_result(None)
+                break
+
+    async def aclose(self):
+        """Close HTTPX clients of proxies"""
+        for endpoint in self._endpoints:
+            await endpoint.aclose()
@@ -0,0 +1,273 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, time as dt_time
+from typing import Optional, Dict, Deque, Tuple, List, Hashable
+
+from loguru import logger
+
+from ktoolbox.configuration import config
+
+__all__ = ["ScheduleRule", "parse_schedule", "TokenBucket", "BandwidthStats", "BandwidthLimiter"]
+
+_MAX_SLEEP = 0.25
+"""Maximum seconds of one sleep when waiting for tokens, so that rate changes apply quickly"""
+
+
+@dataclass(frozen=True)
+class ScheduleRule:
+    """Bandwidth factor in a time-of-day range"""
+    start: dt_time
+    end: dt_time
+    """End time (exclusive), the range wraps around midnight if ``end <= start``"""
+    factor: float
+    """Factor applied to all bandwidth limits"""
+
+    def match(self, now: dt_time) -> bool:
+        if self.start < self.end:
+            return self.start <= now < self.end
+        return now >= self.start or now < self.end
+
+
+def parse_schedule(rules: List[str]) -> Tuple[ScheduleRule, ...]:
+    """
+    Parse bandwidth schedule rules
+
+    - Example:
+    ```
+    parse_schedule(["01:00-07:00=1", "07:00-01:00=0.2"])
+    ```
+
+    :param rules: Rules in ``HH:MM-HH:MM=factor`` format
+    :raise ValueError: If any rule is invalid
+    """
+    parsed = []
+    for rule in rules:
+        try:
+            time_range, factor = rule.split("=")
+            start, end = time_range.split("-")
+            parsed.append(
+                ScheduleRule(
+                    start=dt_time.fromisoformat(start.strip()),
+                    end=dt_time.max if end.strip() == "24:00" else dt_time.fromisoformat(end.strip()),
+                    factor=float(factor)
+                )
+            )
+        except ValueError as e:
+            raise ValueError(f"Invalid bandwidth schedule rule {rule!r}, expected `HH:MM-HH:MM=factor`") from e
+        if parsed[-1].factor <= 0:
+            raise ValueError(f"Invalid bandwidth schedule rule {rule!r}, factor must be positive")
+    return tuple(parsed)
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter, waiters of different flows are served round-robin
+
+    A request larger than the bucket capacity is allowed once the bucket is full, \
+    and the deficit is paid by later requests.
+    """
+
+    def __init__(self, rate: Optional[float] = None):
+        """
+        :param rate: Tokens (bytes) per second, ``None`` or ``0`` for unlimited
+        """
+        self._rate: Optional[float] = None
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._queues: "OrderedDict[Hashable, Deque[Tuple[int, asyncio.Future]]]" = OrderedDict()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.set_rate(rate)
+
+    @property
+    def rate(self) -> Optional[float]:
+        """Current rate, ``None`` for unlimited"""
+        return self._rate
+
+    def set_rate(self, rate: Optional[float]):
+        """Change the rate, it applies to waiting requests as well"""
+        self._refill()
+        previous, self._rate = self._rate, rate or None
+        if self._rate:
+            # Start with a full bucket when the limit is turned on
+            self._tokens = self._rate if previous is None else min(self._tokens, self._rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self._rate:
+            self._tokens = min(self._rate, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self, amount: int, flow: Hashable = None):
+        """
+        Wait until ``amount`` tokens are available and take them
+
+        :param amount: Number of tokens (bytes)
+        :param flow: Flow key for fair queuing, e.g. ``(service, creator ID)``
+        """
+        if not self._rate:
+            return
+        self._refill()
+        idle = self._dispatcher is None or self._dispatcher.done()
+        if idle and self._tokens >= amount:
+            self._tokens -= amount
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(flow, deque()).append((amount, future))
+        if idle:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        """Serve waiters one request per flow in turn"""
+        while self._queues:
+            flow, queue = next(iter(self._queues.items()))
+            amount, future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(flow)
+            else:
+                del self._queues[flow]
+            if future.done():  # Cancelled
+                continue
+            while self._rate:
+                self._refill()
+                if self._tokens >= min(amount, self._rate):
+                    break
+                await asyncio.sleep(min((min(amount, self._rate) - self._tokens) / self._rate, _MAX_SLEEP))
+            self._tokens -= amount
+            if not future.done():
+                future.set_result(None)
+
+
+@dataclass
+class BandwidthStats:
+    """Statistics of ``BandwidthLimiter``"""
+    bytes: int = 0
+    """Bytes passed through the limiter"""
+    throttled_time: float = 0.0
+    """Total seconds that downloads waited for bandwidth"""
+
+
+class BandwidthLimiter:
+    """
+    Limit download bytes per second, with optional per-host and per-creator sub-limits
+
+    Downloads of different creators share the global limit fairly (round-robin), \
+    and all limits are scaled by the factor of the matching time-of-day schedule rule.
+    Limits can be changed at runtime with ``set_limits``.
+    """
+
+    def __init__(
+            self,
+            limit: Optional[float] = None,
+            *,
+            per_host: Optional[float] = None,
+            per_creator: Optional[float] = None,
+            schedule: Tuple[ScheduleRule, ...] = ()
+    ):
+        """
+        :param limit: Global bytes per second, ``None`` for unlimited
+        :param per_host: Bytes per second of each download host, ``None`` for unlimited
+        :param per_creator: Bytes per second of each creator, ``None`` for unlimited
+        :param schedule: Time-of-day rules, the first matching rule applies
+        """
+        self._limit = limit
+        self._per_host = per_host
+        self._per_creator = per_creator
+        self._schedule = schedule
+        self._factor = 1.0
+        self._factor_checked = 0.0
+        self._global = TokenBucket()
+        self._hosts: Dict[str, TokenBucket] = {}
+        self._creators: Dict[Hashable, TokenBucket] = {}
+        self._stats = BandwidthStats()
+        self._apply()
+
+    @classmethod
+    def from_config(cls) -> "BandwidthLimiter":
+        """Create from ``DownloaderConfiguration``, invalid schedule is ignored with an error logged"""
+        try:
+            schedule = parse_schedule(config.downloader.bandwidth_schedule)
+        except ValueError:
+            schedule = ()
+            logger.exception("`DownloaderConfiguration.bandwidth_schedule` is invalid and has been ignored.")
+        return cls(
+            config.downloader.bandwidth_limit,
+            per_host=config.downloader.bandwidth_limit_per_host,
+            per_creator=config.downloader.bandwidth_limit_per_creator,
+            schedule=schedule
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any limit is set"""
+        return bool(self._limit or self._per_host or self._per_creator)
+
+    @property
+    def factor(self) -> float:
+        """Current factor of schedule"""
+        return self._factor
+
+    def stats(self) -> BandwidthStats:
+        """Get a snapshot of statistics"""
+        return BandwidthStats(**vars(self._stats))
+
+    def _scaled(self, limit: Optional[float]) -> Optional[float]:
+        return limit * self._factor if limit else None
+
+    def _apply(self):
+        """Apply limits and factor to all buckets"""
+        self._global.set_rate(self._scaled(self._limit))
+        for bucket in self._hosts.values():
+            bucket.set_rate(self._scaled(self._per_host))
+        for bucket in self._creators.values():
+            bucket.set_rate(self._scaled(self._per_creator))
+
+    def set_limits(
+            self,
+            limit: Optional[float] = None,
+            *,
+            per_host: Optional[float] = None,
+            per_creator: Optional[float] = None
+    ):
+        """Change the limits at runtime, ``None`` for unlimited"""
+        self._limit, self._per_host, self._per_creator = limit, per_host, per_creator
+        self._apply()
+
+    def _check_schedule(self):
+        if not self._schedule:
+            return
+        now = time.monotonic()
+        if now - self._factor_checked < 1:
+            return
+        self._factor_checked = now
+        current = datetime.now().time()
+        factor = next((x.factor for x in self._schedule if x.match(current)), 1.0)
+        if factor != self._factor:
+            self._factor = factor
+            self._apply()
+
+    async def acquire(self, amount: int, *, host: str = None, creator: Hashable = None):
+        """
+        Wait until ``amount`` bytes can be downloaded
+
+        :param amount: Number of bytes
+        :param host: Download host
+        :param creator: Creator key, e.g. ``(service, creator ID)``, used for fair sharing and per-creator limit
+        """
+        self._stats.bytes += amount
+        if not self.enabled:
+            return
+        self._check_schedule()
+        started = time.monotonic()
+        if self._per_creator and creator is not None:
+            if (bucket := self._creators.get(creator)) is None:
+                bucket = self._creators[creator] = TokenBucket(self._scaled(self._per_creator))
+            await bucket.acquire(amount)
+        if self._per_host and host is not None:
+            if (bucket := self._hosts.get(host)) is None:
+                bucket = self._hosts[host] = TokenBucket(self._scaled(self._per_host))
+            await bucket.acquire(amount, creator)
+        await self._global.acquire(amount, creator)
+        self._stats.throttled_time += time.monotonic() - started
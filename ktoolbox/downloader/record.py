@@ -0,0 +1,155 @@
+import csv
+import json
+from dataclasses import dataclass, field, asdict, fields
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable
+
+from ktoolbox.configuration import config
+
+__all__ = ["TransferRecord", "percentile", "TransferReport"]
+
+
+@dataclass
+class TransferRecord:
+    """Structured record of a download job, filled by ``Downloader`` and ``JobRunner``"""
+    server_path: Optional[str] = None
+    url: Optional[str] = None
+    """Last requested URL"""
+    host: Optional[str] = None
+    """Host of the last request, or of the content source peer, ``None`` for ``shared``"""
+    hosts: List[str] = field(default_factory=list)
+    """Hosts tried, one for each request"""
+    source: Optional[str] = None
+    """Where the file came from: ``origin``, a content source name, or ``shared`` for a file reused in the run"""
+    filename: Optional[str] = None
+    status: Optional[int] = None
+    """HTTP status code of the last response"""
+    bytes: int = 0
+    """Bytes received, including failed attempts"""
+    offset: int = 0
+    """Resumed offset of the last attempt"""
+    total: Optional[int] = None
+    """File size"""
+    ttfb: Optional[float] = None
+    """Seconds from sending the last request to receiving its response headers, \
+    or from trying content sources to receiving the first chunk"""
+    transfer_bytes: int = 0
+    """Bytes received in the last attempt, or materialized for ``shared``"""
+    transfer_time: Optional[float] = None
+    """Seconds spent in receiving and writing the body of the last attempt, or materializing for ``shared``"""
+    duration: Optional[float] = None
+    """Seconds of the whole job, including waiting and retries"""
+    retries: int = 0
+    retry_reasons: List[str] = field(default_factory=list)
+    outcome: Optional[str] = None
+    """``RetCodeEnum`` name, ``Cancelled`` or ``Exception``"""
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """Bytes per second of the last attempt"""
+        return self.transfer_bytes / self.transfer_time if self.transfer_time else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["throughput"] = self.throughput
+        return data
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """
+    Nearest-rank percentile
+
+    :param values: Sorted values
+    :param q: Percentile between 0 and 100
+    """
+    if not values:
+        return None
+    rank = max(int(-(-q * len(values) // 100)), 1)
+    return values[min(rank, len(values)) - 1]
+
+
+def _distribution(values: Iterable[Optional[float]]) -> Dict[str, Optional[float]]:
+    values = sorted(x for x in values if x is not None)
+    return {
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None
+    }
+
+
+class TransferReport:
+    """Collect ``TransferRecord`` of a run, and write them with aggregates as a JSON or CSV report"""
+
+    def __init__(self, path: Optional[Path] = None):
+        """
+        :param path: Report path, CSV if the suffix is ``.csv``, otherwise JSON. ``None`` for disable
+        """
+        self.path = path
+        self.records: List[TransferRecord] = []
+
+    @classmethod
+    def from_config(cls) -> "TransferReport":
+        """Create from ``MonitorConfiguration``"""
+        return cls(config.monitor.transfer_report)
+
+    def __bool__(self):
+        return self.path is not None
+
+    def add(self, record: TransferRecord):
+        if self:
+            self.records.append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregates of records, overall and by host"""
+        outcomes: Dict[str, int] = {}
+        for record in self.records:
+            outcomes[record.outcome] = outcomes.get(record.outcome, 0) + 1
+        # Materializing a shared file involves no host, which isn't comparable with network transfers
+        transferred = [x for x in self.records if x.transfer_time and x.host]
+        hosts: Dict[str, List[TransferRecord]] = {}
+        for record in transferred:
+            hosts.setdefault(record.host, []).append(record)
+        return {
+            "jobs": len(self.records),
+            "outcomes": outcomes,
+            "bytes": sum(x.bytes for x in self.records),
+            "retries": sum(x.retries for x in self.records),
+            "ttfb": _distribution(x.ttfb for x in transferred),
+            "duration": _distribution(x.duration for x in self.records),
+            "throughput": _distribution(x.throughput for x in transferred),
+            "hosts": {
+                host: {
+                    "transfers": len(records),
+                    "bytes": sum(x.bytes for x in records),
+                    "ttfb": _distribution(x.ttfb for x in records),
+                    "throughput": _distribution(x.throughput for x in records)
+                }
+                for host, records in hosts.items()
+            }
+        }
+
+    def write(self):
+        """
+        Write the report, JSON contains the summary and records, CSV contains records only
+
+        :raise OSError: Failed to write the file
+        """
+        if self.path.suffix.lower() == ".csv":
+            columns = [x.name for x in fields(TransferRecord)] + ["throughput"]
+            with open(self.path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, columns)
+                writer.writeheader()
+                for record in self.records:
+                    row = record.to_dict()
+                    row["hosts"] = " ".join(row["hosts"])
+                    row["retry_reasons"] = " | ".join(row["retry_reasons"])
+                    writer.writerow(row)
+        else:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"summary": self.summary(), "records": [x.to_dict() for x in self.records]},
+                    f,
+                    indent=config.json_dump_indent,
+                    default=str
+                )
@@ -0,0 +1,209 @@
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Dict, Callable, Awaitable
+from urllib.parse import urlparse, unquote
+
+import aiofiles
+import httpx
+from loguru import logger
+
+from ktoolbox.configuration import config
+from ktoolbox.filesystem import fs_executor
+from ktoolbox.utils import generate_msg, sha256_from_filename
+
+__all__ = ["SourceStats", "ChunkCallback", "ContentSource", "PeerCacheSource", "ContentSourceChain"]
+
+ChunkCallback = Callable[[int, str], Awaitable[None]]
+"""Called with the size and host of each received chunk before it's written, e.g. for bandwidth limit and progress"""
+
+_PEER_ERRORS_TO_PAUSE = 3
+"""Consecutive errors (not misses) to pause a peer"""
+
+
+@dataclass
+class SourceStats:
+    """Statistics of a content source"""
+    hits: int = 0
+    misses: int = 0
+    errors: int = 0
+    """Network errors and verification failures"""
+    bytes: int = 0
+
+
+class ContentSource(ABC):
+    """
+    Base class of content sources consulted before the origin (Kemono file server)
+
+    Subclasses implement ``fetch`` to write verified content of a server path to a file.
+    """
+
+    name: str = "source"
+
+    def __init__(self):
+        self.stats = SourceStats()
+
+    @abstractmethod
+    async def fetch(
+            self,
+            server_path: str,
+            path: Path,
+            expected_sha256: str,
+            on_chunk: Optional[ChunkCallback] = None
+    ) -> bool:
+        """
+        Get the content of ``server_path`` and save it to ``path``
+
+        :param server_path: Server path of the file, e.g. ``/data/ab/cd/<sha256>.png``
+        :param path: File path to save the content, it should be removed on miss or failure
+        :param expected_sha256: SHA-256 of the content (hex)
+        :param on_chunk: Awaited for each received chunk
+        :return: Whether the content was found and verified
+        """
+        ...
+
+    async def aclose(self):
+        """Release resources"""
+        pass
+
+
+class PeerCacheSource(ContentSource):
+    """
+    HTTP peer cache, e.g. another KToolBox node serving its bucket by any plain HTTP file server
+
+    Files are requested at ``{base_url}{server_path}`` with a short timeout, and \
+    the peer is paused for a while after consecutive errors.
+    """
+
+    def __init__(self, base_url: str, *, timeout: float = 2.0, pause: float = 60.0):
+        """
+        :param base_url: Base URL, e.g. ``http://10.0.0.2:8000``
+        :param timeout: Seconds of connect/read timeout
+        :param pause: Seconds to skip the peer after consecutive errors
+        """
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.name = self.base_url
+        self._timeout = timeout
+        self._pause = pause
+        self._consecutive_errors = 0
+        self._paused_until = 0.0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._timeout)
+        return self._client
+
+    def _error(self, message: str, **kwargs):
+        self.stats.errors += 1
+        self._consecutive_errors += 1
+        if self._consecutive_errors >= _PEER_ERRORS_TO_PAUSE:
+            self._consecutive_errors = 0
+            self._paused_until = time.monotonic() + self._pause
+            message += ", peer paused"
+        logger.debug(generate_msg(message, peer=self.name, **kwargs))
+
+    async def fetch(
+            self,
+            server_path: str,
+            path: Path,
+            expected_sha256: str,
+            on_chunk: Optional[ChunkCallback] = None
+    ) -> bool:
+        if self._paused_until > time.monotonic():
+            return False
+        digest = hashlib.sha256()
+        size = 0
+        opened = False
+        verified = False
+        try:
+            url = f"{self.base_url}{urlparse(server_path).path}"
+            async with self.client.stream("GET", url) as res:  # type: httpx.Response
+                if res.status_code != httpx.codes.OK:
+                    self.stats.misses += 1
+                    return False
+                host = res.url.host
+                opened = True
+                async with aiofiles.open(str(path), "wb", config.downloader.buffer_size) as f:
+                    async for chunk in res.aiter_bytes(config.downloader.chunk_size):
+                        if on_chunk:
+                            await on_chunk(len(chunk), host)
+                        digest.update(chunk)
+                        size += len(chunk)
+                        await f.write(chunk)
+            if digest.hexdigest() != expected_sha256:
+                self._error("Peer cache content verification failed", path=server_path)
+                return False
+            verified = True
+        except httpx.HTTPError as e:
+            self._error("Peer cache request failed", path=server_path, exception=e)
+            return False
+        finally:
+            # Don't leave partial or unverified content behind, e.g. on ``OSError`` while writing
+            if opened and not verified:
+                await fs_executor.run("unlink", path.unlink, missing_ok=True)
+        self._consecutive_errors = 0
+        self.stats.hits += 1
+        self.stats.bytes += size
+        return True
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class ContentSourceChain:
+    """
+    Ordered content sources tried before the origin, the first verified hit wins
+
+    Only server paths with SHA-256 in filename (as Kemono uses) are looked up, \
+    since the content can't be verified otherwise.
+    """
+
+    def __init__(self, sources: List[ContentSource] = None):
+        self.sources = sources or []
+
+    @classmethod
+    def from_config(cls) -> "ContentSourceChain":
+        """Create from ``DownloaderConfiguration.peer_caches``"""
+        return cls([
+            PeerCacheSource(x, timeout=config.downloader.peer_cache_timeout) for x in config.downloader.peer_caches
+        ])
+
+    def __bool__(self):
+        return bool(self.sources)
+
+    def stats(self) -> Dict[str, SourceStats]:
+        """Get a snapshot of statistics, ``source name`` -> ``SourceStats``"""
+        return {x.name: SourceStats(**vars(x.stats)) for x in self.sources}
+
+    async def fetch(
+            self,
+            server_path: str,
+            path: Path,
+            on_chunk: Optional[ChunkCallback] = None
+    ) -> Optional[ContentSource]:
+        """
+        Try sources in order
+
+        :param server_path: Server path of the file
+        :param path: File path to save the content
+        :param on_chunk: Awaited for each received chunk
+        :return: The source that hit, ``None`` if all missed
+        """
+        expected_sha256 = sha256_from_filename(unquote(Path(urlparse(server_path).path).name))
+        if not expected_sha256:
+            return None
+        for source in self.sources:
+            if await source.fetch(server_path, path, expected_sha256, on_chunk):
+                return source
+        return None
+
+    async def aclose(self):
+        for source in self.sources:
+            await source.aclose()
@@ -0,0 +1,132 @@
+import asyncio
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import shutil
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from ktoolbox.configuration import config
+from ktoolbox.filesystem import fs_executor
+
+__all__ = ["preallocate", "StagingStats", "StagingArea"]
+
+_FALLOC_FL_KEEP_SIZE = 0x01
+
+_fallocate = None
+if sys.platform.startswith("linux"):
+    try:
+        _fallocate = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True).fallocate
+        _fallocate.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong)
+        _fallocate.restype = ctypes.c_int
+    except (OSError, AttributeError):
+        _fallocate = None
+
+
+def preallocate(fd: int, offset: int, length: int) -> bool:
+    """
+    Reserve disk blocks for a file being written, to reduce fragmentation
+
+    File size is kept unchanged (``FALLOC_FL_KEEP_SIZE``), so that resuming by file size still works.
+    Only available on Linux, and failures are ignored since it's just an optimization.
+
+    :param fd: File descriptor
+    :param offset: Start of the range, usually the current size
+    :param length: Length of the range
+    :return: Whether the blocks were reserved
+    """
+    if _fallocate is None or length <= 0:
+        return False
+    if _fallocate(fd, _FALLOC_FL_KEEP_SIZE, offset, length) != 0:
+        logger.debug(f"Preallocation is not available: {os.strerror(ctypes.get_errno())}")
+        return False
+    return True
+
+
+def _move(src: Path, dst: Path) -> int:
+    """Move ``src`` to ``dst``, copying across filesystems, and return the size"""
+    size = os.stat(src).st_size
+    shutil.move(str(src), str(dst))
+    return size
+
+
+@dataclass
+class StagingStats:
+    """Statistics of ``StagingArea``"""
+    moved: int = 0
+    """Number of files moved to the final location"""
+    moved_bytes: int = 0
+    wait_time: float = 0.0
+    """Total seconds that moves waited for a free slot"""
+
+
+class StagingArea:
+    """
+    Directory (e.g. on SSD or tmpfs) that receives in-flight downloads
+
+    Completed files are moved (or copied across filesystems) next to their final location, \
+    with the number of concurrent moves bounded to keep random writes off slow archive disks.
+    Temp files are placed next to the final location if no staging directory is set.
+    """
+
+    def __init__(self, path: Optional[Path] = None, *, move_concurrency: int = 2):
+        """
+        :param path: Staging directory, ``None`` to disable staging
+        :param move_concurrency: Maximum number of concurrent moves to the final location
+        """
+        self.path = path
+        self._move_concurrency = move_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stats = StagingStats()
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls) -> "StagingArea":
+        """Create from ``DownloaderConfiguration``"""
+        return cls(config.downloader.staging_path, move_concurrency=config.downloader.staging_move_concurrency)
+
+    def __bool__(self):
+        return self.path is not None
+
+    def stats(self) -> StagingStats:
+        """Get a snapshot of statistics"""
+        return StagingStats(**vars(self._stats))
+
+    def temp_path(self, save_filepath: Path) -> Path:
+        """
+        Get the temp file path of a download, it's stable across runs so that downloads can be resumed
+
+        :param save_filepath: Final file path
+        """
+        if self.path is None:
+            return Path(f"{save_filepath}.{config.downloader.temp_suffix}")
+        digest = hashlib.sha1(str(save_filepath.absolute()).encode()).hexdigest()
+        return self.path / f"{digest}{save_filepath.suffix}.{config.downloader.temp_suffix}"
+
+    async def promote(self, temp_filepath: Path, final_filepath: Path) -> Path:
+        """
+        Move a completed temp file next to the final location if it's staged
+
+        :param temp_filepath: Completed temp file
+        :param final_filepath: Final file path
+        :return: Temp file path next to the final location
+        """
+        if self.path is None or temp_filepath.parent == final_filepath.parent:
+            return temp_filepath
+        dst = Path(f"{final_filepath}.{config.downloader.temp_suffix}")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._move_concurrency)
+        started = time.monotonic()
+        async with self._semaphore:
+            self._stats.wait_time += time.monotonic() - started
+            size = await fs_executor.run("stage", _move, temp_filepath, dst)
+        self._stats.moved += 1
+        self._stats.moved_bytes += size
+        return dst
@@ -5,8 +5,19 @@ from pathlib import Path
 from typing import Optional, Dict, Tuple, Union
 
 from ktoolbox.configuration import config
+from ktoolbox.downloader.bucket import get_bucket_store
+from ktoolbox.filesystem import fs_executor, DirectoryCache
 
-__all__ = ["filename_from_headers", "duplicate_file_check", "utime_from_headers"]
+__all__ = [
+    "filename_from_headers",
+    "parse_content_range",
+    "validator_from_headers",
+    "read_validator",
+    "write_validator",
+    "duplicate_file_check",
+    "async_duplicate_file_check",
+    "utime_from_headers"
+]
 
 
 def parse_header(line: str) -> Dict[str, Optional[str]]:
@@ -72,29 +83,125 @@ def filename_from_headers(headers: Dict[str, str]) -> Optional[str]:
     return None
 
 
-def duplicate_file_check(local_file_path: Path, bucket_file_path: Path = None) -> Tuple[bool, Optional[str]]:
+def parse_content_range(value: Optional[str]) -> Optional[Tuple[Optional[int], Optional[int], Optional[int]]]:
     """
-    Check if the file existed, and link the bucket filepath to local filepath \
+    Parse ``Content-Range`` header value.
+
+    - Example:
+    ```
+    parse_content_range("bytes 100-199/1000")
+    parse_content_range("bytes */1000")
+    ```
+
+    - Return:
+    ```
+    (100, 199, 1000)
+    (None, None, 1000)
+    ```
+
+    :param value: Header value
+    :return: ``(start, end, total)``, unknown parts are ``None``, or ``None`` if the value is invalid
+    """
+    if not value or not value.startswith("bytes "):
+        return None
+    byte_range, _, total = value[6:].strip().partition("/")
+    try:
+        total_size = None if total in ("*", "") else int(total)
+        if byte_range == "*":
+            return None, None, total_size
+        start, end = byte_range.split("-")
+        return int(start), int(end), total_size
+    except ValueError:
+        return None
+
+
+def validator_from_headers(headers: Dict[str, str]) -> Optional[str]:
+    """
+    Get the validator for ``If-Range`` from headers, \
+    which is a strong ``ETag``, or ``Last-Modified`` if there is no strong ``ETag``
+
+    :param headers: HTTP headers
+    :return: Validator value
+    """
+    if (etag := headers.get("ETag")) and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def read_validator(path: Path) -> Optional[str]:
+    """Read the validator saved alongside a temp file, ``None`` if not saved"""
+    try:
+        return path.read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_validator(path: Path, validator: Optional[str]):
+    """Save the validator alongside a temp file, remove the saved one if ``validator`` is ``None``"""
+    if validator:
+        path.write_text(validator, encoding="utf-8")
+    else:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def duplicate_file_check(
+        local_file_path: Path,
+        bucket_file_path: Path = None,
+        cache: DirectoryCache = None
+) -> Tuple[bool, Optional[str]]:
+    """
+    Check if the file existed, and materialize the bucket file at local filepath \
     if ``DownloaderConfiguration.use_bucket`` enabled.
 
+    Bucket files marked ``corrupt`` by verification are treated as missing.
+
+    If ``DownloaderConfiguration.trust_local_names`` enabled, \
+    an existing local file is accepted even if it's missing in bucket.
+
     :param local_file_path: Download target path
     :param bucket_file_path: The bucket filepath of the local download path
+    :param cache: Directory cache to answer existence checks, \
+    use ``Path.is_file`` if not given
     :return: ``(if file existed, message)``
     """
+    is_file = cache.is_file if cache else Path.is_file
     duplicate_check_path = bucket_file_path or local_file_path
-    if duplicate_check_path.is_file():
+    if is_file(duplicate_check_path) and (not bucket_file_path or get_bucket_store().is_usable(bucket_file_path)):
         if config.downloader.use_bucket:
             ret_msg = "Download file already exists in both bucket and local, skipping"
-            if not local_file_path.is_file():
+            if not is_file(local_file_path):
                 ret_msg = "Download file already exists in bucket, linking to local path"
-                os.link(bucket_file_path, local_file_path)
+                get_bucket_store().checkout(bucket_file_path, local_file_path)
+                if cache:
+                    cache.add(local_file_path)
         else:
             ret_msg = "Download file already exists, skipping"
         return True, ret_msg
+    elif bucket_file_path and config.downloader.trust_local_names and is_file(local_file_path):
+        return True, "Download file already exists in local (not in bucket), skipping"
     else:
         return False, None
 
 
+async def async_duplicate_file_check(
+        local_file_path: Path,
+        bucket_file_path: Path = None,
+        cache: DirectoryCache = None
+) -> Tuple[bool, Optional[str]]:
+    """
+    Async version of ``duplicate_file_check``, run on ``fs_executor`` to avoid blocking the event loop
+
+    :param local_file_path: Download target path
+    :param bucket_file_path: The bucket filepath of the local download path
+    :param cache: Directory cache to answer existence checks
+    :return: ``(if file existed, message)``
+    """
+    return await fs_executor.run("duplicate_check", duplicate_file_check, local_file_path, bucket_file_path, cache)
+
+
 def utime_from_headers(headers: Dict[str, str], path: Union[Path, str]) -> Optional[Exception]:
     """
     Run ``os.utime`` on specific file using ``Last-Modified`` or ``Date`` in HTTP headers.
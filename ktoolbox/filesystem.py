@@ -0,0 +1,193 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Callable, Any, Dict, Optional, TypeVar, List, Set
+
+from ktoolbox.configuration import config
+
+__all__ = ["FileSystemOpStats", "FileSystemExecutor", "DirectoryCache", "fs_executor"]
+
+_T = TypeVar("_T")
+
+
+@dataclass
+class FileSystemOpStats:
+    """Latency statistics of a kind of filesystem operation"""
+    count: int = 0
+    """Number of finished operations"""
+    errors: int = 0
+    """Number of operations that raised exception"""
+    total_time: float = 0.0
+    """Total seconds spent in operations (on worker thread)"""
+    max_time: float = 0.0
+    """Maximum seconds spent in one operation"""
+    total_wait: float = 0.0
+    """Total seconds waited before operations started (queueing)"""
+
+    @property
+    def avg_time(self) -> float:
+        """Average seconds spent in one operation"""
+        return self.total_time / self.count if self.count else 0.0
+
+
+class FileSystemExecutor:
+    """
+    Run blocking filesystem calls on a dedicated thread pool, so that slow filesystems \
+    (e.g. NFS) don't stall the event loop.
+
+    Concurrency is bounded by the number of worker threads, \
+    and the number of pending calls is bounded by ``max_pending``.
+    """
+
+    def __init__(self, max_workers: int = 8, max_pending: Optional[int] = None):
+        """
+        :param max_workers: Number of worker threads
+        :param max_pending: Maximum number of submitted but unfinished calls, defaults to ``4 * max_workers``
+        """
+        self._max_workers = max_workers
+        self._max_pending = max_pending or 4 * max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats: Dict[str, FileSystemOpStats] = {}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool, created on first use"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="ktoolbox-fs")
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self._max_pending)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def _record(self, op: str, wait: float, elapsed: float, failed: bool):
+        with self._stats_lock:
+            stats = self._stats.setdefault(op, FileSystemOpStats())
+            stats.count += 1
+            stats.errors += failed
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            stats.total_wait += wait
+
+    def _timed(self, op: str, submitted: float, func: Callable[..., _T], *args, **kwargs) -> _T:
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self._record(op, started - submitted, time.perf_counter() - started, failed)
+
+    async def run(self, op: str, func: Callable[..., _T], *args, **kwargs) -> _T:
+        """
+        Run a blocking call on the thread pool
+
+        :param op: Operation name for statistics, e.g. ``stat``
+        :param func: Blocking callable
+        :return: Return value of ``func``
+        """
+        submitted = time.perf_counter()
+        async with self._get_semaphore():
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                partial(self._timed, op, submitted, func, *args, **kwargs)
+            )
+
+    async def batch(self, op: str, *calls: Callable[[], Any]) -> List[Any]:
+        """
+        Run several blocking calls in order on one worker thread, \
+        which saves thread hops for related operations (e.g. ``mkdir`` then ``rename``)
+
+        It stops at the first call that raises exception.
+
+        :param op: Operation name for statistics
+        :param calls: Callables without arguments, use ``functools.partial`` to bind arguments
+        :return: Return values of ``calls``
+        """
+        return await self.run(op, lambda: [call() for call in calls])
+
+    def metrics(self) -> Dict[str, FileSystemOpStats]:
+        """Get a snapshot of statistics, ``operation name`` -> ``FileSystemOpStats``"""
+        with self._stats_lock:
+            return {k: FileSystemOpStats(**vars(v)) for k, v in self._stats.items()}
+
+    def reset_metrics(self):
+        """Clear statistics"""
+        with self._stats_lock:
+            self._stats.clear()
+
+
+class DirectoryCache:
+    """
+    Snapshot of directory entries for existence checks, \
+    each directory is listed once by ``os.scandir`` on first lookup.
+
+    It's meant to live for one run. Writes made by KToolBox should be recorded \
+    with ``add`` and ``discard``, changes made by others during the run are not visible.
+    """
+
+    def __init__(self):
+        self._dirs: Dict[Path, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.scans = 0
+        """Number of directories listed"""
+
+    def _entries(self, directory: Path) -> Set[str]:
+        with self._lock:
+            if (entries := self._dirs.get(directory)) is not None:
+                return entries
+        # List outside the lock, a concurrent listing of the same directory is harmless
+        entries = set()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file():
+                            entries.add(entry.name)
+                    except OSError:
+                        continue
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        with self._lock:
+            self.scans += 1
+            return self._dirs.setdefault(directory, entries)
+
+    def is_file(self, path: Path) -> bool:
+        """Check if the file exists (blocking on first lookup of the directory)"""
+        return path.name in self._entries(path.parent)
+
+    def add(self, path: Path):
+        """Record that the file was created"""
+        with self._lock:
+            if (entries := self._dirs.get(path.parent)) is not None:
+                entries.add(path.name)
+
+    def discard(self, path: Path):
+        """Record that the file was removed"""
+        with self._lock:
+            if (entries := self._dirs.get(path.parent)) is not None:
+                entries.discard(path.name)
+
+    def invalidate(self, directory: Path = None):
+        """Drop the snapshot of a directory, or all directories if ``None``"""
+        with self._lock:
+            if directory is None:
+                self._dirs.clear()
+            else:
+                self._dirs.pop(directory, None)
+
+
+fs_executor = FileSystemExecutor(max_workers=config.downloader.fs_workers)
+"""Global filesystem executor"""
@@ -1,2 +1,4 @@
 from .model import *
 from .runner import *
+from .preflight import *
+from .state import *
@@ -0,0 +1,240 @@
+import asyncio
+import statistics
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import urlunparse
+
+import httpx
+from loguru import logger
+from pydantic import ValidationError
+from tqdm import tqdm as std_tqdm
+
+from ktoolbox._enum import DataStorageNameEnum
+from ktoolbox.configuration import config
+from ktoolbox.downloader import parse_content_range
+from ktoolbox.filesystem import fs_executor, DirectoryCache
+from ktoolbox.job.model import Job
+from ktoolbox.model import BaseKToolBoxData
+from ktoolbox.utils import generate_msg
+
+__all__ = ["PreflightCache", "PlanGroup", "PreflightPlan", "probe_size", "run_preflight"]
+
+_THROUGHPUT_SAMPLES = 10
+_PLAN_POSTS_LIMIT = 10
+
+
+class PreflightCache(BaseKToolBoxData):
+    """
+    Preflight data of a download directory
+
+    Kemono server paths are content-addressed, so the probed sizes never expire.
+    """
+    sizes: Dict[str, int] = {}
+    """Probed file sizes, ``server_path`` -> bytes"""
+    throughput: List[float] = []
+    """Recent download throughput samples (bytes per second), the latest last"""
+
+    @classmethod
+    def load(cls, path: Path) -> "PreflightCache":
+        """Load from the download directory, return an empty one if not saved or invalid"""
+        file = path / DataStorageNameEnum.PreflightCacheData.value
+        try:
+            return cls.model_validate_json(file.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValidationError, ValueError) as e:
+            logger.warning(generate_msg("Ignored invalid preflight cache", path=file, exception=e))
+            return cls()
+
+    def save(self, path: Path):
+        """Save to the download directory"""
+        file = path / DataStorageNameEnum.PreflightCacheData.value
+        file.write_text(self.model_dump_json(indent=config.json_dump_indent), encoding="utf-8")
+
+    def record_throughput(self, value: float):
+        """Add a throughput sample, only the latest samples are kept"""
+        self.throughput = (self.throughput + [value])[-_THROUGHPUT_SAMPLES:]
+
+    @property
+    def expected_throughput(self) -> Optional[float]:
+        """Median of recent throughput samples, ``None`` if no sample"""
+        return statistics.median(self.throughput) if self.throughput else None
+
+
+@dataclass
+class PlanGroup:
+    """Files and bytes of a group in preflight plan"""
+    count: int = 0
+    size: int = 0
+    unknown: int = 0
+    """Number of files with unknown size"""
+
+    def add(self, size: Optional[int]):
+        self.count += 1
+        if size is None:
+            self.unknown += 1
+        else:
+            self.size += size
+
+
+@dataclass
+class PreflightPlan:
+    """Download plan made by preflight"""
+    jobs: List[Job] = field(default_factory=list)
+    """Jobs to download, after size filtering"""
+    total: PlanGroup = field(default_factory=PlanGroup)
+    by_type: Dict[str, PlanGroup] = field(default_factory=lambda: defaultdict(PlanGroup))
+    """Plan of each file type, ``type`` -> ``PlanGroup``"""
+    by_post: Dict[Tuple[str, str], PlanGroup] = field(default_factory=lambda: defaultdict(PlanGroup))
+    """Plan of each post, ``(post id, post title)`` -> ``PlanGroup``"""
+    existed: int = 0
+    """Number of jobs whose file already exists"""
+    filtered: int = 0
+    """Number of jobs filtered out by ``min_file_size`` and ``max_file_size``"""
+    probed: int = 0
+    """Number of sizes probed from server (not cached)"""
+    throughput: Optional[float] = None
+    """Expected throughput (bytes per second)"""
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds to download files with known size"""
+        return self.total.size / self.throughput if self.throughput else None
+
+    def summary(self) -> str:
+        """Human-readable plan"""
+        fmt = std_tqdm.format_sizeof
+        eta = self.eta
+        lines = [
+            generate_msg(
+                "Preflight plan",
+                files=self.total.count,
+                size=fmt(self.total.size, "B", 1024),
+                unknown_size=self.total.unknown,
+                existed=self.existed,
+                filtered_by_size=self.filtered,
+                eta=std_tqdm.format_interval(eta) if eta is not None else "unknown (no throughput recorded)"
+            )
+        ]
+        for file_type, group in sorted(self.by_type.items()):
+            lines.append(f"  [{file_type}] {group.count} files, {fmt(group.size, 'B', 1024)}")
+        posts = sorted(self.by_post.items(), key=lambda x: x[1].size, reverse=True)
+        for (post_id, title), group in posts[:_PLAN_POSTS_LIMIT]:
+            lines.append(f"  <{post_id}> {title}: {group.count} files, {fmt(group.size, 'B', 1024)}")
+        if len(posts) > _PLAN_POSTS_LIMIT:
+            lines.append(f"  ... and {len(posts) - _PLAN_POSTS_LIMIT} more posts")
+        return "\n".join(lines)
+
+
+def _job_url(job: Job) -> str:
+    url_parts = [config.downloader.scheme, config.api.files_netloc, job.server_path, '', '', '']
+    return config.downloader.reverse_proxy.format(urlunparse(url_parts))
+
+
+async def probe_size(client: httpx.AsyncClient, url: str) -> Optional[int]:
+    """
+    Probe file size by ``HEAD``, or a zero-length range ``GET`` if ``HEAD`` doesn't tell
+
+    :param client: HTTPX AsyncClient
+    :param url: File URL
+    :return: Size in bytes, ``None`` if unknown
+    """
+    try:
+        res = await client.head(url, follow_redirects=True, timeout=config.downloader.timeout)
+        if res.status_code == httpx.codes.OK and (length := res.headers.get("Content-Length")):
+            return int(length)
+        async with client.stream(
+                method="GET",
+                url=url,
+                follow_redirects=True,
+                timeout=config.downloader.timeout,
+                headers={"Range": "bytes=0-0"}
+        ) as res:  # type: httpx.Response
+            # Close without reading the body
+            if res.status_code == httpx.codes.PARTIAL_CONTENT:
+                content_range = parse_content_range(res.headers.get("Content-Range"))
+                return content_range[2] if content_range else None
+            elif res.status_code == httpx.codes.OK and (length := res.headers.get("Content-Length")):
+                return int(length)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.debug(generate_msg("Failed to probe file size", url=url, exception=e))
+    return None
+
+
+def _size_allowed(size: Optional[int]) -> bool:
+    if size is None:
+        return True
+    if config.job.min_file_size is not None and size < config.job.min_file_size:
+        return False
+    if config.job.max_file_size is not None and size > config.job.max_file_size:
+        return False
+    return True
+
+
+async def run_preflight(
+        jobs: List[Job],
+        path: Path,
+        client: httpx.AsyncClient = None,
+        *,
+        save_cache: bool = True
+) -> PreflightPlan:
+    """
+    Probe file sizes concurrently, filter jobs by size and make a download plan
+
+    Probed sizes are cached in the download directory.
+
+    :param jobs: Jobs to plan
+    :param path: Download directory to save ``PreflightCache``
+    :param client: HTTPX AsyncClient, a new one will be created if not given
+    :param save_cache: Save probed sizes to ``PreflightCache``, disable it for not writing the download directory
+    """
+    cache = PreflightCache.load(path)
+    plan = PreflightPlan(throughput=cache.expected_throughput)
+
+    # Skip jobs whose designated file already exists, no request needed for them
+    dir_cache = DirectoryCache() if config.downloader.use_dir_cache else None
+    is_file = dir_cache.is_file if dir_cache else Path.is_file
+    existed = await fs_executor.run(
+        "duplicate_check",
+        lambda: [bool(job.alt_filename) and is_file(job.path / job.alt_filename) for job in jobs]
+    )
+    pending: List[Job] = []
+    for job, job_existed in zip(jobs, existed):
+        if job_existed:
+            plan.existed += 1
+        else:
+            pending.append(job)
+
+    to_probe = list({job.server_path for job in pending if job.server_path not in cache.sizes})
+    if to_probe:
+        semaphore = asyncio.Semaphore(config.job.preflight_concurrency)
+
+        async def probe(c: httpx.AsyncClient, server_path: str):
+            async with semaphore:
+                if (size := await probe_size(c, _job_url(Job(path=path, server_path=server_path)))) is not None:
+                    cache.sizes[server_path] = size
+
+        if client:
+            await asyncio.gather(*(probe(client, x) for x in to_probe))
+        else:
+            async with httpx.AsyncClient(
+                    verify=config.ssl_verify,
+                    cookies={"session": config.api.session_key} if config.api.session_key else None
+            ) as new_client:
+                await asyncio.gather(*(probe(new_client, x) for x in to_probe))
+        plan.probed = len(to_probe)
+        if save_cache:
+            cache.save(path)
+
+    for job in pending:
+        size = cache.sizes.get(job.server_path)
+        if not _size_allowed(size):
+            plan.filtered += 1
+            continue
+        plan.jobs.append(job)
+        plan.total.add(size)
+        plan.by_type[job.type.value if job.type else "other"].add(size)
+        plan.by_post[(job.post.id, job.post.title) if job.post else ("", "")].add(size)
+    return plan
@@ -1,9 +1,10 @@
 import asyncio
+import time
 from asyncio import CancelledError
 from functools import cached_property
 from types import MappingProxyType
-from typing import List, Set, Dict
-from urllib.parse import urlunparse
+from typing import List, Set, Dict, Optional, Any
+from urllib.parse import urlunparse, urlparse
 
 import httpx
 from loguru import logger
@@ -11,8 +12,11 @@ from tqdm import tqdm as std_tqdm
 
 from ktoolbox._enum import RetCodeEnum
 from ktoolbox.configuration import config
-from ktoolbox.downloader import Downloader
+from ktoolbox.downloader import Downloader, BandwidthLimiter, ProxyPool, ContentSourceChain, StagingArea, \
+    DownloaderRet, TransferReport
+from ktoolbox.filesystem import fs_executor, DirectoryCache
 from ktoolbox.job import Job
+from ktoolbox.monitor import event_stream, metrics, metrics_exporter, tracer, traced, profiler, LoopWatchdog
 from ktoolbox.progress import ProgressManager, create_managed_tqdm_class, setup_logger_for_progress
 from ktoolbox.utils import generate_msg
 
@@ -54,10 +58,25 @@ class JobRunner:
             self._progress_manager = None
             self._tqdm_class = tqdm_class
 
+        self._dir_cache = DirectoryCache() if config.downloader.use_dir_cache else None
+        self._bandwidth_limiter = BandwidthLimiter.from_config()
+        self._proxy_pool = ProxyPool.from_config()
+        self._content_sources = ContentSourceChain.from_config()
+        self._staging = StagingArea.from_config()
+        self._watchdog = LoopWatchdog.from_config()
+        self._transfer_report = TransferReport.from_config()
+        self._shared_downloads: Dict[str, asyncio.Future] = {}
+        """Server path -> Future of the downloaded file path (``None`` if not downloaded)"""
+        self._deduplicated_count = 0
+        self._failed_count = 0
+        self._existed_count = 0
+        self._unannounced_jobs: List[Job] = list(job_list) if self._announcing else []
+        """Jobs not emitted as ``job_queued`` events yet, only kept if the event stream is (to be) opened"""
         self._downloaders_with_task: Dict[Downloader, asyncio.Task] = {}
         self._concurrent_tasks: Set[asyncio.Task] = set()
         self._lock = asyncio.Lock()
         self._total_jobs_count = len(job_list)
+        self._throughput: Optional[float] = None
 
     @property
     def finished(self):
@@ -73,6 +92,16 @@ class JobRunner:
         """Get downloaders with task"""
         return MappingProxyType(self._downloaders_with_task)
 
+    @property
+    def bandwidth_limiter(self) -> BandwidthLimiter:
+        """Bandwidth limiter of the jobs, use ``set_limits`` to change the limits at runtime"""
+        return self._bandwidth_limiter
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """Download throughput (bytes per second) of the last ``start()``, ``None`` if nothing downloaded"""
+        return self._throughput
+
     @property
     def waiting_size(self) -> int:
         """Get the number of jobs waiting to be processed"""
@@ -87,6 +116,16 @@ class JobRunner:
                 size += 1
         return size
 
+    @property
+    def failed_count(self) -> int:
+        """Get the number of jobs that failed"""
+        return self._failed_count
+
+    @property
+    def existed_count(self) -> int:
+        """Get the number of jobs skipped for existing files"""
+        return self._existed_count
+
     @property
     def processing_size(self) -> int:
         """Get the number of jobs that in process"""
@@ -99,99 +138,224 @@ class JobRunner:
         :return: Number of jobs that failed
         """
         failed_num = 0
+        # Jobs waiting for the download of the same server path, they don't take up this worker
+        shared_waiters: Set[asyncio.Task] = set()
         async with httpx.AsyncClient(
                 verify=config.ssl_verify,
                 cookies={"session": config.api.session_key} if config.api.session_key else None
         ) as client:
-            while not self._job_queue.empty():
-                job = await self._job_queue.get()
-
-                # Create downloader
-                url_parts = [config.downloader.scheme, config.api.files_netloc, job.server_path, '', '', '']
-                url = str(urlunparse(url_parts))
-                downloader = Downloader(
-                    url=url,
-                    path=job.path,
-                    client=client,
-                    designated_filename=job.alt_filename,
-                    server_path=job.server_path,
-                    post=job.post
-                )
-
-                # Create task
-                task = asyncio.create_task(
-                    downloader.run(
-                        tqdm_class=self._tqdm_class,
-                        progress=self._progress
+            while True:
+                while not self._job_queue.empty():
+                    job = await self._job_queue.get()
+
+                    # Create downloader
+                    url_parts = [config.downloader.scheme, config.api.files_netloc, job.server_path, '', '', '']
+                    url = str(urlunparse(url_parts))
+                    downloader = Downloader(
+                        url=url,
+                        path=job.path,
+                        client=client,
+                        designated_filename=job.alt_filename,
+                        server_path=job.server_path,
+                        post=job.post,
+                        dir_cache=self._dir_cache,
+                        bandwidth_limiter=self._bandwidth_limiter,
+                        proxy_pool=self._proxy_pool,
+                        content_sources=self._content_sources,
+                        staging=self._staging
                     )
-                )
-                self._downloaders_with_task[downloader] = task
-                # task.add_done_callback(lambda _: self._downloaders_with_task.pop(downloader))
-                #   Delete this for counting finished job tasks
 
-                # Run task
-                task_done_set, _ = await asyncio.wait([task], return_when=asyncio.FIRST_EXCEPTION)
-                task_done = task_done_set.pop()
-                try:
-                    exception = task_done.exception()
-                except CancelledError as e:
-                    exception = e
-                if not exception:  # raise Exception when cancelled or other exceptions
-                    ret = task_done.result()
-                    if ret.code == RetCodeEnum.FileExisted:
-                        logger.debug(ret.message)
-                        # Treat file existed as successful download but mark as existed
-                        if self._progress_manager:
-                            # Increment existed count atomically and update completed based on current done_size
-                            try:
-                                self._progress_manager.increment_existed(1)
-                            except AttributeError:
-                                # Fallback if older ProgressManager doesn't have increment_existed
-                                self._progress_manager.update_job_progress(
-                                    existed=self._progress_manager._existed_jobs + 1
-                                )
-                            self._progress_manager.update_job_progress(
-                                completed=self.done_size
-                            )
-                    elif ret.code != RetCodeEnum.Success:
-                        logger.error(ret.message)
-                        failed_num += 1
-                        # Update progress manager with failed job
-                        if self._progress_manager:
-                            self._progress_manager.update_job_progress(
-                                failed=failed_num
-                            )
+                    # Create task, jobs of the same server path share one download
+                    shared_key = urlparse(job.server_path).path
+                    if (shared := self._shared_downloads.get(shared_key)) is None:
+                        shared = self._shared_downloads[shared_key] = asyncio.get_running_loop().create_future()
+                        task = asyncio.create_task(self._run_primary(downloader, shared_key, shared))
+                        primary = True
                     else:
-                        # Update progress manager with completed job
-                        if self._progress_manager:
-                            self._progress_manager.update_job_progress(
-                                completed=self.done_size
-                            )
-                elif isinstance(exception, CancelledError):
-                    logger.warning(
-                        generate_msg(
-                            "Download cancelled",
-                            filename=job.alt_filename
-                        )
-                    )
-                else:
-                    logger.error(
-                        generate_msg(
-                            "Download failed",
-                            filename=job.alt_filename,
-                            exception=exception
-                        )
+                        task = asyncio.create_task(self._run_shared(downloader, shared_key, shared))
+                        primary = False
+                    self._downloaders_with_task[downloader] = task
+                    job_started = time.perf_counter()
+                    event_stream.emit(
+                        "job_started",
+                        server_path=job.server_path,
+                        path=job.path,
+                        filename=job.alt_filename
                     )
-                    failed_num += 1
-                    # Update progress manager with failed job
-                    if self._progress_manager:
-                        self._progress_manager.update_job_progress(
-                            failed=failed_num
+                    # task.add_done_callback(lambda _: self._downloaders_with_task.pop(downloader))
+                    #   Delete this for counting finished job tasks
+
+                    if not primary:
+                        shared_waiters.add(
+                            asyncio.create_task(self._finish_shared(job, downloader, task, job_started))
                         )
-                self._job_queue.task_done()
+                        continue
+
+                    # Run task
+                    await asyncio.wait([task], return_when=asyncio.FIRST_EXCEPTION)
+                    failed_num += self._finish_job(job, downloader, task, job_started)
+                if not shared_waiters:
+                    break
+                # Jobs that can't reuse the shared download are queued again, so keep working until all waiters finish
+                done, shared_waiters = await asyncio.wait(shared_waiters, return_when=asyncio.FIRST_COMPLETED)
+                failed_num += sum(x.result() for x in done)
         await self._job_queue.join()
         return failed_num
 
+    def _finish_job(self, job: Job, downloader: Downloader, task: asyncio.Task, job_started: float) -> int:
+        """
+        Record the outcome of a finished job task
+
+        :return: ``1`` if the job failed, otherwise ``0``
+        """
+        failed = 0
+        try:
+            exception = task.exception()
+        except CancelledError as e:
+            exception = e
+        if not exception:  # raise Exception when cancelled or other exceptions
+            ret = task.result()
+            outcome = RetCodeEnum(ret.code).name if ret.code in RetCodeEnum.__members__.values() \
+                else str(ret.code)
+            if ret.code == RetCodeEnum.FileExisted:
+                self._existed_count += 1
+                logger.debug(ret.message)
+                # Treat file existed as successful download but mark as existed
+                if self._progress_manager:
+                    # Increment existed count atomically and update completed based on current done_size
+                    try:
+                        self._progress_manager.increment_existed(1)
+                    except AttributeError:
+                        # Fallback if older ProgressManager doesn't have increment_existed
+                        self._progress_manager.update_job_progress(
+                            existed=self._progress_manager._existed_jobs + 1
+                        )
+                    self._progress_manager.update_job_progress(
+                        completed=self.done_size
+                    )
+            elif ret.code != RetCodeEnum.Success:
+                logger.error(ret.message)
+                failed = 1
+                self._failed_count += 1
+                # Update progress manager with failed job
+                if self._progress_manager:
+                    self._progress_manager.update_job_progress(
+                        failed=self._failed_count
+                    )
+            else:
+                # Update progress manager with completed job
+                if self._progress_manager:
+                    self._progress_manager.update_job_progress(
+                        completed=self.done_size
+                    )
+        elif isinstance(exception, CancelledError):
+            outcome = "Cancelled"
+            logger.warning(
+                generate_msg(
+                    "Download cancelled",
+                    filename=job.alt_filename
+                )
+            )
+        else:
+            outcome = "Exception"
+            logger.error(
+                generate_msg(
+                    "Download failed",
+                    filename=job.alt_filename,
+                    exception=exception
+                )
+            )
+            failed = 1
+            self._failed_count += 1
+            # Update progress manager with failed job
+            if self._progress_manager:
+                self._progress_manager.update_job_progress(
+                    failed=self._failed_count
+                )
+        duration = time.perf_counter() - job_started
+        metrics.job_outcomes.labels(outcome).inc()
+        metrics.job_duration.observe(duration)
+        if self._transfer_report:
+            record = downloader.record
+            record.filename = downloader.filename
+            record.outcome = outcome
+            record.duration = duration
+            self._transfer_report.add(record)
+        if event_stream.enabled:
+            event_stream.emit(
+                "job_finished",
+                server_path=job.server_path,
+                path=job.path,
+                filename=downloader.filename,
+                outcome=outcome,
+                exception=repr(exception) if exception else None,
+                bytes=downloader.downloaded_bytes,
+                duration=duration,
+                rate=downloader.downloaded_bytes / duration if duration > 0 else None
+            )
+        self._job_queue.task_done()
+        return failed
+
+    async def _run_primary(self, downloader: Downloader, key: str, shared: asyncio.Future) -> DownloaderRet[str]:
+        """
+        Download the file and publish the result to jobs of the same server path
+
+        The downloaded or existing file is published, or ``None`` if there is no file (e.g. failed or skipped \
+        by size), in which case ``key`` is released so that the waiting jobs queued again download it themselves.
+        """
+        src = None
+        try:
+            ret = await downloader.run(tqdm_class=self._tqdm_class, progress=self._progress)
+            if ret.code in (RetCodeEnum.Success, RetCodeEnum.FileExisted) and ret.data is not None:
+                src = downloader.path / ret.data
+            return ret
+        finally:
+            if src is None and self._shared_downloads.get(key) is shared:
+                del self._shared_downloads[key]
+            shared.set_result(src)
+
+    async def _run_shared(
+            self,
+            downloader: Downloader,
+            key: str,
+            shared: asyncio.Future
+    ) -> Optional[DownloaderRet[str]]:
+        """
+        Wait for the download of the same server path, and materialize it
+
+        If the published file is unavailable, ``key`` is released like ``_run_primary`` does.
+
+        :return: ``None`` if the job needs to be downloaded itself
+        """
+        with tracer.span("JobRunner.shared_wait"):
+            src = await asyncio.shield(shared)
+        if src is None:
+            return None
+        try:
+            ret = await downloader.run_from(src)
+        except OSError as e:
+            logger.debug(generate_msg("Failed to reuse downloaded file", src=src, exception=e))
+            if self._shared_downloads.get(key) is shared:
+                del self._shared_downloads[key]
+            return None
+        self._deduplicated_count += 1
+        return ret
+
+    async def _finish_shared(self, job: Job, downloader: Downloader, task: asyncio.Task, job_started: float) -> int:
+        """
+        Wait for the job task of ``_run_shared`` without taking up a worker, \
+        and queue the job again if it needs to be downloaded itself
+
+        :return: ``1`` if the job failed, otherwise ``0``
+        """
+        await asyncio.wait([task])
+        if not task.cancelled() and task.exception() is None and task.result() is None:
+            del self._downloaders_with_task[downloader]
+            self._job_queue.put_nowait(job)
+            self._job_queue.task_done()
+            return 0
+        return self._finish_job(job, downloader, task, job_started)
+
     async def _watch_status(self):
         """
         Watch running, completed, failed jobs
@@ -212,6 +376,7 @@ class JobRunner:
             # Exit promptly when cancelled to allow fast shutdown
             return
 
+    @traced("JobRunner.start")
     async def start(self) -> int:
         """
         Start processing jobs concurrently
@@ -229,13 +394,30 @@ class JobRunner:
             # Setup logger integration to work with progress display
             setup_logger_for_progress(self._progress_manager)
 
+        # Open progress event stream for headless runs
+        events_opened = event_stream.open_from_config()
+        metrics_started = await metrics_exporter.start_from_config()
+        metrics.jobs.labels("waiting").set_function(lambda: self.waiting_size)
+        metrics.jobs.labels("running").set_function(lambda: self.processing_size)
+
         async with self._lock:
+            self._watchdog.start()
+            started = time.perf_counter()
+            downloaded_before = sum(x.downloaded_bytes for x in self._downloaders_with_task)
             self._concurrent_tasks.clear()
             for _ in range(config.job.count):
                 task = asyncio.create_task(self.processor())
                 self._concurrent_tasks.add(task)
                 task.add_done_callback(self._concurrent_tasks.discard)
 
+            snapshot_task = None
+            if event_stream.enabled:
+                self._announce_jobs()
+                event_stream.emit("run_started", jobs=self._total_jobs_count, workers=config.job.count)
+                snapshot_task = asyncio.create_task(self._emit_snapshots())
+            else:
+                self._unannounced_jobs.clear()
+
             # Start background display update if using centralized progress
             display_task = None
             if self._progress_manager:
@@ -246,6 +428,9 @@ class JobRunner:
             if self._progress_manager:
                 watch_task = asyncio.create_task(self._watch_status())
 
+            # Snapshot memory at the peak of downloads when profiling memory
+            peak_task = asyncio.create_task(self._sample_memory_peak()) if profiler.memory else None
+
             # Wait for all concurrent processor tasks to finish
             task_done_set, _ = await asyncio.wait(self._concurrent_tasks)
 
@@ -264,18 +449,136 @@ class JobRunner:
                 except asyncio.CancelledError:
                     pass
 
+            if snapshot_task:
+                snapshot_task.cancel()
+                try:
+                    await snapshot_task
+                except asyncio.CancelledError:
+                    pass
+
+            if peak_task:
+                peak_task.cancel()
+                try:
+                    await peak_task
+                except asyncio.CancelledError:
+                    pass
+
             for task in task_done_set:
                 try:
                     failed_num += task.result()
                 except CancelledError:
                     pass
 
+            downloaded = sum(x.downloaded_bytes for x in self._downloaders_with_task) - downloaded_before
+            elapsed = time.perf_counter() - started
+            self._throughput = downloaded / elapsed if downloaded and elapsed > 0 else None
+
             # Clean up progress manager
             if self._progress_manager:
                 self._progress_manager.stop_display()
                 # Remove logger integration
                 setup_logger_for_progress(None)
 
+            await self._proxy_pool.aclose()
+            await self._content_sources.aclose()
+            await self._watchdog.stop()
+
+            if event_stream.enabled:
+                event_stream.emit("snapshot", **self._snapshot())
+                event_stream.emit(
+                    "run_finished",
+                    failed=failed_num,
+                    bytes=downloaded,
+                    duration=elapsed,
+                    throughput=self._throughput
+                )
+        if events_opened:
+            event_stream.close()
+        metrics.jobs.labels("waiting").set(self.waiting_size)
+        metrics.jobs.labels("waiting").set_function(None)
+        metrics.jobs.labels("running").set(0)
+        metrics.jobs.labels("running").set_function(None)
+        if metrics_started:
+            await metrics_exporter.stop()
+
+        if config.downloader.proxy_pool:
+            for name, stats in self._proxy_pool.stats().items():
+                logger.debug(
+                    generate_msg(
+                        f"Proxy endpoint statistics: {name}",
+                        successes=stats.successes,
+                        failures=stats.failures,
+                        ejections=stats.ejections
+                    )
+                )
+        if self._deduplicated_count:
+            logger.debug(f"{self._deduplicated_count} jobs reused files downloaded for the same server path")
+        if self._staging:
+            staging_stats = self._staging.stats()
+            logger.debug(
+                generate_msg(
+                    "Staging statistics",
+                    moved=staging_stats.moved,
+                    moved_bytes=staging_stats.moved_bytes,
+                    wait_time=f"{staging_stats.wait_time:.2f}s"
+                )
+            )
+        for name, stats in self._content_sources.stats().items():
+            logger.debug(
+                generate_msg(
+                    f"Content source statistics: {name}",
+                    hits=stats.hits,
+                    misses=stats.misses,
+                    errors=stats.errors,
+                    bytes=stats.bytes
+                )
+            )
+
+        if self._transfer_report:
+            try:
+                await fs_executor.run("report", self._transfer_report.write)
+            except OSError as e:
+                logger.error(
+                    generate_msg("Failed to write transfer report", path=self._transfer_report.path, exception=e)
+                )
+            else:
+                summary = self._transfer_report.summary()
+                logger.info(
+                    generate_msg(
+                        "Transfer report written",
+                        path=self._transfer_report.path,
+                        jobs=summary["jobs"],
+                        ttfb_p50=summary["ttfb"]["p50"],
+                        throughput_p50=summary["throughput"]["p50"],
+                        throughput_p90=summary["throughput"]["p90"]
+                    )
+                )
+
+        for stats in self._watchdog.stats()[:5]:
+            logger.warning(
+                generate_msg(
+                    "Event loop was blocked, which slows down all jobs",
+                    location=stats.location,
+                    count=stats.count,
+                    total=f"{stats.total:.2f}s",
+                    max=f"{stats.max:.2f}s"
+                )
+            )
+            if stats.stack:
+                logger.debug(f"Stack of the longest blocking at {stats.location}:\n{stats.stack}")
+
+        for op, stats in fs_executor.metrics().items():
+            logger.debug(
+                generate_msg(
+                    f"Filesystem operation statistics: {op}",
+                    count=stats.count,
+                    errors=stats.errors,
+                    avg_time=f"{stats.avg_time * 1000:.2f}ms",
+                    max_time=f"{stats.max_time * 1000:.2f}ms",
+                    total_wait=f"{stats.total_wait:.2f}s"
+                )
+            )
+
         if failed_num:
             logger.warning(f"{failed_num} jobs failed, download finished")
         else:
@@ -288,14 +591,61 @@ class JobRunner:
             while True:
                 if self._progress_manager:
                     self._progress_manager.update_display()
-                await asyncio.sleep(0.1)  # Update 10 times per second
+                # Update 10 times per second, or less often if rendering is slow
+                await asyncio.sleep(self._progress_manager.render_interval if self._progress_manager else 0.1)
         except asyncio.CancelledError:
             pass
 
+    @staticmethod
+    async def _sample_memory_peak():
+        """Let the profiler snapshot memory periodically, it keeps the highest one"""
+        while True:
+            profiler.sample_peak()
+            await asyncio.sleep(1)
+
+    @property
+    def _announcing(self) -> bool:
+        """Whether queued jobs need to be announced, i.e. the event stream is opened or configured"""
+        return event_stream.enabled or bool(config.monitor.events)
+
+    def _announce_jobs(self):
+        """Emit ``job_queued`` events of jobs not announced yet"""
+        for job in self._unannounced_jobs:
+            event_stream.emit("job_queued", server_path=job.server_path, path=job.path, filename=job.alt_filename)
+        self._unannounced_jobs.clear()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """Aggregate state of jobs"""
+        return {
+            "waiting": self.waiting_size,
+            "running": self.processing_size,
+            "done": self.done_size,
+            "failed": self._failed_count,
+            "existed": self._existed_count,
+            "total": self._total_jobs_count,
+            "bytes": sum(x.downloaded_bytes for x in self._downloaders_with_task)
+        }
+
+    async def _emit_snapshots(self):
+        """Emit aggregate snapshot events periodically"""
+        last_time = time.perf_counter()
+        last_bytes = sum(x.downloaded_bytes for x in self._downloaders_with_task)
+        while True:
+            await asyncio.sleep(event_stream.snapshot_interval)
+            snapshot = self._snapshot()
+            now = time.perf_counter()
+            snapshot["rate"] = (snapshot["bytes"] - last_bytes) / (now - last_time)
+            last_time, last_bytes = now, snapshot["bytes"]
+            event_stream.emit("snapshot", **snapshot)
+
     async def add_jobs(self, *jobs: Job):
         """Add jobs to ``self._job_queue``"""
         for job in jobs:
             await self._job_queue.put(job)
+        if self._announcing:
+            self._unannounced_jobs.extend(jobs)
+        if event_stream.enabled:
+            self._announce_jobs()
 
         # Update total job count for progress tracking
         self._total_jobs_count += len(jobs)
@@ -0,0 +1,66 @@
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Any
+
+from loguru import logger
+from pydantic import ValidationError
+
+from ktoolbox._enum import DataStorageNameEnum
+from ktoolbox.configuration import config
+from ktoolbox.model import BaseKToolBoxData
+from ktoolbox.utils import generate_msg
+
+__all__ = ["SyncState", "sync_fingerprint"]
+
+
+def sync_fingerprint(**options: Any) -> str:
+    """
+    Fingerprint of the options that decide which files a sync downloads
+
+    ``JobConfiguration`` is always included, since its filters and structures affect the jobs.
+
+    :param options: Sync options, e.g. ``offset``, ``keywords``
+    """
+    data = {
+        "options": options,
+        "job": config.job.model_dump(mode="json")
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SyncState(BaseKToolBoxData):
+    """
+    State of the last successful sync of a creator directory
+
+    A sync is skipped when the creator hasn't been updated since, with the same options.
+    """
+    creator_updated: Optional[datetime] = None
+    """``Creator.updated`` at the last successful sync"""
+    completed: Optional[datetime] = None
+    """When the last successful sync completed"""
+    fingerprint: Optional[str] = None
+    """``sync_fingerprint`` of the last successful sync"""
+
+    @classmethod
+    def load(cls, path: Path) -> "SyncState":
+        """Load from the creator directory, return an empty one if not saved or invalid"""
+        file = path / DataStorageNameEnum.SyncStateData.value
+        try:
+            return cls.model_validate_json(file.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValidationError, ValueError) as e:
+            logger.warning(generate_msg("Ignored invalid sync state", path=file, exception=e))
+            return cls()
+
+    def save(self, path: Path):
+        """Save to the creator directory"""
+        file = path / DataStorageNameEnum.SyncStateData.value
+        file.write_text(self.model_dump_json(indent=config.json_dump_indent), encoding="utf-8")
+
+    def is_fresh(self, creator_updated: datetime, fingerprint: str) -> bool:
+        """Check if nothing changed since the last successful sync"""
+        return self.creator_updated is not None and self.fingerprint == fingerprint and \
+            creator_updated <= self.creator_updated
@@ -0,0 +1,6 @@
+from . import metrics
+from .events import *
+from .metrics import *
+from .profiling import *
+from .trace import *
+from .watchdog import *
@@ -0,0 +1,131 @@
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Optional, TextIO, Any
+
+from loguru import logger
+
+from ktoolbox.configuration import config
+from ktoolbox.utils import generate_msg
+
+__all__ = ["EventStream", "event_stream"]
+
+_STOP = object()
+_MAX_BATCH = 1024
+
+
+class EventStream:
+    """
+    NDJSON event stream for headless runs
+
+    ``emit`` only puts the event to a queue, a background thread serializes and writes them, \
+    so it's cheap and never blocks the caller. It does nothing if the stream is not opened.
+
+    Each line is a JSON object with ``ts`` (Unix time), ``event`` and event fields.
+    """
+
+    def __init__(self):
+        self._queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._file: Optional[TextIO] = None
+        self._close_file = False
+        self.enabled = False
+        """Whether the stream is opened, check it before building expensive event fields"""
+        self.snapshot_interval = 5.0
+        """Seconds between aggregate snapshot events"""
+
+    def open(self, target: str):
+        """
+        Open the stream and start the writer thread
+
+        :param target: File path (appended), ``-`` for stdout, or ``fd:N`` for a file descriptor
+        :raise OSError: Failed to open the target
+        """
+        if self.enabled:
+            self.close()
+        if target == "-":
+            self._file, self._close_file = sys.stdout, False
+        elif target.startswith("fd:"):
+            self._file = os.fdopen(int(target[3:]), "w", encoding="utf-8", closefd=False)
+            self._close_file = True
+        else:
+            self._file = open(target, "a", encoding="utf-8")
+            self._close_file = True
+        self._thread = threading.Thread(target=self._writer, name="ktoolbox-events", daemon=True)
+        self._thread.start()
+        self.enabled = True
+
+    def open_from_config(self) -> bool:
+        """
+        Open the stream by ``MonitorConfiguration`` if it's not opened, errors are logged
+
+        :return: Whether the stream is opened by this call, which should be closed by the caller
+        """
+        if not config.monitor.events or self.enabled:
+            return False
+        try:
+            self.open(config.monitor.events)
+        except (OSError, ValueError) as e:
+            logger.error(
+                generate_msg("Failed to open progress event stream", target=config.monitor.events, exception=e)
+            )
+            return False
+        self.snapshot_interval = config.monitor.events_snapshot_interval
+        return True
+
+    def emit(self, event: str, **fields: Any):
+        """
+        Emit an event
+
+        :param event: Event name, e.g. ``job_finished``
+        :param fields: Event fields, which must be JSON serializable (or convertible by ``str``)
+        """
+        if self.enabled:
+            fields["ts"] = time.time()
+            fields["event"] = event
+            self._queue.put(fields)
+
+    def _writer(self):
+        stopping = False
+        while not stopping:
+            items = [self._queue.get()]
+            # Write all queued events at once
+            while len(items) < _MAX_BATCH:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for item in items:
+                if item is _STOP:
+                    stopping = True
+                    continue
+                lines.append(json.dumps(item, default=str, ensure_ascii=False))
+            if not lines:
+                continue
+            try:
+                self._file.write("\n".join(lines) + "\n")
+                self._file.flush()
+            except (OSError, ValueError) as e:
+                logger.error(generate_msg("Failed to write progress events, event stream closed", exception=e))
+                self.enabled = False
+                return
+
+    def close(self):
+        """Write pending events and close the stream"""
+        if self._thread is None:
+            return
+        self.enabled = False
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        if self._close_file:
+            self._file.close()
+        self._file = None
+
+
+event_stream = EventStream()
+"""Event stream shared by jobs and downloaders, opened by ``JobRunner`` if ``MonitorConfiguration.events`` set"""
@@ -0,0 +1,382 @@
+import asyncio
+import math
+import os
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from pathlib import Path
+from typing import Tuple, Dict, List, Optional, Callable, Iterator, Sequence
+
+from loguru import logger
+
+from ktoolbox.configuration import config
+from ktoolbox.filesystem import fs_executor
+from ktoolbox.utils import generate_msg
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "MetricsExporter",
+    "registry",
+    "metrics_exporter"
+]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+class _Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        """
+        :param name: Metric name, e.g. ``ktoolbox_downloaded_bytes_total``
+        :param documentation: ``HELP`` text
+        :param labels: Label names
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, *values: str):
+        """
+        Get the child of the label values, keep the returned child to skip the lookup in hot paths
+
+        :param values: Label values, in the order of label names
+        """
+        try:
+            return self._children[values]
+        except KeyError:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"Expected {len(self.label_names)} label values, got {len(values)}")
+            child = self._children[values] = self._new_child()
+            return child
+
+    def _new_child(self) -> "_Metric":
+        return type(self)(self.name, self.documentation)
+
+    @abstractmethod
+    def _samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Get ``(suffix, labels, value)`` of the metric without labels"""
+        ...
+
+    def render(self) -> List[str]:
+        """Render in Prometheus text exposition format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        if self.label_names:
+            children = [(_format_labels(self.label_names, k), v) for k, v in list(self._children.items())]
+        else:
+            children = [("", self)]
+        for labels, child in children:
+            for suffix, extra_labels, value in child._samples():
+                if labels and extra_labels:
+                    labels_text = f"{labels[:-1]},{extra_labels}}}"
+                elif extra_labels:
+                    labels_text = f"{{{extra_labels}}}"
+                else:
+                    labels_text = labels
+                lines.append(f"{self.name}{suffix}{labels_text} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value, e.g. total bytes downloaded"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        """Increase the value, cheap enough to call for every chunk"""
+        self.value += amount
+
+    def _samples(self):
+        yield "", "", self.value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. queue depth"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Optional[Callable[[], float]]):
+        """
+        Compute the value by ``function`` when collected, so that nothing is done in hot paths
+
+        :param function: Function returns the value, ``None`` to use the value set by ``set()``
+        """
+        self._function = function
+
+    def _samples(self):
+        yield "", "", self._function() if self._function else self.value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, e.g. request latency"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = None):
+        """
+        :param buckets: Upper bounds of buckets, ``DEFAULT_BUCKETS`` by default
+        """
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self):
+        return type(self)(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def _samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self._counts):
+            cumulative += count
+            yield "_bucket", f'le="{_format_value(float(bound))}"', cumulative
+        yield "_bucket", 'le="+Inf"', self.count
+        yield "_sum", "", self.sum
+        yield "_count", "", self.count
+
+
+class MetricsRegistry:
+    """Collection of metrics to export"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        Register a metric
+
+        :raise ValueError: Name already registered
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labels: Sequence[str] = (),
+            buckets: Sequence[float] = None
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _write_textfile(path: Path, content: str):
+    """Write atomically, so that collectors never read a partial file"""
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}")
+    temp_path.write_text(content, encoding="utf-8")
+    os.replace(temp_path, path)
+
+
+class MetricsExporter:
+    """
+    Export ``registry`` by a local HTTP endpoint (``GET /metrics``) or a textfile for node_exporter
+    """
+
+    def __init__(self, metrics_registry: "MetricsRegistry"):
+        self._registry = metrics_registry
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: List[asyncio.Task] = []
+        self._textfile: Optional[Path] = None
+        self.running = False
+
+    async def start(
+            self,
+            *,
+            host: str = "127.0.0.1",
+            port: Optional[int] = None,
+            textfile: Optional[Path] = None,
+            interval: float = 15.0
+    ):
+        """
+        Start exporting in the running event loop
+
+        :param host: Host of the HTTP endpoint
+        :param port: Port of the HTTP endpoint, ``None`` for disable
+        :param textfile: Path of the textfile, ``None`` for disable
+        :param interval: Seconds between textfile writes
+        :raise OSError: Failed to listen on the port
+        """
+        if self.running:
+            await self.stop()
+        if port is not None:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        self._textfile = textfile
+        if textfile is not None:
+            self._tasks.append(asyncio.create_task(self._write_textfile_periodically(interval)))
+        self.running = True
+
+    async def start_from_config(self) -> bool:
+        """
+        Start by ``MonitorConfiguration`` if it's enabled and not running, errors are logged
+
+        :return: Whether the exporter is started by this call, which should be stopped by the caller
+        """
+        if self.running or (config.monitor.metrics_port is None and config.monitor.metrics_textfile is None):
+            return False
+        try:
+            await self.start(
+                host=config.monitor.metrics_host,
+                port=config.monitor.metrics_port,
+                textfile=config.monitor.metrics_textfile,
+                interval=config.monitor.metrics_textfile_interval
+            )
+        except OSError as e:
+            logger.error(
+                generate_msg(
+                    "Failed to start metrics endpoint",
+                    host=config.monitor.metrics_host,
+                    port=config.monitor.metrics_port,
+                    exception=e
+                )
+            )
+            return False
+        return True
+
+    @property
+    def port(self) -> Optional[int]:
+        """Port listened by the HTTP endpoint, useful when started with port ``0``"""
+        if self._server is None or not self._server.sockets:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop exporting, the textfile is written for the last time"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._textfile is not None:
+            await self.write_textfile()
+        self.running = False
+
+    async def write_textfile(self):
+        """Write metrics to the textfile, errors are logged"""
+        try:
+            await fs_executor.run("metrics", _write_textfile, self._textfile, self._registry.render())
+        except OSError as e:
+            logger.error(generate_msg("Failed to write metrics textfile", path=self._textfile, exception=e))
+
+    async def _write_textfile_periodically(self, interval: float):
+        while True:
+            await self.write_textfile()
+            await asyncio.sleep(interval)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve a minimal HTTP/1.0 response for each connection"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Skip headers
+            while await asyncio.wait_for(reader.readline(), 5) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/metrics", "/"):
+                status, body = "200 OK", self._registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.0 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+
+registry = MetricsRegistry()
+"""Registry of KToolBox metrics"""
+
+metrics_exporter = MetricsExporter(registry)
+"""Exporter of ``registry``, started by ``JobRunner`` if enabled in ``MonitorConfiguration``"""
+
+downloaded_bytes = registry.counter("ktoolbox_downloaded_bytes_total", "Bytes downloaded from file servers")
+job_outcomes = registry.counter("ktoolbox_jobs_finished_total", "Download jobs finished by outcome", ["outcome"])
+job_duration = registry.histogram("ktoolbox_job_duration_seconds", "Duration of download jobs")
+api_requests = registry.counter(
+    "ktoolbox_api_requests_total",
+    "Kemono API requests by endpoint and status code (error for network errors)",
+    ["endpoint", "status"]
+)
+api_request_duration = registry.histogram(
+    "ktoolbox_api_request_duration_seconds",
+    "Latency of Kemono API requests",
+    ["endpoint"]
+)
+retries = registry.counter("ktoolbox_retries_total", "Retries of API calls and downloads", ["kind"])
+forbidden_responses = registry.counter(
+    "ktoolbox_forbidden_responses_total",
+    "HTTP 403 responses from file servers by host",
+    ["host"]
+)
+jobs = registry.gauge("ktoolbox_jobs", "Download jobs by state", ["state"])
+loop_lag = registry.histogram(
+    "ktoolbox_event_loop_lag_seconds",
+    "Delay of event loop wakeups, sampled by the loop watchdog",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+loop_blocked = registry.counter(
+    "ktoolbox_event_loop_blocked_seconds_total",
+    "Time the event loop was blocked beyond the watchdog threshold, by code location",
+    ["location"]
+)
@@ -0,0 +1,153 @@
+import cProfile
+import io
+import linecache
+import pstats
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+__all__ = ["MemoryStage", "Profiler", "profiler"]
+
+_PEAK_GROWTH = 1.1
+"""Take a new peak snapshot only when traced memory grows by this factor, snapshots are expensive"""
+
+
+@dataclass
+class MemoryStage:
+    """Memory snapshot taken at a stage boundary"""
+    name: str
+    current: int
+    """Traced memory in bytes when the snapshot was taken"""
+    peak: int
+    """Peak traced memory in bytes so far"""
+    top: List[Tuple[str, int, int]] = field(default_factory=list)
+    """Top allocators grown since the previous stage, ``(location, size diff, count diff)``"""
+
+
+class Profiler:
+    """
+    CPU profiling by ``cProfile``, and optional memory snapshots at stage boundaries by ``tracemalloc``
+
+    ``cProfile`` only measures the thread that started it, i.e. the event loop, \
+    so the time of filesystem operations in ``fs_executor`` threads is shown as waiting.
+    Stage methods do nothing when the profiler is not started.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self._top = 10
+        self._profile: Optional[cProfile.Profile] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._peak_current = 0
+        self._peak_stage: Optional[MemoryStage] = None
+        self.stages: List[MemoryStage] = []
+
+    def start(self, *, memory: bool = False, top: int = 10):
+        """
+        Start profiling
+
+        :param memory: Trace memory allocations and snapshot them at stage boundaries
+        :param top: Number of top allocators reported for each stage
+        """
+        self.memory = memory
+        self._top = top
+        self.stages.clear()
+        self._snapshot = None
+        self._peak_current = 0
+        self._peak_stage = None
+        if memory:
+            tracemalloc.start()
+            self._snapshot = self._take_snapshot()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        self.enabled = True
+
+    def stop(self):
+        """Stop profiling, the peak snapshot is added as the ``peak`` stage"""
+        if not self.enabled:
+            return
+        self._profile.disable()
+        if self.memory:
+            if self._peak_stage:
+                self.stages.append(self._peak_stage)
+            tracemalloc.stop()
+        self.enabled = False
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+        ))
+
+    def _diff(self, name: str, snapshot: tracemalloc.Snapshot) -> MemoryStage:
+        current, peak = tracemalloc.get_traced_memory()
+        stats = snapshot.compare_to(self._snapshot, "lineno") if self._snapshot else snapshot.statistics("lineno")
+        top = []
+        for stat in stats[:self._top]:
+            frame = stat.traceback[0]
+            size_diff = getattr(stat, "size_diff", stat.size)
+            count_diff = getattr(stat, "count_diff", stat.count)
+            top.append((f"{frame.filename}:{frame.lineno}", size_diff, count_diff))
+        return MemoryStage(name, current, peak, top)
+
+    def stage(self, name: str):
+        """
+        Mark a stage boundary, e.g. after listing posts
+
+        :param name: Stage name
+        """
+        if not (self.enabled and self.memory):
+            return
+        snapshot = self._take_snapshot()
+        self.stages.append(self._diff(name, snapshot))
+        self._snapshot = snapshot
+
+    def sample_peak(self):
+        """Snapshot memory if it's the highest so far, call it periodically during downloads"""
+        if not (self.enabled and self.memory):
+            return
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self._peak_current * _PEAK_GROWTH:
+            self._peak_current = current
+            self._peak_stage = self._diff("peak", self._take_snapshot())
+
+    def report(self, limit: int = 50) -> str:
+        """
+        Format the report of the last profiling
+
+        :param limit: Number of functions listed by cumulative and internal time
+        """
+        buffer = io.StringIO()
+        if self._profile is not None:
+            stats = pstats.Stats(self._profile, stream=buffer).strip_dirs()
+            buffer.write("CPU profile, by cumulative time\n")
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+            buffer.write("CPU profile, by internal time\n")
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(limit)
+        for stage in self.stages:
+            buffer.write(
+                f"Memory stage {stage.name}: current {stage.current / 2 ** 20:.1f} MiB, "
+                f"peak {stage.peak / 2 ** 20:.1f} MiB\n"
+            )
+            for location, size_diff, count_diff in stage.top:
+                buffer.write(f"  {size_diff / 1024:>+12.1f} KiB  {count_diff:>+9}  {location}\n")
+            buffer.write("\n")
+        return buffer.getvalue()
+
+    def write(self, path: Path):
+        """
+        Write raw ``pstats`` data to ``path`` (for tools like snakeviz), and the report to ``path`` + ``.txt``
+
+        :raise OSError: Failed to write the files
+        """
+        if self._profile is not None:
+            self._profile.dump_stats(str(path))
+        Path(f"{path}.txt").write_text(self.report(), encoding="utf-8")
+
+
+profiler = Profiler()
+"""Profiler of KToolBox commands, started by ``--profile`` option"""
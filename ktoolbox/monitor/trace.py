@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from functools import wraps
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, TypeVar, Union
+
+__all__ = ["StageSummary", "Tracer", "tracer", "traced"]
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+@dataclass
+class StageSummary:
+    """Time spent in a stage, spans of the same name"""
+    name: str
+    count: int = 0
+    total: float = 0.0
+    """Total seconds, spans of concurrent tasks are added up"""
+    max: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class _NullSpan:
+    """Span returned when tracing is disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_tracer", "_name", "_category", "_args", "_start")
+
+    def __init__(self, span_tracer: "Tracer", name: str, category: str, args: Optional[Dict[str, Any]]):
+        self._tracer = span_tracer
+        self._name = name
+        self._category = category
+        self._args = args
+        self._start = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, *_):
+        end = time.perf_counter_ns()
+        args = self._args
+        if exc_type is not None:
+            args = dict(args or {}, error=exc_type.__name__)
+        self._tracer._record(self._name, self._category, self._start, end, args)
+        return False
+
+
+class Tracer:
+    """
+    Collect spans of stages, and export them as a Chrome trace (``chrome://tracing``, Perfetto)
+
+    Spans of each asyncio task are placed on their own track. ``span()`` returns a shared no-op \
+    context manager when the tracer is not started, so instrumentation costs almost nothing by default.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._origin = 0
+        self._events: List[Dict[str, Any]] = []
+        self._lanes: "weakref.WeakKeyDictionary[asyncio.Task, int]" = weakref.WeakKeyDictionary()
+        self._thread_lanes: Dict[int, int] = {}
+        self._lane_names: Dict[int, str] = {}
+
+    def start(self):
+        """Start collecting spans, spans collected before are dropped"""
+        self._events.clear()
+        self._lanes.clear()
+        self._thread_lanes.clear()
+        self._lane_names.clear()
+        self._origin = time.perf_counter_ns()
+        self.enabled = True
+
+    def stop(self):
+        """Stop collecting spans, collected spans are kept for ``write()`` and ``summary()``"""
+        self.enabled = False
+
+    def span(self, name: str, category: str = "ktoolbox", **args: Any) -> Union[_Span, _NullSpan]:
+        """
+        Measure a block as a span
+
+        :param name: Stage name, spans of the same name are summarized together
+        :param category: Category of the span in the trace viewer
+        :param args: Extra information shown in the trace viewer
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args or None)
+
+    def _lane(self) -> int:
+        """Get the track of the current asyncio task or thread"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            lane = self._lanes.get(task)
+            if lane is None:
+                lane = self._lanes[task] = len(self._lane_names) + 1
+                self._lane_names[lane] = task.get_name()
+        else:
+            ident = threading.get_ident()
+            lane = self._thread_lanes.get(ident)
+            if lane is None:
+                lane = self._thread_lanes[ident] = len(self._lane_names) + 1
+                self._lane_names[lane] = threading.current_thread().name
+        return lane
+
+    def _record(self, name: str, category: str, start: int, end: int, args: Optional[Dict[str, Any]]):
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._origin) / 1000,
+            "dur": (end - start) / 1000,
+            "pid": os.getpid(),
+            "tid": self._lane()
+        }
+        if args:
+            event["args"] = args
+        self._events.append(event)
+
+    def summary(self) -> List[StageSummary]:
+        """Summarize collected spans by stage name, sorted by total time"""
+        stages: Dict[str, StageSummary] = {}
+        for event in self._events:
+            stage = stages.get(event["name"])
+            if stage is None:
+                stage = stages[event["name"]] = StageSummary(event["name"])
+            duration = event["dur"] / 1e6
+            stage.count += 1
+            stage.total += duration
+            stage.max = max(stage.max, duration)
+        return sorted(stages.values(), key=lambda x: x.total, reverse=True)
+
+    def format_summary(self) -> str:
+        """Format ``summary()`` as a table"""
+        stages = self.summary()
+        width = max([len(x.name) for x in stages] + [5])
+        lines = [f"{'Stage':<{width}}  {'Count':>8}  {'Total(s)':>10}  {'Mean(ms)':>10}  {'Max(ms)':>10}"]
+        for stage in stages:
+            lines.append(
+                f"{stage.name:<{width}}  {stage.count:>8}  {stage.total:>10.3f}  "
+                f"{stage.mean * 1000:>10.2f}  {stage.max * 1000:>10.2f}"
+            )
+        return "\n".join(lines)
+
+    def write(self, path: Path):
+        """
+        Write collected spans as a Chrome trace JSON file
+
+        :raise OSError: Failed to write the file
+        """
+        pid = os.getpid()
+        metadata = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "KToolBox"}}
+        ] + [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": lane, "args": {"name": name}}
+            for lane, name in self._lane_names.items()
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + self._events, "displayTimeUnit": "ms"}, f, default=str)
+
+
+tracer = Tracer()
+"""Tracer of KToolBox stages, started by ``--trace`` option"""
+
+
+def traced(name: str = None, category: str = "ktoolbox") -> Callable[[_F], _F]:
+    """
+    Measure each call of an async function as a span
+
+    :param name: Stage name, the qualified name of the function by default
+    :param category: Category of the span in the trace viewer
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return await func(*args, **kwargs)
+            with tracer.span(span_name, category):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,149 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+
+from ktoolbox.configuration import config
+from ktoolbox.monitor import metrics
+
+__all__ = ["BlockingStats", "LoopWatchdog"]
+
+_PACKAGE_PATH = str(Path(__file__).parent.parent)
+_STACK_LIMIT = 30
+
+
+def _blocking_location(stack: traceback.StackSummary) -> str:
+    """Get the innermost KToolBox frame of the stack, or the innermost frame if there's none"""
+    for frame in reversed(stack):
+        if frame.filename.startswith(_PACKAGE_PATH) and frame.filename != __file__:
+            return f"{Path(frame.filename).relative_to(_PACKAGE_PATH).as_posix()}:{frame.lineno} ({frame.name})"
+    frame = stack[-1]
+    return f"{frame.filename}:{frame.lineno} ({frame.name})"
+
+
+@dataclass
+class BlockingStats:
+    """Statistics of blocking at a code location"""
+    location: str
+    count: int = 0
+    total: float = 0.0
+    """Total seconds the loop was blocked"""
+    max: float = 0.0
+    stack: str = ""
+    """Stack of the longest blocking"""
+
+
+class LoopWatchdog:
+    """
+    Measure event loop lag continuously, and attribute blocking to the code that blocks the loop
+
+    A heartbeat task runs on the loop, while a sampling thread captures the stack of the loop thread \
+    (``sys._current_frames``) once the heartbeat is late for more than ``threshold``. \
+    When the heartbeat resumes, the lag is recorded with the captured stack.
+    """
+
+    def __init__(self, threshold: Optional[float] = 0.25, *, interval: float = 0.05):
+        """
+        :param threshold: Seconds of lag to treat as blocking, ``None`` to disable the watchdog
+        :param interval: Seconds between heartbeats, also the sampling interval of the thread
+        """
+        self.threshold = threshold
+        self._interval = interval
+        self._beat: Optional[float] = None
+        self._captured: Optional[Tuple[float, traceback.StackSummary]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._stats: Dict[str, BlockingStats] = {}
+
+    @classmethod
+    def from_config(cls) -> "LoopWatchdog":
+        """Create from ``MonitorConfiguration``"""
+        return cls(config.monitor.loop_watchdog_threshold)
+
+    def __bool__(self):
+        return self.threshold is not None
+
+    def stats(self) -> List[BlockingStats]:
+        """Get a snapshot of statistics, sorted by total blocking time"""
+        return sorted(
+            (BlockingStats(**vars(x)) for x in self._stats.values()),
+            key=lambda x: x.total,
+            reverse=True
+        )
+
+    def start(self):
+        """Start watching the running event loop, does nothing if disabled or started"""
+        if not self or self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._captured = None
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._sample, name="ktoolbox-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        """Stop watching"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            beat = self._beat = time.monotonic()
+            await asyncio.sleep(self._interval)
+            lag = max(time.monotonic() - beat - self._interval, 0.0)
+            metrics.loop_lag.observe(lag)
+            if lag >= self.threshold:
+                self._record(beat, lag)
+
+    def _record(self, beat: float, lag: float):
+        captured, self._captured = self._captured, None
+        if captured is not None and captured[0] == beat:
+            stack = captured[1]
+            location = _blocking_location(stack)
+        else:
+            # Not sampled in time, e.g. the blocking is just above the threshold
+            stack = None
+            location = "<unknown>"
+        stats = self._stats.get(location)
+        if stats is None:
+            stats = self._stats[location] = BlockingStats(location)
+        stats.count += 1
+        stats.total += lag
+        if lag > stats.max:
+            stats.max = lag
+            stats.stack = "".join(stack.format()) if stack else ""
+        metrics.loop_blocked.labels(location).inc(lag)
+
+    def _sample(self):
+        """Sampling thread, capture the stack of the loop thread once for each late heartbeat"""
+        captured_beat = None
+        while not self._stopping.wait(self._interval):
+            beat = self._beat
+            if beat == captured_beat or time.monotonic() - beat <= self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=_STACK_LIMIT)
+            del frame
+            # Discard if the loop resumed while capturing
+            if self._beat == beat:
+                self._captured = (beat, stack)
+                captured_beat = beat
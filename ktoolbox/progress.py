@@ -7,11 +7,16 @@ Inspired by rclone's progress display approach with enhanced visual effects.
 """
 
 import asyncio
+import atexit
+import logging
+import math
 import os
 import sys
 import threading
 import time
-from typing import Dict, List, Optional, TextIO
+import weakref
+from collections import deque
+from typing import Dict, List, Optional, TextIO, Tuple, Deque, Hashable
 from dataclasses import dataclass, field
 
 from tqdm import tqdm as std_tqdm
@@ -21,7 +26,18 @@ try:
 except ImportError:
     RICH_AVAILABLE = False
 
-__all__ = ["ProgressManager", "ManagedTqdm", "ColorTheme", "setup_logger_for_progress", "create_managed_tqdm_class"]
+__all__ = [
+    "ProgressManager",
+    "ManagedTqdm",
+    "ColorTheme",
+    "ProgressAwareHandler",
+    "setup_logger_for_progress",
+    "flush_suppressed_logs",
+    "create_managed_tqdm_class"
+]
+
+_RATE_TIME_CONSTANT = 2.0
+"""Seconds of the time constant for EWMA of download rates"""
 
 # Global reference to active progress manager for logger integration
 _active_progress_manager: Optional['ProgressManager'] = None
@@ -33,24 +49,111 @@ def setup_logger_for_progress(progress_manager: 'ProgressManager' = None):
     _active_progress_manager = progress_manager
 
 
+# Handlers whose suppressed messages are summarized by the render task
+_handlers: "weakref.WeakSet[ProgressAwareHandler]" = weakref.WeakSet()
+
+
+def flush_suppressed_logs(final: bool = False):
+    """
+    Emit summaries of suppressed messages whose window has ended
+
+    :param final: Emit summaries of all windows, including unfinished ones, e.g. at exit
+    """
+    for handler in list(_handlers):
+        handler.flush_suppressed(final)
+
+
+atexit.register(flush_suppressed_logs, True)
+
+
+@dataclass
+class _BurstState:
+    """Rate limit state of similar messages"""
+    window_start: float
+    count: int = 0
+    suppressed: int = 0
+    last: str = ""
+
+
 class ProgressAwareHandler:
-    """Custom loguru handler that works with progress manager"""
+    """
+    Custom loguru handler that works with progress manager
 
-    def __init__(self, original_handler):
+    While the progress display is running, messages are queued to the progress manager \
+    and written by its render task, so logging never blocks on redrawing the display.
+    Similar ``WARNING`` and lower messages (from the same source line) beyond ``burst`` in ``window`` seconds \
+    are suppressed, and summarized when the window ends. Errors are never suppressed.
+    """
+
+    def __init__(self, original_handler, burst: int = 0, window: float = 10.0):
+        """
+        :param original_handler: Output with ``write`` method, used when the progress display is not running
+        :param burst: Maximum number of similar messages in ``window``, ``0`` for unlimited
+        :param window: Seconds of rate limit window
+        """
         self.original_handler = original_handler
+        self.burst = burst
+        self.window = window
+        self._bursts: Dict[Hashable, _BurstState] = {}
+        self._lock = threading.Lock()
+        _handlers.add(self)
 
-    def write(self, message):
-        global _active_progress_manager
-        if _active_progress_manager and _active_progress_manager._running:
-            # Temporarily clear progress display
-            _active_progress_manager.temporary_clear_for_log()
-            self.original_handler.write(message)
-            # Small delay to ensure message is visible
-            time.sleep(0.05)
-            # Restore progress display
-            _active_progress_manager.restore_display()
+    @staticmethod
+    def _key(message) -> Optional[Hashable]:
+        record = getattr(message, "record", None)
+        if record is None or record["level"].no > logging.WARNING:
+            return None
+        return record["level"].no, record["file"].path, record["line"]
+
+    @staticmethod
+    def _summary(state: _BurstState) -> str:
+        return f"{state.last.rstrip()} ({state.suppressed} similar messages suppressed)\n"
+
+    def _expire(self, now: float, final: bool = False) -> List[str]:
+        """Close ended windows (or all windows if ``final``), return summaries of them"""
+        summaries = []
+        for key, state in list(self._bursts.items()):
+            if final or now - state.window_start >= self.window:
+                if state.suppressed:
+                    summaries.append(self._summary(state))
+                del self._bursts[key]
+        return summaries
+
+    def _emit(self, text: str):
+        manager = _active_progress_manager
+        if manager and manager._running:
+            manager.enqueue_log(text)
         else:
-            self.original_handler.write(message)
+            self.original_handler.write(text)
+
+    def write(self, message):
+        key = self._key(message) if self.burst else None
+        if key is None:
+            self._emit(message)
+            return
+        now = time.monotonic()
+        with self._lock:
+            outputs = self._expire(now)
+            state = self._bursts.get(key)
+            if state is None:
+                state = self._bursts[key] = _BurstState(window_start=now)
+            state.count += 1
+            if state.count <= self.burst:
+                outputs.append(message)
+            else:
+                state.suppressed += 1
+                state.last = message
+        for text in outputs:
+            self._emit(text)
+
+    def flush_suppressed(self, final: bool = False):
+        """Emit summaries of windows that have ended, or of all windows if ``final``"""
+        if not self._bursts:
+            return
+        with self._lock:
+            outputs = self._expire(time.monotonic(), final)
+        for text in outputs:
+            self._emit(text)
 
     def flush(self):
         if hasattr(self.original_handler, 'flush'):
@@ -189,6 +292,9 @@ class ProgressState:
     finished: bool = False
     failed: bool = False
     paused: bool = False
+    # Last sample of the rate (``time.monotonic()``, ``current``)
+    _rate_time: float = field(default_factory=time.monotonic)
+    _rate_current: int = 0
 
 
 class ProgressManager:
@@ -199,7 +305,7 @@ class ProgressManager:
 
     def __init__(self, max_workers: int = 5, file: Optional[TextIO] = None,
                  use_colors: bool = True, use_emojis: bool = True,
-                 update_interval: float = 0.1):
+                 update_interval: float = 0.1, max_render_cpu: float = 0.05):
         """
         Initialize the progress manager.
         
@@ -207,6 +313,9 @@ class ProgressManager:
         :param file: Output stream (defaults to sys.stdout)
         :param use_colors: Enable color output
         :param use_emojis: Enable emoji indicators
+        :param update_interval: Minimum seconds between display updates
+        :param max_render_cpu: Maximum fraction of time spent on rendering, \
+            the update interval is extended if rendering is slow
         """
         self.max_workers = max_workers
         self.file = file or sys.stdout
@@ -228,9 +337,15 @@ class ProgressManager:
         # Update interval (seconds). When downloads change, refresh at most
         # once per `update_interval`. Default is 1.0s to avoid excessive redraws.
         self._update_interval = float(update_interval)
+        self._max_render_cpu = max_render_cpu
+        self._render_interval = self._update_interval
 
         # Display deduplication
         self._last_display_content = ""
+        self._last_lines: List[str] = []
+
+        # Log lines waiting to be written by the render task
+        self._pending_logs: Deque[str] = deque()
 
     def set_job_totals(self, total: int, completed: int = 0, failed: int = 0, existed: int = 0):
         """Set the total number of jobs for overall progress tracking"""
@@ -262,8 +377,18 @@ class ProgressManager:
         # Don't create progress state here - let ManagedTqdm do it with proper unique ID
         return ManagedTqdm(desc=desc, total=total, unit=unit, unit_scale=unit_scale, manager=self)
 
+    @property
+    def render_interval(self) -> float:
+        """Seconds until the next display update, extended when rendering is slow"""
+        return self._render_interval
+
     def update_progress(self, progress_id: str, current: int, desc: str = None, failed: bool = False):
-        """Update progress for a specific progress bar"""
+        """
+        Update progress for a specific progress bar
+
+        Rates are sampled on display updates, so frequent byte counts can be set to \
+        ``ProgressState.current`` directly without the lock (see ``ManagedTqdm.update``).
+        """
         with self._lock:
             if progress_id in self._progress_bars:
                 state = self._progress_bars[progress_id]
@@ -273,15 +398,25 @@ class ProgressManager:
                     state.desc = desc
                 state.last_update = time.time()
 
-                # Calculate rate
-                if hasattr(state, '_last_current') and hasattr(state, '_last_time'):
-                    time_diff = state.last_update - state._last_time
-                    if time_diff > 0:
-                        current_diff = current - state._last_current
-                        state.rate = current_diff / time_diff
-
-                state._last_current = current
-                state._last_time = state.last_update
+    def _sample_rates(self):
+        """Update EWMA rates of active progress bars from their byte counters"""
+        now = time.monotonic()
+        wall_now = time.time()
+        for state in self._progress_bars.values():
+            if state.finished:
+                continue
+            elapsed = now - state._rate_time
+            if elapsed <= 0:
+                continue
+            current = state.current
+            delta = current - state._rate_current
+            if delta:
+                state.last_update = wall_now
+            instant = delta / elapsed
+            alpha = 1 - math.exp(-elapsed / _RATE_TIME_CONSTANT)
+            state.rate = instant if state.rate is None else state.rate + alpha * (instant - state.rate)
+            state._rate_time = now
+            state._rate_current = current
 
     def finish_progress(self, progress_id: str, failed: bool = False):
         """Mark a progress bar as finished"""
@@ -323,10 +458,13 @@ class ProgressManager:
 
     def stop_display(self):
         """Stop the progress display loop"""
+        # Summarize all suppressed messages, they are written with pending logs if the display is running
+        flush_suppressed_logs(final=True)
         if self._running:
             self._running = False
             # Clear display area and show cursor
             self._clear_display()
+            self._write_pending_logs()
             self.file.write('\033[?25h\n')
             self.file.flush()
             # Remove from logger integration
@@ -345,12 +483,32 @@ class ProgressManager:
             self.file.flush()
             self._lines_written = 0
 
+    def enqueue_log(self, text: str):
+        """
+        Queue a log line to be written by the next display update, it's thread-safe and never blocks
+
+        :param text: Formatted log message, including the trailing newline
+        """
+        self._pending_logs.append(text)
+
+    def _write_pending_logs(self) -> bool:
+        """Write queued log lines, the display should be cleared before"""
+        if not self._pending_logs:
+            return False
+        chunks = []
+        while self._pending_logs:
+            chunks.append(self._pending_logs.popleft())
+        self.file.write("".join(x if x.endswith("\n") else x + "\n" for x in chunks))
+        self.file.flush()
+        return True
+
     def temporary_clear_for_log(self, log_message: str = None):
         """Temporarily clear display to allow log output"""
         if self._running and self.file.isatty():
             self._clear_display()
             # Reset last display content so we redraw after logging
             self._last_display_content = ""
+            self._last_lines = []
             if log_message:
                 self.file.write(log_message + '\n')
                 self.file.flush()
@@ -680,17 +838,33 @@ class ProgressManager:
         return f"{desc:30} |{bar}| {current_str}/{total_str} {percentage} {rate_str}"
 
     def update_display(self):
-        """Update the terminal display"""
+        """
+        Update the terminal display
+
+        Only changed lines are rewritten, and the update interval is extended \
+        if rendering takes more than ``max_render_cpu`` of the time.
+        """
         if not self._running or not self.file.isatty():
             return
 
+        flush_suppressed_logs()
         current_time = time.time()
-        if current_time - self._last_display_time < self._update_interval:
+        if not self._pending_logs and current_time - self._last_display_time < self._render_interval:
             return
 
         self._last_display_time = current_time
+        started = time.perf_counter()
 
         with self._lock:
+            # Write queued log lines above the display
+            if self._pending_logs:
+                self._clear_display()
+                self._write_pending_logs()
+                self._last_display_content = ""
+                self._last_lines = []
+
+            self._sample_rates()
+
             # Render new display
             lines = []
 
@@ -704,25 +878,33 @@ class ProgressManager:
             progress_lines = self._render_progress_bars()
             lines.extend(progress_lines)
 
-            # Write to terminal only if we have content and it's different from last display
-            if lines:
-                # Remove trailing empty lines
-                while lines and lines[-1] == "":
-                    lines.pop()
+            # Remove trailing empty lines
+            while lines and lines[-1] == "":
+                lines.pop()
 
-                if lines:  # Check again after removing empty lines
-                    display_content = '\n'.join(lines)
-
-                    # Only update if content has changed
-                    if display_content != self._last_display_content:
-                        # Clear previous display
-                        self._clear_display()
-
-                        output = display_content + '\n'
-                        self.file.write(output)
-                        self.file.flush()
-                        self._lines_written = len(lines)
-                        self._last_display_content = display_content
+            # Write to terminal only if we have content and it's different from last display
+            if lines and lines != self._last_lines:
+                self._redraw(lines)
+
+        elapsed = time.perf_counter() - started
+        self._render_interval = max(self._update_interval, elapsed / self._max_render_cpu)
+
+    def _redraw(self, lines: List[str]):
+        """Write display lines, rewrite only changed lines if the line count is unchanged"""
+        if self._lines_written and self._lines_written == len(self._last_lines) == len(lines):
+            output = [f'\033[{self._lines_written}A']
+            for line, last_line in zip(lines, self._last_lines):
+                # Move down over unchanged lines
+                output.append(f'\r\033[2K{line}\n' if line != last_line else '\n')
+            self.file.write("".join(output))
+        else:
+            # Clear previous display
+            self._clear_display()
+            self.file.write('\n'.join(lines) + '\n')
+        self.file.flush()
+        self._lines_written = len(lines)
+        self._last_lines = lines
+        self._last_display_content = '\n'.join(lines)
 
 
 class ManagedTqdm:
@@ -753,11 +935,12 @@ class ManagedTqdm:
 
             # Create progress bar in manager
             self.progress_id = f"{desc}_{id(self)}"
+            self._state = ProgressState(
+                desc=self._desc, total=total, current=initial,
+                unit=unit, unit_scale=unit_scale, _rate_current=initial
+            )
             with self.manager._lock:
-                self.manager._progress_bars[self.progress_id] = ProgressState(
-                    desc=self._desc, total=total, current=initial,
-                    unit=unit, unit_scale=unit_scale
-                )
+                self.manager._progress_bars[self.progress_id] = self._state
                 if self.progress_id not in self.manager._display_order:
                     self.manager._display_order.append(self.progress_id)
 
@@ -766,9 +949,9 @@ class ManagedTqdm:
         if self._fallback:
             return self._fallback.update(n)
 
+        # Lock-free, rates are sampled and the display is updated by the render task
         self._current += n
-        self.manager.update_progress(self.progress_id, self._current, self._desc)
-        self.manager.update_display()
+        self._state.current = self._current
         return None
 
     def set_description(self, desc: str):
@@ -3,8 +3,9 @@ import html
 import logging
 import re
 import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Generic, TypeVar, Optional, List, Tuple, Set
+from typing import Generic, TypeVar, Optional, List, Tuple, Set, Pattern
 
 import aiofiles
 from loguru import logger
@@ -14,6 +15,7 @@ from tqdm import tqdm
 from ktoolbox._enum import RetCodeEnum, DataStorageNameEnum
 from ktoolbox.configuration import config
 from ktoolbox.model import SearchResult
+from ktoolbox.progress import ProgressAwareHandler
 
 __all__ = [
     "BaseRet",
@@ -22,7 +24,10 @@ __all__ = [
     "dump_search",
     "parse_webpage_url",
     "uvloop_init",
+    "compile_external_link_patterns",
     "extract_external_links",
+    "clean_external_link",
+    "sha256_from_filename",
     "check_for_updates"
 ]
 
@@ -69,7 +74,11 @@ def logger_init(cli_use: bool = False, disable_stdout: bool = False):
     elif cli_use:
         logger.remove()
         logger.add(
-            tqdm.write,
+            ProgressAwareHandler(
+                tqdm,
+                burst=config.logger.console_burst,
+                window=config.logger.console_burst_window
+            ),
             colorize=True,
             format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
                    "<level>{level: <8}</level> | "
@@ -160,6 +169,32 @@ def uvloop_init() -> bool:
     return False
 
 
+_EXTERNAL_LINK_CLEANUP_PATTERNS = (
+    # Stop at common HTML boundary characters and quotes
+    re.compile(r'["\'>][^<]*$'),  # Remove quote + content to end
+    # Remove HTML tags that might have been captured
+    re.compile(r'<[^>]*>.*$'),  # Remove any HTML tags and everything after
+    re.compile(r'"[^"]*$'),  # Remove quote and everything after it
+    # Remove trailing HTML tag fragments and punctuation
+    re.compile(r'</[^>]*>?$'),  # Remove closing tags or partial tags at end
+    re.compile(r'[.,;!?)\]}>"\'\s]+$'),  # Remove trailing punctuation
+)
+"""Cleanup patterns applied in order to each matched external link"""
+
+
+@lru_cache(maxsize=8)
+def compile_external_link_patterns(patterns: Tuple[str, ...]) -> Optional[Pattern[str]]:
+    """
+    Combine and compile external link patterns into one regex, cached for the same patterns
+
+    :param patterns: Regex patterns of external links
+    :return: Compiled regex, ``None`` if no pattern given
+    """
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'({pattern})' for pattern in patterns), re.IGNORECASE)
+
+
 def extract_external_links(content: str, custom_patterns: Optional[List[str]] = None) -> Set[str]:
     """
     Extract external file sharing links from text content.
@@ -179,40 +214,55 @@ def extract_external_links(content: str, custom_patterns: Optional[List[str]] =
     if not content:
         return set()
 
-    external_link_patterns = custom_patterns if custom_patterns is not None else []
+    combined_pattern = compile_external_link_patterns(tuple(custom_patterns or ()))
+    if combined_pattern is None:
+        return set()
 
     links = set()
+    for match in combined_pattern.finditer(content):
+        if url := clean_external_link(match.group(0)):
+            links.add(url)
 
-    # Combine all patterns
-    combined_pattern = '|'.join(f'({pattern})' for pattern in external_link_patterns)
+    return links
 
-    # Find all matches
-    matches = re.finditer(combined_pattern, content, re.IGNORECASE)
 
-    for match in matches:
-        # Get the full matched URL
-        url = match.group(0)
+def clean_external_link(url: str, *, unescape: bool = True) -> Optional[str]:
+    """
+    Clean up an external link matched by ``compile_external_link_patterns``
 
-        # Clean up HTML markup and common trailing punctuation that might be part of text
-        # Stop at common HTML boundary characters and quotes
-        url = re.sub(r'["\'>][^<]*$', '', url)  # Remove quote + content to end
+    :param url: Matched URL
+    :param unescape: Decode HTML entities, set to ``False`` if the text has already been decoded
+    :return: Cleaned URL, ``None`` if it doesn't look like a proper URL
+    """
+    # Clean up HTML markup and common trailing punctuation that might be part of text
+    for cleanup_pattern in _EXTERNAL_LINK_CLEANUP_PATTERNS:
+        url = cleanup_pattern.sub('', url)
 
-        # Additional cleanup: Remove HTML tags that might have been captured
-        url = re.sub(r'<[^>]*>.*$', '', url)  # Remove any HTML tags and everything after
-        url = re.sub(r'"[^"]*$', '', url)  # Remove quote and everything after it
+    # Decode HTML entities (like &amp; -> &, &lt; -> <, etc.)
+    if unescape:
+        url = html.unescape(url)
 
-        # Remove trailing HTML tag fragments and punctuation
-        url = re.sub(r'</[^>]*>?$', '', url)  # Remove closing tags or partial tags at end
-        url = re.sub(r'[.,;!?)\]}>"\'\s]+$', '', url)  # Remove trailing punctuation
+    # Validate that it looks like a proper URL
+    return url if len(url) > 10 and '.' in url else None
 
-        # Decode HTML entities (like &amp; -> &, &lt; -> <, etc.)
-        url = html.unescape(url)
 
-        # Validate that it looks like a proper URL
-        if len(url) > 10 and '.' in url:
-            links.add(url)
+_SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
 
-    return links
+
+def sha256_from_filename(filename: str) -> Optional[str]:
+    """
+    Get SHA-256 hash from a content-addressed filename (e.g. Kemono server path filename)
+
+    - Example:
+    ```
+    sha256_from_filename("0a1b...9f.png")
+    ```
+
+    :param filename: Filename, the part before the first ``.`` is checked
+    :return: Lowercase hex digest, ``None`` if the filename is not a SHA-256 hash
+    """
+    stem = filename.split(".", 1)[0].lower()
+    return stem if _SHA256_PATTERN.fullmatch(stem) else None
 
 
 async def check_for_updates() -> None:
@@ -0,0 +1,50 @@
+import sys
+
+from ktoolbox.bench import Scenario, SCENARIOS, run_scenario, run_benchmark, compare_with_baseline
+from ktoolbox.configuration import config
+
+
+def test_run_scenario():
+    original_downloader = config.downloader
+    scenario = Scenario("test", "Test", posts=4, attachments=1, file_size=4096, existing=0.5)
+    result = run_scenario(scenario)
+    assert config.downloader is original_downloader
+    assert result.scenario == "test"
+    assert result.files == 4
+    assert result.failed == 0
+    assert 4 * 2048 <= result.bytes <= 4 * 4096
+    assert result.api_calls >= 2
+    assert result.files_per_second > 0
+    assert result.cpu_seconds > 0
+
+
+def test_run_benchmark():
+    report = run_benchmark([Scenario("test", "Test", posts=2, attachments=1, file_size=4096)])
+    result = report["results"]["test"]
+    assert result["files"] == 4
+    assert (result["peak_rss_mb"] is None) == (sys.platform == "win32")
+
+
+def test_scaled():
+    assert SCENARIOS["tiny-images"].scaled(0.1).posts == 25
+    assert SCENARIOS["huge-videos"].scaled(0.1).posts == 1
+    assert SCENARIOS["tiny-images"].posts == 250
+
+
+def test_compare_with_baseline():
+    baseline = {
+        "results": {
+            "a": {"files_per_second": 100.0, "cpu_seconds": 1.0, "peak_rss_mb": None},
+            "b": {"files_per_second": 100.0}
+        }
+    }
+    report = {
+        "results": {
+            "a": {"files_per_second": 95.0, "cpu_seconds": 1.5, "peak_rss_mb": 50.0},
+            "c": {"files_per_second": 1.0}
+        }
+    }
+    regressions = compare_with_baseline(report, baseline, 0.1)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("a: cpu_seconds")
+    assert len(compare_with_baseline(report, baseline, 0.01)) == 2
@@ -0,0 +1,105 @@
+import hashlib
+from pathlib import Path
+
+import httpx
+import pytest
+
+from ktoolbox.action import create_job_from_creator, fetch_creator_posts
+from ktoolbox.api.posts import get_creators, get_post
+from ktoolbox.bench import generate_dataset, StandInServer
+from ktoolbox.configuration import config, DownloaderConfiguration
+from ktoolbox.job.runner import JobRunner
+
+
+def test_dataset():
+    dataset = generate_dataset(creators=2, posts=3, attachments=2, file_size=1000, seed=1)
+    assert len(dataset.creators) == 2
+    assert len(dataset.files) == 2 * 3 * 3
+    assert [x.id for x in dataset.posts[("fanbox", "10000")]] == ["3", "2", "1"]
+    assert generate_dataset(creators=2, posts=3, attachments=2, file_size=1000, seed=1).files.keys() == \
+           dataset.files.keys()
+    for file in dataset.files.values():
+        content = file.read()
+        assert len(content) == file.size
+        assert hashlib.sha256(content).hexdigest() == Path(file.server_path).stem
+        assert file.read(300, 700) == content[300:700]
+        assert b"".join(file.iter_chunks(10, None, 100)) == content[10:]
+
+
+@pytest.mark.asyncio
+async def test_api():
+    dataset = generate_dataset(posts=60, attachments=0, file_size=100, content=True)
+    with StandInServer(dataset) as server, server.patch_config():
+        creators = await get_creators()
+        assert [x.id for x in creators.data] == ["10000"]
+        pages = [x async for x in fetch_creator_posts("fanbox", "10000")]
+        assert [len(x) for x in pages] == [50, 10]
+        assert pages[0][0].content is None
+        post = await get_post("fanbox", "10000", "1")
+        assert post.data.post.content.startswith("<p>Post 0")
+    assert server.stats().api_requests == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("subdomains", [None, 3])
+async def test_download(tmp_path, subdomains):
+    dataset = generate_dataset(posts=5, attachments=2, file_size=20000)
+    original_downloader = config.downloader
+    config.downloader = DownloaderConfiguration(tps_limit=1000, keep_metadata=False)
+    try:
+        with StandInServer(dataset, subdomains=subdomains) as server, server.patch_config():
+            ret = await create_job_from_creator(
+                "fanbox", "10000", tmp_path, all_pages=True, start_time=None, end_time=None
+            )
+            assert await JobRunner(job_list=ret.data, progress=False).start() == 0
+    finally:
+        config.downloader = original_downloader
+    files = [x for x in tmp_path.rglob("*") if x.is_file() and x.suffix != ".json"]
+    assert len(files) == len(dataset.files)
+    assert {hashlib.sha256(x.read_bytes()).hexdigest() for x in files} == \
+           {Path(x).stem for x in dataset.files}
+    stats = server.stats()
+    assert stats.bytes_sent == dataset.total_size
+    assert stats.file_requests == len(dataset.files) * (2 if subdomains else 1)
+
+
+@pytest.mark.asyncio
+async def test_create_job_with_content_images(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "job", config.job.model_copy(update={"extract_content_images": True}))
+    dataset = generate_dataset(posts=3, attachments=0, file_size=100, content=True)
+    with StandInServer(dataset) as server, server.patch_config():
+        ret = await create_job_from_creator(
+            "fanbox", "10000", tmp_path, all_pages=True, start_time=None, end_time=None
+        )
+    # Contents are fetched once for each post, not again when creating jobs
+    assert server.stats().api_requests == 1 + 3
+    image_jobs = [x for x in ret.data if x.path.name == config.job.post_structure.attachments.name]
+    assert {x.server_path for x in image_jobs} == {x.server_path for x in dataset.files.values()}
+
+
+@pytest.mark.asyncio
+async def test_file_server_behaviors():
+    dataset = generate_dataset(posts=1, attachments=0, file_size=1000)
+    file = next(iter(dataset.files.values()))
+    async with httpx.AsyncClient() as client:
+        with StandInServer(dataset) as server:
+            res = await client.get(f"{server.url}{file.server_path}", headers={"Range": "bytes=100-"})
+            assert res.status_code == 206
+            assert res.headers["Content-Range"] == f"bytes 100-{file.size - 1}/{file.size}"
+            assert res.content == file.read(100)
+            res = await client.get(f"{server.url}{file.server_path}", headers={"Range": f"bytes={file.size}-"})
+            assert res.status_code == 416
+        with StandInServer(dataset, range_support=False) as server:
+            res = await client.get(f"{server.url}{file.server_path}", headers={"Range": "bytes=100-"})
+            assert res.status_code == 200
+            assert res.content == file.read()
+        with StandInServer(dataset, error_rate=1, error_statuses=[429]) as server:
+            assert (await client.get(f"{server.url}{file.server_path}")).status_code == 429
+            assert server.stats().errors == 1
+        with StandInServer(dataset, subdomains=2) as server:
+            node = server._node_of(file)
+            wrong = f"{server.url}/https://n{3 - node}.kemono.invalid{file.server_path}"
+            assert (await client.get(wrong)).status_code == 403
+            res = await client.get(f"{server.url}/https://kemono.invalid{file.server_path}", follow_redirects=True)
+            assert res.content == file.read()
+            assert str(res.url).endswith(f"/https://n{node}.kemono.invalid{file.server_path}")
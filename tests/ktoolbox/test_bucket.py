@@ -0,0 +1,129 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from ktoolbox.configuration import config, DownloaderConfiguration
+from ktoolbox.downloader import duplicate_file_check, get_bucket_store
+from ktoolbox.downloader.bucket import BucketStore, INDEX_FILENAME
+
+CONTENT = b"KToolBox bucket test"
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+def new_blob(store: BucketStore, tmp_path: Path, dst: Path = None, content: bytes = CONTENT) -> Path:
+    downloaded = tmp_path / "downloaded.tmp"
+    downloaded.write_bytes(content)
+    blob = store.root / "data" / SHA256[:2] / SHA256[2:4] / f"{SHA256}.png"
+    store.put(downloaded, blob, dst)
+    return blob
+
+
+class TestBucketStore:
+
+    @pytest.fixture
+    def library(self, tmp_path):
+        path = tmp_path / "library"
+        path.mkdir()
+        return path
+
+    @pytest.mark.parametrize("strategy", ["hardlink", "copy", "auto"])
+    def test_put_and_checkout(self, tmp_path, library, strategy):
+        store = BucketStore(tmp_path / "bucket", strategy)
+        blob = new_blob(store, tmp_path, library / "a.png")
+        assert not (tmp_path / "downloaded.tmp").exists()
+        assert blob.read_bytes() == CONTENT
+        assert (library / "a.png").read_bytes() == CONTENT
+
+        used = store.checkout(blob, library / "b.png")
+        assert (library / "b.png").read_bytes() == CONTENT
+        if strategy != "auto":
+            assert used == strategy
+        assert sorted(Path(x).name for x, _ in store.index.get_refs(store.key_of(blob))) == ["a.png", "b.png"]
+
+    def test_checkout_existing(self, tmp_path, library):
+        store = BucketStore(tmp_path / "bucket", "copy")
+        blob = new_blob(store, tmp_path)
+        (library / "a.png").touch()
+        with pytest.raises(FileExistsError):
+            store.checkout(blob, library / "a.png")
+
+    def test_verify(self, tmp_path):
+        store = BucketStore(tmp_path / "bucket", "copy")
+        blob = new_blob(store, tmp_path)
+        assert store.index.get_state(store.key_of(blob)) == "unverified"
+        assert store.verify(blob) == "verified"
+        blob.write_bytes(b"broken")
+        result = store.verify_all()
+        assert (result.verified, result.corrupt) == (0, 1)
+        assert store.is_usable(blob) is False
+
+    def test_verify_without_hash(self, tmp_path):
+        store = BucketStore(tmp_path / "bucket", "copy")
+        blob = store.root / "data" / "image.png"
+        blob.parent.mkdir(parents=True)
+        blob.write_bytes(CONTENT)
+        assert store.verify_all().skipped == 1
+
+    @pytest.mark.parametrize("strategy", ["hardlink", "copy"])
+    def test_gc(self, tmp_path, library, strategy):
+        store = BucketStore(tmp_path / "bucket", strategy)
+        blob = new_blob(store, tmp_path, library / "a.png")
+
+        result = store.gc()
+        assert (result.scanned, result.removed) == (1, 0)
+
+        (library / "a.png").unlink()
+        result = store.gc(dry_run=True)
+        assert (result.removed, result.freed_bytes) == (1, len(CONTENT))
+        assert blob.exists()
+
+        result = store.gc()
+        assert (result.removed, result.dead_refs) == (1, 1)
+        assert not blob.exists()
+        assert not (store.root / "data").exists()
+        assert (store.root / INDEX_FILENAME).exists()
+
+    def test_gc_unindexed_hardlink(self, tmp_path, library):
+        """Blobs linked before the index existed are kept by link count"""
+        store = BucketStore(tmp_path / "bucket", "hardlink")
+        blob = store.root / "data" / "image.png"
+        blob.parent.mkdir(parents=True)
+        blob.write_bytes(CONTENT)
+        os.link(blob, library / "image.png")
+        assert store.gc().removed == 0
+        (library / "image.png").unlink()
+        assert store.gc().removed == 1
+
+
+class TestBucketDuplicateCheck:
+
+    @pytest.fixture(autouse=True)
+    def bucket_config(self, tmp_path):
+        original_downloader = config.downloader
+        config.downloader = DownloaderConfiguration(
+            use_bucket=True,
+            bucket_path=tmp_path / "bucket",
+            bucket_link_strategy="copy"
+        )
+        yield
+        config.downloader = original_downloader
+
+    def test_checkout_from_bucket(self, tmp_path):
+        store = get_bucket_store()
+        blob = new_blob(store, tmp_path)
+        local_file = tmp_path / "local.png"
+        existed, _ = duplicate_file_check(local_file, blob)
+        assert existed is True
+        assert local_file.read_bytes() == CONTENT
+        assert store.index.get_refs(store.key_of(blob))[0] == (str(local_file.absolute()), "copy")
+
+    def test_corrupt_blob_downloaded_again(self, tmp_path):
+        store = get_bucket_store()
+        blob = new_blob(store, tmp_path, content=b"broken")
+        store.verify(blob)
+        assert duplicate_file_check(tmp_path / "local.png", blob)[0] is False
+        # Replaced by the new download
+        new_blob(store, tmp_path, tmp_path / "local.png")
+        assert store.is_usable(blob) is True
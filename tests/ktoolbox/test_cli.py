@@ -377,3 +377,51 @@ async def test_sync_creator():
     assert mock_create_jobs.await_count == 3
     assert mock_job_runner.call_count == 3
     assert mock_job_runner.return_value.start.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_sync_creator_skips_unchanged_creator():
+    service = "fanbox"
+    creator_id = "24164271"
+    creator = _creator(creator_id, "Mock Creator", service)
+
+    async def sync_search_creator_side_effect(id: str = None, name: str = None, service: str = None):
+        return ActionRet(data=iter([creator]))
+
+    with patch(
+            "ktoolbox.cli.search_creator_action",
+            new_callable=AsyncMock,
+            side_effect=sync_search_creator_side_effect
+    ), \
+            patch("ktoolbox.cli.create_job_from_creator", new_callable=AsyncMock) as mock_create_jobs, \
+            patch("ktoolbox.cli.JobRunner") as mock_job_runner, \
+            tempfile.TemporaryDirectory() as td:
+        mock_create_jobs.return_value = ActionRet(data=[])
+        mock_job_runner.return_value.start = AsyncMock(return_value=1)
+        dir_path = Path(td)
+
+        # Not recorded if any job failed
+        await KToolBoxCli.sync_creator(service=service, creator_id=creator_id, path=dir_path)
+        assert not (dir_path / "Mock Creator" / DataStorageNameEnum.SyncStateData.value).exists()
+
+        mock_job_runner.return_value.start = AsyncMock(return_value=0)
+        await KToolBoxCli.sync_creator(service=service, creator_id=creator_id, path=dir_path)
+        assert (dir_path / "Mock Creator" / DataStorageNameEnum.SyncStateData.value).is_file()
+        assert mock_create_jobs.await_count == 2
+
+        # Skipped since not updated
+        await KToolBoxCli.sync_creator(service=service, creator_id=creator_id, path=dir_path)
+        assert mock_create_jobs.await_count == 2
+
+        # Different options
+        await KToolBoxCli.sync_creator(service=service, creator_id=creator_id, path=dir_path, keywords=("a",))
+        assert mock_create_jobs.await_count == 3
+
+        await KToolBoxCli.sync_creator(service=service, creator_id=creator_id, path=dir_path, force=True)
+        assert mock_create_jobs.await_count == 4
+
+        creator.updated = datetime(2025, 2, 1)
+        await KToolBoxCli.sync_creator(service=service, creator_id=creator_id, path=dir_path)
+        assert mock_create_jobs.await_count == 5
+        await KToolBoxCli.sync_creator(service=service, creator_id=creator_id, path=dir_path)
+        assert mock_create_jobs.await_count == 5
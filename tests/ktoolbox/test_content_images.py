@@ -4,7 +4,7 @@ Tests for content image parsing functionality
 import pytest
 
 from ktoolbox.action.job import create_job_from_post
-from ktoolbox.action.utils import extract_content_images
+from ktoolbox.action.utils import extract_content_images, extract_post_content, extract_post_contents
 from ktoolbox.api.model import Post, Attachment
 from ktoolbox.configuration import config, JobConfiguration
 
@@ -60,6 +60,43 @@ class TestContentImageParsing:
         assert "/another/file.jpg" in image_sources
         assert "/uppercase.gif" in image_sources
 
+    def test_extract_post_content_single_pass(self):
+        """Test extracting images, anchors and external links at once"""
+        html_content = (
+            '<p><img src="/e9/a1/test.png"></p>'
+            '<a href="https://mega.nz/file/abc#key">MEGA</a>'
+            '<A HREF="/local/page">Local</A>'
+            '<p>Mirror: https://mega.nz/file/def?a=1&amp;b=2.</p>'
+        )
+
+        extraction = extract_post_content(html_content, [r'https?://mega\.nz/[^\s]+'])
+
+        assert extraction.image_sources == ["/e9/a1/test.png"]
+        assert extraction.anchors == ["https://mega.nz/file/abc#key", "/local/page"]
+        assert extraction.external_links == {"https://mega.nz/file/abc#key", "https://mega.nz/file/def?a=1&b=2"}
+
+    def test_extract_post_content_links_only(self):
+        """Test skipping HTML parsing when only external links are needed"""
+        extraction = extract_post_content(
+            '<img src="/a.png"> https://mega.nz/file/abc',
+            [r'https?://mega\.nz/[^\s]+'],
+            parse_html=False
+        )
+
+        assert extraction.image_sources == []
+        assert extraction.external_links == {"https://mega.nz/file/abc"}
+
+    def test_extract_post_contents_bulk(self):
+        """Test bulk extraction keeps the order of contents"""
+        contents = [f'<img src="/{i}.png">' for i in range(8)] + ["", None]
+
+        inline = extract_post_contents(contents, max_workers=1)
+        pooled = extract_post_contents(contents, max_workers=2)
+
+        assert inline == pooled
+        assert [x.image_sources for x in pooled[:8]] == [[f"/{i}.png"] for i in range(8)]
+        assert pooled[8].image_sources == [] and pooled[9].image_sources == []
+
     @pytest.mark.asyncio
     async def test_create_job_from_post_with_content_images(self, tmp_path):
         """Test job creation from post with content images"""
@@ -0,0 +1,147 @@
+import hashlib
+
+import httpx
+import pytest
+from tqdm.asyncio import tqdm
+
+from ktoolbox._enum import RetCodeEnum
+from ktoolbox.configuration import config, DownloaderConfiguration
+from ktoolbox.downloader import Downloader, ContentSourceChain, PeerCacheSource, BandwidthLimiter
+
+CONTENT = b"peer content"
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+SERVER_PATH = f"/data/ab/cd/{SHA256}.bin"
+
+
+def peer(handler) -> PeerCacheSource:
+    source = PeerCacheSource("http://10.0.0.2:8000/", pause=60)
+    source._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return source
+
+
+def serve(content: bytes):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == SERVER_PATH:
+            return httpx.Response(200, content=content)
+        return httpx.Response(404)
+
+    return handler
+
+
+class TestContentSourceChain:
+
+    @pytest.mark.asyncio
+    async def test_hit(self, tmp_path):
+        source = peer(serve(CONTENT))
+        chain = ContentSourceChain([source])
+        assert await chain.fetch(SERVER_PATH, tmp_path / "file") is source
+        assert (tmp_path / "file").read_bytes() == CONTENT
+        assert chain.stats()["http://10.0.0.2:8000"].hits == 1
+
+    @pytest.mark.asyncio
+    async def test_miss_falls_through(self, tmp_path):
+        missing = peer(serve(CONTENT))
+        missing._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda _: httpx.Response(404)))
+        missing.name = "missing"
+        found = peer(serve(CONTENT))
+        chain = ContentSourceChain([missing, found])
+        assert await chain.fetch(SERVER_PATH, tmp_path / "file") is found
+        assert missing.stats.misses == 1
+
+    @pytest.mark.asyncio
+    async def test_verification_failure(self, tmp_path):
+        source = peer(serve(b"corrupted"))
+        chain = ContentSourceChain([source])
+        for _ in range(3):
+            assert await chain.fetch(SERVER_PATH, tmp_path / "file") is None
+        assert not (tmp_path / "file").exists()
+        assert source.stats.errors == 3
+        # Paused after consecutive errors
+        source._client = httpx.AsyncClient(transport=httpx.MockTransport(serve(CONTENT)))
+        assert await chain.fetch(SERVER_PATH, tmp_path / "file") is None
+
+    @pytest.mark.asyncio
+    async def test_failure_while_writing(self, tmp_path):
+        async def on_chunk(*_):
+            (tmp_path / "file").write_bytes(b"partial")
+            raise OSError("No space left on device")
+
+        chain = ContentSourceChain([peer(serve(CONTENT))])
+        with pytest.raises(OSError):
+            await chain.fetch(SERVER_PATH, tmp_path / "file", on_chunk)
+        assert not (tmp_path / "file").exists()
+
+    @pytest.mark.asyncio
+    async def test_unverifiable_path(self, tmp_path):
+        requested = []
+        chain = ContentSourceChain([peer(lambda x: requested.append(x) or httpx.Response(200))])
+        assert await chain.fetch("/data/ab/cd/file.bin", tmp_path / "file") is None
+        assert requested == []
+
+
+class TestDownloaderContentSource:
+
+    @pytest.mark.asyncio
+    async def test_download_from_peer(self, tmp_path):
+        original_downloader = config.downloader
+        config.downloader = DownloaderConfiguration(tps_limit=1000, keep_metadata=False)
+        origin_requests = []
+
+        def origin(request: httpx.Request) -> httpx.Response:
+            origin_requests.append(request)
+            return httpx.Response(200, content=CONTENT)
+
+        chain = ContentSourceChain([peer(serve(CONTENT))])
+        limiter = BandwidthLimiter(1024 * 1024)
+        try:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(origin)) as client:
+                downloader = Downloader(
+                    f"https://n1.kemono.cr{SERVER_PATH}",
+                    tmp_path,
+                    client,
+                    server_path=SERVER_PATH,
+                    designated_filename="file.bin",
+                    content_sources=chain,
+                    bandwidth_limiter=limiter
+                )
+                ret = await downloader.run()
+        finally:
+            config.downloader = original_downloader
+        assert ret.code == RetCodeEnum.Success
+        assert limiter.stats().bytes == len(CONTENT)
+        record = downloader.record
+        assert (record.source, record.host, record.hosts) == ("http://10.0.0.2:8000", "10.0.0.2", ["10.0.0.2"])
+        assert record.bytes == record.transfer_bytes == record.total == len(CONTENT)
+        assert record.ttfb is not None and record.transfer_time is not None
+        assert ret.data == "file.bin"
+        assert (tmp_path / "file.bin").read_bytes() == CONTENT
+        assert origin_requests == []
+        assert [x.name for x in tmp_path.iterdir()] == ["file.bin"]
+
+    @pytest.mark.asyncio
+    async def test_no_progress_bar_on_peer_miss(self, tmp_path):
+        original_downloader = config.downloader
+        config.downloader = DownloaderConfiguration(tps_limit=1000, keep_metadata=False)
+        bars = []
+
+        class RecordingTqdm(tqdm):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                bars.append(self)
+
+        chain = ContentSourceChain([peer(lambda _: httpx.Response(404))])
+        try:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(serve(CONTENT))) as client:
+                ret = await Downloader(
+                    f"https://n1.kemono.cr{SERVER_PATH}",
+                    tmp_path,
+                    client,
+                    server_path=SERVER_PATH,
+                    designated_filename="file.bin",
+                    content_sources=chain
+                ).run(tqdm_class=RecordingTqdm, progress=False)
+        finally:
+            config.downloader = original_downloader
+        assert ret.code == RetCodeEnum.Success
+        # Only the origin download shows a progress bar
+        assert len(bars) == 1
@@ -0,0 +1,119 @@
+from typing import List
+
+import httpx
+import pytest
+
+from ktoolbox._enum import RetCodeEnum
+from ktoolbox.configuration import config, DownloaderConfiguration
+from ktoolbox.downloader import Downloader, parse_content_range, validator_from_headers
+
+CONTENT = b"0123456789" * 10
+ETAG = '"v1"'
+URL = "https://n1.kemono.cr/data/ab/cd/file.bin"
+
+
+def make_client(requests: List[httpx.Request], *, honor_range: bool = True, etag: str = ETAG) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        headers = {"ETag": etag}
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if not honor_range or not range_header or (if_range and if_range != etag):
+            return httpx.Response(200, headers=headers, content=CONTENT)
+        start = int(range_header[6:-1])
+        if start >= len(CONTENT):
+            return httpx.Response(416, headers={"Content-Range": f"bytes */{len(CONTENT)}"})
+        headers["Content-Range"] = f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}"
+        return httpx.Response(206, headers=headers, content=CONTENT[start:])
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture(autouse=True)
+def downloader_config():
+    original_downloader = config.downloader
+    config.downloader = DownloaderConfiguration(tps_limit=1000, keep_metadata=False)
+    Downloader.range_support.clear()
+    yield
+    config.downloader = original_downloader
+    Downloader.range_support.clear()
+
+
+def temp_files(tmp_path):
+    temp = tmp_path / f"file.bin.{config.downloader.temp_suffix}"
+    return temp, tmp_path / f"{temp.name}.validator"
+
+
+class TestRangeHelpers:
+
+    def test_parse_content_range(self):
+        assert parse_content_range("bytes 100-199/1000") == (100, 199, 1000)
+        assert parse_content_range("bytes */1000") == (None, None, 1000)
+        assert parse_content_range("bytes 0-9/*") == (0, 9, None)
+        assert parse_content_range("items 0-9/10") is None
+        assert parse_content_range(None) is None
+
+    def test_validator_from_headers(self):
+        assert validator_from_headers({"ETag": '"abc"', "Last-Modified": "date"}) == '"abc"'
+        assert validator_from_headers({"ETag": 'W/"abc"', "Last-Modified": "date"}) == "date"
+        assert validator_from_headers({}) is None
+
+
+class TestDownloaderRange:
+
+    @pytest.mark.asyncio
+    async def test_resume_with_if_range(self, tmp_path):
+        temp, validator = temp_files(tmp_path)
+        temp.write_bytes(CONTENT[:30])
+        validator.write_text(ETAG)
+        requests = []
+        async with make_client(requests) as client:
+            ret = await Downloader(URL, tmp_path, client, server_path="/data/ab/cd/file.bin").run()
+        assert ret.code == RetCodeEnum.Success
+        assert requests[0].headers["Range"] == "bytes=30-"
+        assert requests[0].headers["If-Range"] == ETAG
+        assert (tmp_path / "file.bin").read_bytes() == CONTENT
+        assert not temp.exists() and not validator.exists()
+        assert Downloader.range_support["n1.kemono.cr"] is True
+
+    @pytest.mark.asyncio
+    async def test_object_changed(self, tmp_path):
+        temp, validator = temp_files(tmp_path)
+        temp.write_bytes(b"stale prefix")
+        validator.write_text('"v0"')
+        requests = []
+        async with make_client(requests) as client:
+            ret = await Downloader(URL, tmp_path, client, server_path="/data/ab/cd/file.bin").run()
+        assert ret.code == RetCodeEnum.Success
+        assert len(requests) == 1
+        assert (tmp_path / "file.bin").read_bytes() == CONTENT
+        # 200 caused by `If-Range` mismatch says nothing about range support
+        assert "n1.kemono.cr" not in Downloader.range_support
+
+    @pytest.mark.asyncio
+    async def test_range_ignored(self, tmp_path):
+        temp, _ = temp_files(tmp_path)
+        temp.write_bytes(b"partial")
+        requests = []
+        async with make_client(requests, honor_range=False) as client:
+            ret = await Downloader(URL, tmp_path, client, server_path="/data/ab/cd/file.bin").run()
+            assert ret.code == RetCodeEnum.Success
+            assert (tmp_path / "file.bin").read_bytes() == CONTENT
+            assert Downloader.range_support["n1.kemono.cr"] is False
+
+            # Range is no longer requested from the host
+            (tmp_path / "file.bin").unlink()
+            await Downloader(URL, tmp_path, client, server_path="/data/ab/cd/file.bin").run()
+        assert len(requests) == 2
+        assert "Range" not in requests[1].headers
+
+    @pytest.mark.asyncio
+    async def test_range_not_satisfiable_complete(self, tmp_path):
+        temp, _ = temp_files(tmp_path)
+        temp.write_bytes(CONTENT)
+        requests = []
+        async with make_client(requests) as client:
+            ret = await Downloader(URL, tmp_path, client, server_path="/data/ab/cd/file.bin").run()
+        assert ret.code == RetCodeEnum.Success
+        assert (tmp_path / "file.bin").read_bytes() == CONTENT
+        assert not temp.exists()
@@ -0,0 +1,80 @@
+import json
+from functools import partial
+
+import httpx
+import pytest
+
+from ktoolbox.configuration import config, DownloaderConfiguration, MonitorConfiguration
+from ktoolbox.job import Job
+from ktoolbox.job.runner import JobRunner
+from ktoolbox.monitor import EventStream, event_stream
+
+
+def read_events(path):
+    return [json.loads(x) for x in path.read_text(encoding="utf-8").splitlines()]
+
+
+class TestEventStream:
+
+    def test_write(self, tmp_path):
+        stream = EventStream()
+        stream.emit("ignored")
+        stream.open(str(tmp_path / "events.ndjson"))
+        stream.emit("job_started", path=tmp_path, size=1)
+        stream.close()
+        stream.emit("ignored")
+        events = read_events(tmp_path / "events.ndjson")
+        assert len(events) == 1
+        assert events[0]["event"] == "job_started"
+        assert events[0]["path"] == str(tmp_path)
+        assert events[0]["size"] == 1
+        assert isinstance(events[0]["ts"], float)
+
+    def test_invalid_target(self, tmp_path):
+        original_monitor = config.monitor
+        config.monitor = MonitorConfiguration(events=str(tmp_path / "missing" / "events.ndjson"))
+        stream = EventStream()
+        try:
+            assert stream.open_from_config() is False
+        finally:
+            config.monitor = original_monitor
+        assert stream.enabled is False
+
+
+@pytest.mark.asyncio
+async def test_job_runner_events(tmp_path, monkeypatch):
+    original_downloader, original_monitor = config.downloader, config.monitor
+    config.downloader = DownloaderConfiguration(tps_limit=1000, keep_metadata=False)
+    config.monitor = MonitorConfiguration(events=str(tmp_path / "events.ndjson"))
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=b"data")
+
+    monkeypatch.setattr(httpx, "AsyncClient", partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    jobs = [Job(path=tmp_path, alt_filename="a.png", server_path="/data/ab/cd/a.png")]
+    try:
+        await JobRunner(job_list=jobs, progress=False).start()
+    finally:
+        config.downloader, config.monitor = original_downloader, original_monitor
+    assert event_stream.enabled is False
+
+    events = read_events(tmp_path / "events.ndjson")
+    names = [x["event"] for x in events]
+    assert names[:2] == ["job_queued", "run_started"]
+    assert names.count("job_started") == names.count("download_started") == names.count("job_finished") == 1
+    assert names[-2:] == ["snapshot", "run_finished"]
+    finished = next(x for x in events if x["event"] == "job_finished")
+    assert finished["outcome"] == "Success"
+    assert finished["bytes"] == 4
+    download = next(x for x in events if x["event"] == "download_started")
+    assert download["host"] == "kemono.cr"
+    assert events[-2]["done"] == 1
+    assert events[-1]["bytes"] == 4
+
+
+@pytest.mark.asyncio
+async def test_job_runner_without_events_keeps_no_jobs(tmp_path):
+    assert not config.monitor.events
+    runner = JobRunner(job_list=[Job(path=tmp_path, server_path="/data/ab/cd/a.png")], progress=False)
+    await runner.add_jobs(Job(path=tmp_path, server_path="/data/ab/cd/b.png"))
+    assert runner._unannounced_jobs == []
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+from functools import partial
+
+import pytest
+from pydantic import ValidationError
+
+from ktoolbox.configuration import config, DownloaderConfiguration
+from ktoolbox.downloader.utils import async_duplicate_file_check, duplicate_file_check
+from ktoolbox.filesystem import FileSystemExecutor, DirectoryCache
+
+
+class TestFileSystemExecutor:
+
+    @pytest.mark.asyncio
+    async def test_run_on_worker_thread(self):
+        executor = FileSystemExecutor(max_workers=2)
+        thread_name = await executor.run("name", lambda: threading.current_thread().name)
+        assert thread_name.startswith("ktoolbox-fs")
+        assert executor.metrics()["name"].count == 1
+
+    @pytest.mark.asyncio
+    async def test_batch(self, tmp_path):
+        executor = FileSystemExecutor(max_workers=2)
+        target = tmp_path / "a" / "b"
+        file = tmp_path / "file.tmp"
+        file.write_bytes(b"data")
+        await executor.batch(
+            "finish",
+            partial(target.mkdir, parents=True),
+            partial(file.rename, target / "file")
+        )
+        assert (target / "file").read_bytes() == b"data"
+        assert executor.metrics()["finish"].count == 1
+
+    @pytest.mark.asyncio
+    async def test_errors_recorded(self, tmp_path):
+        executor = FileSystemExecutor(max_workers=1)
+        with pytest.raises(FileNotFoundError):
+            await executor.run("stat", (tmp_path / "missing").stat)
+        stats = executor.metrics()["stat"]
+        assert stats.count == 1 and stats.errors == 1
+
+    @pytest.mark.asyncio
+    async def test_bounded_pending(self):
+        executor = FileSystemExecutor(max_workers=1, max_pending=2)
+        running = 0
+        max_running = 0
+        lock = threading.Lock()
+
+        def work():
+            nonlocal running, max_running
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            threading.Event().wait(0.01)
+            with lock:
+                running -= 1
+
+        await asyncio.gather(*(executor.run("work", work) for _ in range(6)))
+        assert max_running == 1
+        assert executor.metrics()["work"].count == 6
+
+    def test_fs_workers_validation(self):
+        with pytest.raises(ValidationError):
+            DownloaderConfiguration(fs_workers=0)
+
+    @pytest.mark.asyncio
+    async def test_async_duplicate_file_check(self, tmp_path):
+        file = tmp_path / "existed.png"
+        assert await async_duplicate_file_check(file) == (False, None)
+        file.touch()
+        existed, _ = await async_duplicate_file_check(file)
+        assert existed is True
+
+
+class TestDirectoryCache:
+
+    def test_scan_once(self, tmp_path):
+        (tmp_path / "a.png").touch()
+        (tmp_path / "sub").mkdir()
+        cache = DirectoryCache()
+        assert cache.is_file(tmp_path / "a.png") is True
+        assert cache.is_file(tmp_path / "b.png") is False
+        assert cache.is_file(tmp_path / "sub") is False
+        assert cache.scans == 1
+
+    def test_snapshot_and_writes(self, tmp_path):
+        cache = DirectoryCache()
+        assert cache.is_file(tmp_path / "new.png") is False
+        (tmp_path / "new.png").touch()
+        # Not visible until recorded
+        assert cache.is_file(tmp_path / "new.png") is False
+        cache.add(tmp_path / "new.png")
+        assert cache.is_file(tmp_path / "new.png") is True
+        cache.discard(tmp_path / "new.png")
+        assert cache.is_file(tmp_path / "new.png") is False
+        cache.invalidate(tmp_path)
+        assert cache.is_file(tmp_path / "new.png") is True
+
+    def test_missing_directory(self, tmp_path):
+        cache = DirectoryCache()
+        assert cache.is_file(tmp_path / "missing" / "a.png") is False
+
+    def test_duplicate_file_check_with_cache(self, tmp_path):
+        (tmp_path / "a.png").touch()
+        cache = DirectoryCache()
+        assert duplicate_file_check(tmp_path / "a.png", cache=cache)[0] is True
+        assert duplicate_file_check(tmp_path / "b.png", cache=cache)[0] is False
+        assert cache.scans == 1
+
+    def test_trust_local_names(self, tmp_path):
+        local_file = tmp_path / "local.png"
+        local_file.touch()
+        bucket_file = tmp_path / "bucket" / "hash.png"
+        original_downloader = config.downloader
+        config.downloader = DownloaderConfiguration(use_bucket=True, bucket_path=tmp_path / "bucket")
+        try:
+            assert duplicate_file_check(local_file, bucket_file)[0] is False
+            config.downloader.trust_local_names = True
+            assert duplicate_file_check(local_file, bucket_file)[0] is True
+        finally:
+            config.downloader = original_downloader
@@ -0,0 +1,103 @@
+from fnmatch import fnmatch
+
+import pytest
+
+from ktoolbox.action.filter import GlobSet, FilenameFilter, KeywordMatcher
+from ktoolbox.action.utils import filter_posts_by_keywords, filter_posts_by_keywords_exclude
+from ktoolbox.api.model import Post
+from ktoolbox.configuration import config, JobConfiguration
+
+
+class TestGlobSet:
+    """Test compiled glob sets against ``fnmatch``"""
+
+    @pytest.mark.parametrize("patterns", [
+        ["*.png"],
+        ["*.png", "*.jpg", "cover.gif"],
+        ["*.tar.gz", "file?.txt", "[ab]*.zip"],
+        ["*"],
+        ["exact.psd", "*_preview.*"],
+    ])
+    @pytest.mark.parametrize("name", [
+        "image.png", "photo.jpg", "cover.gif", "archive.tar.gz", "file1.txt", "file12.txt",
+        "a_project.zip", "c_project.zip", "exact.psd", "img_preview.webp", "README"
+    ])
+    def test_same_as_fnmatch(self, patterns, name):
+        expected = any(fnmatch(name, x) for x in patterns)
+        assert GlobSet(patterns).match(name) is expected
+
+    def test_empty(self):
+        glob_set = GlobSet()
+        assert not glob_set
+        assert glob_set.match("image.png") is False
+
+
+class TestFilenameFilter:
+    """Test allow/block list predicate"""
+
+    def test_no_lists(self):
+        assert FilenameFilter()("anything.psd") is True
+
+    def test_allow_and_block(self):
+        file_filter = FilenameFilter(allow_list={"*.png", "*.jpg"}, block_list={"*_thumb.*"})
+        assert file_filter("image.png") is True
+        assert file_filter("image.psd") is False
+        assert file_filter("image_thumb.png") is False
+
+    def test_from_config_cached(self):
+        original_job = config.job
+        config.job = JobConfiguration(block_list={"*.zip"})
+        try:
+            file_filter = FilenameFilter.from_config()
+            assert file_filter is FilenameFilter.from_config()
+            assert file_filter("a.zip") is False
+            assert file_filter("a.png") is True
+        finally:
+            config.job = original_job
+
+
+class TestKeywordMatcher:
+    """Test compiled keyword matching"""
+
+    def test_substring(self):
+        matcher = KeywordMatcher({"Art", "artwork", "PROGRAM"})
+        assert matcher("Amazing Artwork") is True
+        assert matcher("Programming Tutorial") is True
+        assert matcher("Music Review") is False
+        assert matcher(None) is False
+
+    def test_shared_prefixes(self):
+        matcher = KeywordMatcher({"ab", "abc", "abd", "b"})
+        assert matcher("xxabdxx") is True
+        assert matcher("xxaxx") is False
+        assert matcher("b") is True
+
+    def test_empty(self):
+        matcher = KeywordMatcher()
+        assert not matcher
+        assert matcher("anything") is True
+
+    def test_empty_keyword_matches_all(self):
+        assert KeywordMatcher({""})(None) is True
+
+    def test_word(self):
+        matcher = KeywordMatcher({"art", "c++"}, mode="word")
+        assert matcher("New Art Pack") is True
+        assert matcher("Artwork") is False
+        assert matcher("Learning C++ today") is True
+
+    def test_regex(self):
+        matcher = KeywordMatcher({r"part\s*\d+", r"^wip"}, mode="regex")
+        assert matcher("Comic Part 3") is True
+        assert matcher("WIP sketch") is True
+        assert matcher("Final sketch WIP") is False
+
+    def test_filter_posts_with_match_mode(self):
+        posts = [Post(id="1", title="Art Pack"), Post(id="2", title="Artwork"), Post(id="3", title="Music")]
+        original_job = config.job
+        config.job = JobConfiguration(keywords_match_mode="word")
+        try:
+            assert [x.id for x in filter_posts_by_keywords(posts, {"art"})] == ["1"]
+            assert [x.id for x in filter_posts_by_keywords_exclude(posts, {"art"})] == ["2", "3"]
+        finally:
+            config.job = original_job
@@ -0,0 +1,139 @@
+import asyncio
+import os
+from collections import Counter
+from functools import partial
+
+import httpx
+import pytest
+
+from ktoolbox._enum import RetCodeEnum
+from ktoolbox.configuration import config, DownloaderConfiguration
+from ktoolbox.downloader import Downloader
+from ktoolbox.job import Job
+from ktoolbox.job.runner import JobRunner
+
+
+@pytest.fixture
+def downloader_config():
+    original_downloader = config.downloader
+    config.downloader = DownloaderConfiguration(tps_limit=1000, keep_metadata=False)
+    yield config.downloader
+    config.downloader = original_downloader
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_same_server_path_share_download(tmp_path, monkeypatch, downloader_config):
+    requested = Counter()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested[request.url.path] += 1
+        return httpx.Response(200, content=request.url.path.encode())
+
+    monkeypatch.setattr(httpx, "AsyncClient", partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    jobs = [
+        Job(path=tmp_path / "post", alt_filename="1.png", server_path="/data/ab/cd/shared.png"),
+        Job(path=tmp_path / "post" / "revision", alt_filename="1.png", server_path="/data/ab/cd/shared.png"),
+        Job(path=tmp_path / "post", alt_filename="cover.png", server_path="/data/ab/cd/shared.png?f=cover.png"),
+        Job(path=tmp_path / "post", alt_filename="2.png", server_path="/data/ab/cd/other.png")
+    ]
+    for job in jobs:
+        job.path.mkdir(parents=True, exist_ok=True)
+
+    failed = await JobRunner(job_list=jobs, progress=False).start()
+    assert failed == 0
+    assert requested == {"/data/ab/cd/shared.png": 1, "/data/ab/cd/other.png": 1}
+    shared_files = [tmp_path / "post" / "1.png", tmp_path / "post" / "revision" / "1.png", tmp_path / "post" / "cover.png"]
+    assert all(x.read_bytes() == b"/data/ab/cd/shared.png" for x in shared_files)
+    assert len({os.stat(x).st_ino for x in shared_files}) == 1
+
+
+@pytest.mark.asyncio
+async def test_existing_file_is_shared(tmp_path, monkeypatch, downloader_config):
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        return httpx.Response(200, content=b"data")
+
+    monkeypatch.setattr(httpx, "AsyncClient", partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "1.png").write_bytes(b"existing")
+    jobs = [
+        Job(path=tmp_path / "a", alt_filename="1.png", server_path="/data/ab/cd/shared.png"),
+        Job(path=tmp_path / "b", alt_filename="1.png", server_path="/data/ab/cd/shared.png")
+    ]
+
+    runner = JobRunner(job_list=jobs, progress=False)
+    assert await runner.start() == 0
+    assert requested == []
+    assert runner.existed_count == 1
+    assert (tmp_path / "b" / "1.png").read_bytes() == b"existing"
+
+
+@pytest.mark.asyncio
+async def test_waiting_jobs_do_not_take_up_workers(tmp_path, monkeypatch, downloader_config):
+    monkeypatch.setattr(config, "job", config.job.model_copy(update={"count": 2}))
+    other_requested = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        # The shared download only finishes after the other job started, which needs the second worker
+        if request.url.path == "/data/ab/cd/shared.png":
+            await asyncio.wait_for(other_requested.wait(), 5)
+        else:
+            other_requested.set()
+        return httpx.Response(200, content=request.url.path.encode())
+
+    monkeypatch.setattr(httpx, "AsyncClient", partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    jobs = [
+        Job(path=tmp_path / "a", alt_filename="1.png", server_path="/data/ab/cd/shared.png"),
+        Job(path=tmp_path / "b", alt_filename="1.png", server_path="/data/ab/cd/shared.png"),
+        Job(path=tmp_path / "a", alt_filename="2.png", server_path="/data/ab/cd/other.png")
+    ]
+    for job in jobs:
+        job.path.mkdir(parents=True, exist_ok=True)
+
+    runner = JobRunner(job_list=jobs, progress=False)
+    assert await runner.start() == 0
+    assert runner.done_size == 3
+    assert (tmp_path / "b" / "1.png").read_bytes() == b"/data/ab/cd/shared.png"
+
+
+@pytest.mark.asyncio
+async def test_queued_again_if_nothing_shared(tmp_path, monkeypatch, downloader_config):
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        return httpx.Response(200, content=b"data")
+
+    monkeypatch.setattr(httpx, "AsyncClient", partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    # Skipped by size filtering, so there is no file to share
+    monkeypatch.setattr(config, "job", config.job.model_copy(update={"max_file_size": 1}))
+    jobs = [
+        Job(path=tmp_path / "a", alt_filename="1.png", server_path="/data/ab/cd/shared.png"),
+        Job(path=tmp_path / "b", alt_filename="1.png", server_path="/data/ab/cd/shared.png")
+    ]
+
+    runner = JobRunner(job_list=jobs, progress=False)
+    assert await runner.start() == 0
+    assert requested == ["/data/ab/cd/shared.png"] * 2
+    assert runner.existed_count == 2
+    assert runner.done_size == 2
+
+
+@pytest.mark.asyncio
+async def test_nothing_to_share_if_first_failed(tmp_path, downloader_config):
+    runner = JobRunner(progress=False)
+    failed_download = asyncio.get_running_loop().create_future()
+    runner._shared_downloads["/data/ab/cd/shared.png"] = failed_download
+    failed_download.set_result(None)
+    async with httpx.AsyncClient() as client:
+        downloader = Downloader(
+            "https://n1.kemono.cr/data/ab/cd/shared.png",
+            tmp_path,
+            client,
+            designated_filename="b.png",
+            server_path="/data/ab/cd/shared.png"
+        )
+        assert await runner._run_shared(downloader, "/data/ab/cd/shared.png", failed_download) is None
+    assert list(tmp_path.iterdir()) == []
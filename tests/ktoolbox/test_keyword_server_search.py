@@ -0,0 +1,87 @@
+from datetime import datetime
+from unittest.mock import patch, AsyncMock
+
+import pytest
+
+from ktoolbox.action import create_job_from_creator, can_search_keywords_on_server
+from ktoolbox.api import APIRet
+from ktoolbox.api.model import Post
+from ktoolbox.configuration import config, JobConfiguration
+
+POSTS = {
+    "1": Post(id="1", title="Comic Part 1", published=datetime(2024, 1, 1), attachments=[]),
+    "2": Post(id="2", title="Comic Part 2", published=datetime(2024, 2, 1), attachments=[]),
+    "3": Post(id="3", title="Sketch dump", published=datetime(2024, 3, 1), attachments=[]),
+    "4": Post(id="4", title="Weekly sketch", published=datetime(2024, 4, 1), attachments=[]),
+}
+
+
+async def fake_get_creator_post(service: str, creator_id: str, *, q: str = None, o: int = None):
+    if q is None:
+        return APIRet(data=list(reversed(POSTS.values())))
+    # Simulate a coarse server search, which also returns a non-matching post
+    return APIRet(data=[x for x in POSTS.values() if q.lower() in x.title.lower()] + [POSTS["3"]])
+
+
+class TestKeywordServerSearch:
+
+    @pytest.fixture(autouse=True)
+    def reset_config(self):
+        original_job = config.job
+        config.job = JobConfiguration(keywords_server_search=True)
+        yield
+        config.job = original_job
+
+    def test_can_search_keywords_on_server(self):
+        assert can_search_keywords_on_server({"comic", "sketch"}) is True
+        assert can_search_keywords_on_server({"comic", "ab"}) is False
+        assert can_search_keywords_on_server(set()) is False
+
+    @pytest.mark.asyncio
+    async def test_server_search_used(self, tmp_path):
+        with patch("ktoolbox.action.fetch.get_creator_post", side_effect=fake_get_creator_post) as mock_api:
+            ret = await create_job_from_creator(
+                service="fanbox",
+                creator_id="123",
+                path=tmp_path,
+                all_pages=True,
+                start_time=None,
+                end_time=None,
+                keywords={"comic"},
+                save_creator_indices=True
+            )
+        assert ret
+        assert all(call.kwargs["q"] == "comic" for call in mock_api.call_args_list)
+        # Extra server results are filtered locally
+        assert sorted(x.name for x in tmp_path.iterdir() if x.is_dir()) == ["Comic Part 1", "Comic Part 2"]
+
+    @pytest.mark.asyncio
+    async def test_fallback_for_partial_listing(self, tmp_path):
+        with patch("ktoolbox.action.fetch.get_creator_post", side_effect=fake_get_creator_post) as mock_api:
+            ret = await create_job_from_creator(
+                service="fanbox",
+                creator_id="123",
+                path=tmp_path,
+                all_pages=False,
+                length=10,
+                start_time=None,
+                end_time=None,
+                keywords={"comic"}
+            )
+        assert ret
+        assert all(call.kwargs["q"] is None for call in mock_api.call_args_list)
+
+    @pytest.mark.asyncio
+    async def test_fallback_for_short_keyword(self, tmp_path):
+        with patch("ktoolbox.action.fetch.get_creator_post", new_callable=AsyncMock) as mock_api:
+            mock_api.return_value = APIRet(data=[])
+            await create_job_from_creator(
+                service="fanbox",
+                creator_id="123",
+                path=tmp_path,
+                all_pages=True,
+                start_time=None,
+                end_time=None,
+                keywords={"ab"}
+            )
+        assert all(call.kwargs["q"] is None for call in mock_api.call_args_list)
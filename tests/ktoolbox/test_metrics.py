@@ -0,0 +1,86 @@
+from functools import partial
+
+import httpx
+import pytest
+
+from ktoolbox.configuration import config, DownloaderConfiguration, MonitorConfiguration
+from ktoolbox.job import Job
+from ktoolbox.job.runner import JobRunner
+from ktoolbox.monitor import MetricsRegistry, MetricsExporter, metrics, metrics_exporter
+
+
+def test_render():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_requests_total", "Requests", ["endpoint", "status"])
+    counter.labels("GetPost", "200").inc()
+    counter.labels("GetPost", "200").inc(2)
+    counter.labels("Get\"Post", "error").inc()
+    histogram = registry.histogram("test_latency_seconds", "Latency", ["endpoint"], buckets=[0.1, 1])
+    histogram.labels("GetPost").observe(0.05)
+    histogram.labels("GetPost").observe(0.5)
+    histogram.labels("GetPost").observe(5)
+    gauge = registry.gauge("test_depth", "Depth")
+    gauge.set_function(lambda: 7)
+    assert registry.render().splitlines() == [
+        "# HELP test_requests_total Requests",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{endpoint="GetPost",status="200"} 3',
+        'test_requests_total{endpoint="Get\\"Post",status="error"} 1',
+        "# HELP test_latency_seconds Latency",
+        "# TYPE test_latency_seconds histogram",
+        'test_latency_seconds_bucket{endpoint="GetPost",le="0.1"} 1',
+        'test_latency_seconds_bucket{endpoint="GetPost",le="1"} 2',
+        'test_latency_seconds_bucket{endpoint="GetPost",le="+Inf"} 3',
+        'test_latency_seconds_sum{endpoint="GetPost"} 5.55',
+        'test_latency_seconds_count{endpoint="GetPost"} 3',
+        "# HELP test_depth Depth",
+        "# TYPE test_depth gauge",
+        "test_depth 7"
+    ]
+    with pytest.raises(ValueError):
+        registry.counter("test_depth", "Duplicated")
+    with pytest.raises(ValueError):
+        counter.labels("GetPost")
+
+
+@pytest.mark.asyncio
+async def test_exporter(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("test_total", "Test").inc(3)
+    exporter = MetricsExporter(registry)
+    await exporter.start(port=0, textfile=tmp_path / "ktoolbox.prom")
+    try:
+        async with httpx.AsyncClient() as client:
+            res = await client.get(f"http://127.0.0.1:{exporter.port}/metrics")
+            assert res.status_code == 200
+            assert "test_total 3" in res.text.splitlines()
+            assert (await client.get(f"http://127.0.0.1:{exporter.port}/other")).status_code == 404
+    finally:
+        await exporter.stop()
+    assert exporter.port is None
+    assert "test_total 3" in (tmp_path / "ktoolbox.prom").read_text().splitlines()
+
+
+@pytest.mark.asyncio
+async def test_job_runner_metrics(tmp_path, monkeypatch):
+    original_downloader, original_monitor = config.downloader, config.monitor
+    config.downloader = DownloaderConfiguration(tps_limit=1000, keep_metadata=False)
+    config.monitor = MonitorConfiguration(metrics_textfile=tmp_path / "ktoolbox.prom")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=b"data")
+
+    monkeypatch.setattr(httpx, "AsyncClient", partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    downloaded_bytes = metrics.downloaded_bytes.value
+    succeeded = metrics.job_outcomes.labels("Success").value
+    try:
+        await JobRunner(job_list=[Job(path=tmp_path, alt_filename="a.png", server_path="/data/ab/cd/a.png")],
+                        progress=False).start()
+    finally:
+        config.downloader, config.monitor = original_downloader, original_monitor
+    assert metrics_exporter.running is False
+    assert metrics.downloaded_bytes.value == downloaded_bytes + 4
+    assert metrics.job_outcomes.labels("Success").value == succeeded + 1
+    lines = (tmp_path / "ktoolbox.prom").read_text().splitlines()
+    assert 'ktoolbox_jobs{state="waiting"} 0' in lines
+    assert f"ktoolbox_downloaded_bytes_total {int(downloaded_bytes) + 4}" in lines
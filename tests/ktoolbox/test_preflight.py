@@ -0,0 +1,113 @@
+from typing import List
+
+import httpx
+import pytest
+
+from ktoolbox._enum import PostFileTypeEnum, DataStorageNameEnum
+from ktoolbox.api.model import Post
+from ktoolbox.bench import StandInServer, generate_dataset
+from ktoolbox.cli import KToolBoxCli
+from ktoolbox.configuration import config, JobConfiguration
+from ktoolbox.job import Job, PreflightCache, run_preflight, probe_size
+
+SIZES = {"/data/aa/small.png": 100, "/data/bb/large.zip": 5000, "/data/cc/range.psd": 2000}
+
+
+def make_client(requests: List[httpx.Request]) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if (size := SIZES.get(request.url.path)) is None:
+            return httpx.Response(404)
+        # One file only answers range requests
+        if request.url.path.endswith(".psd"):
+            if request.method == "HEAD":
+                return httpx.Response(405)
+            return httpx.Response(206, headers={"Content-Range": f"bytes 0-0/{size}"}, content=b"x")
+        return httpx.Response(200, headers={"Content-Length": str(size)})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    post_a = Post(id="1", title="Post A")
+    post_b = Post(id="2", title="Post B")
+    return [
+        Job(path=tmp_path, server_path="/data/aa/small.png", type=PostFileTypeEnum.File, post=post_a),
+        Job(path=tmp_path, server_path="/data/bb/large.zip", type=PostFileTypeEnum.Attachment, post=post_a),
+        Job(path=tmp_path, server_path="/data/cc/range.psd", type=PostFileTypeEnum.Attachment, post=post_b),
+        Job(path=tmp_path, server_path="/data/dd/existed.png", alt_filename="existed.png", post=post_b),
+    ]
+
+
+@pytest.fixture(autouse=True)
+def job_config():
+    original_job = config.job
+    config.job = JobConfiguration()
+    yield
+    config.job = original_job
+
+
+class TestPreflight:
+
+    @pytest.mark.asyncio
+    async def test_probe_size(self):
+        async with make_client([]) as client:
+            assert await probe_size(client, "https://kemono.cr/data/aa/small.png") == 100
+            assert await probe_size(client, "https://kemono.cr/data/cc/range.psd") == 2000
+
+    @pytest.mark.asyncio
+    async def test_plan(self, tmp_path, jobs):
+        (tmp_path / "existed.png").touch()
+        cache = PreflightCache()
+        cache.record_throughput(1000)
+        cache.save(tmp_path)
+
+        requests = []
+        async with make_client(requests) as client:
+            plan = await run_preflight(jobs, tmp_path, client)
+        assert plan.existed == 1
+        assert (plan.total.count, plan.total.size, plan.total.unknown) == (3, 7100, 0)
+        assert plan.by_type["attachment"].size == 7000
+        assert plan.by_post[("2", "Post B")].count == 1
+        assert plan.eta == pytest.approx(7.1)
+        assert "Preflight plan" in plan.summary()
+
+        # Sizes are cached
+        async with make_client(requests) as client:
+            requests.clear()
+            plan = await run_preflight(jobs, tmp_path, client)
+        assert requests == []
+        assert plan.probed == 0
+        assert (tmp_path / DataStorageNameEnum.PreflightCacheData.value).is_file()
+
+    @pytest.mark.asyncio
+    async def test_size_filter(self, tmp_path, jobs):
+        config.job.min_file_size = 200
+        config.job.max_file_size = 3000
+        async with make_client([]) as client:
+            plan = await run_preflight(jobs, tmp_path, client)
+        assert [x.server_path for x in plan.jobs] == ["/data/cc/range.psd", "/data/dd/existed.png"]
+        assert plan.filtered == 2
+        # Unknown size is kept and counted
+        assert plan.total.unknown == 1
+        assert plan.eta is None
+
+    def test_throughput_samples(self):
+        cache = PreflightCache()
+        for x in range(20):
+            cache.record_throughput(x)
+        assert len(cache.throughput) == 10
+        assert cache.expected_throughput == 14.5
+
+
+@pytest.mark.asyncio
+async def test_sync_creator_dry_run_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.job, "extract_content", True)
+    monkeypatch.setattr(config.job, "extract_external_links", True)
+    monkeypatch.setattr(KToolBoxCli, "_update_checked", True)
+    with StandInServer(generate_dataset(posts=3, attachments=1, file_size=100, content=True)) as server, \
+            server.patch_config():
+        await KToolBoxCli.sync_creator(service="fanbox", creator_id="10000", path=tmp_path, dry_run=True)
+        assert server.stats().file_requests > 0
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,40 @@
+import pstats
+
+from ktoolbox.monitor import Profiler
+
+
+def allocate():
+    return [bytearray(1024) for _ in range(1000)]
+
+
+def test_profile(tmp_path):
+    profiler = Profiler()
+    profiler.stage("ignored")
+    profiler.start(memory=True, top=5)
+    data = allocate()
+    profiler.stage("listing")
+    profiler.sample_peak()
+    profiler.stop()
+    assert [x.name for x in profiler.stages] == ["listing", "peak"]
+    listing = profiler.stages[0]
+    assert len(listing.top) <= 5
+    assert listing.top[0][0].endswith("test_profiling.py:7")
+    assert listing.top[0][1] >= len(data) * 1024
+
+    profiler.write(tmp_path / "out.prof")
+    assert any(x[2] == "allocate" for x in pstats.Stats(str(tmp_path / "out.prof")).stats)
+    report = (tmp_path / "out.prof.txt").read_text()
+    assert "CPU profile, by cumulative time" in report
+    assert "Memory stage listing" in report
+    assert "Memory stage peak" in report
+
+
+def test_profile_without_memory(tmp_path):
+    profiler = Profiler()
+    profiler.start()
+    allocate()
+    profiler.stage("listing")
+    profiler.sample_peak()
+    profiler.stop()
+    assert profiler.stages == []
+    assert "allocate" in profiler.report()
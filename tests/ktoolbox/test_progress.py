@@ -1,7 +1,11 @@
 import asyncio
+import io
+import time
 import pytest
 from unittest.mock import Mock, patch
-from ktoolbox.progress import ProgressManager, ManagedTqdm, create_managed_tqdm_class, ColorTheme
+from loguru import logger
+from ktoolbox.progress import ProgressManager, ManagedTqdm, create_managed_tqdm_class, ColorTheme, \
+    ProgressAwareHandler, flush_suppressed_logs
 
 
 class TestProgressManager:
@@ -623,4 +627,115 @@ class TestEnhancedProgressManager:
         
         # Clean up
         pbar1.close()
-        pbar2.close()
\ No newline at end of file
+        pbar2.close()
+
+class _TtyStringIO(io.StringIO):
+    def isatty(self):
+        return True
+
+
+class TestLogPipeline:
+    """Test queued logging with progress display"""
+
+    @pytest.fixture
+    def log_handler(self):
+        original = io.StringIO()
+        handler = ProgressAwareHandler(original, burst=3, window=0.05)
+        handler_id = logger.add(handler, format="{message}", level="INFO")
+        yield handler, original
+        logger.remove(handler_id)
+
+    def test_queued_while_display_running(self, log_handler):
+        handler, original = log_handler
+        manager = ProgressManager(file=_TtyStringIO())
+        manager.start_display()
+        try:
+            started = time.perf_counter()
+            logger.info("hello")
+            assert time.perf_counter() - started < 0.04  # Never sleeps
+            assert original.getvalue() == ""
+            assert "hello" not in manager.file.getvalue()
+            manager.update_display()
+            assert "hello\n" in manager.file.getvalue()
+        finally:
+            manager.stop_display()
+        logger.info("after")
+        assert original.getvalue() == "after\n"
+
+    def test_pending_logs_written_on_stop(self, log_handler):
+        manager = ProgressManager(file=_TtyStringIO())
+        manager.start_display()
+        logger.info("last words")
+        manager.stop_display()
+        assert "last words\n" in manager.file.getvalue()
+
+    def test_similar_messages_suppressed(self, log_handler):
+        handler, original = log_handler
+        for i in range(10):
+            logger.info(f"Retrying ({i})")
+        logger.info("other")
+        assert original.getvalue().splitlines() == ["Retrying (0)", "Retrying (1)", "Retrying (2)", "other"]
+        time.sleep(0.06)
+        flush_suppressed_logs()
+        assert original.getvalue().splitlines()[-1] == "Retrying (9) (7 similar messages suppressed)"
+        logger.info("Retrying (10)")
+        assert original.getvalue().splitlines()[-1] == "Retrying (10)"
+
+    def test_errors_not_suppressed(self, log_handler):
+        handler, original = log_handler
+        for i in range(10):
+            logger.error(f"Download failed ({i})")
+        assert len(original.getvalue().splitlines()) == 10
+
+    def test_summaries_flushed_on_stop(self, log_handler):
+        handler, original = log_handler
+        for i in range(5):
+            logger.warning(f"Retrying ({i})")
+        # Window not ended, but the display stops (e.g. the run finished)
+        ProgressManager(file=io.StringIO()).stop_display()
+        assert original.getvalue().splitlines()[-1] == "Retrying (4) (2 similar messages suppressed)"
+
+
+class TestIncrementalRenderer:
+    """Test lock-free counters, EWMA rates and incremental redraw"""
+
+    def test_update_is_lock_free(self):
+        manager = ProgressManager()
+        pbar = ManagedTqdm(desc="test", total=100, initial=10, manager=manager)
+        manager._lock = Mock(__enter__=Mock(side_effect=AssertionError("locked")), __exit__=Mock())
+        pbar.update(5)
+        assert manager._progress_bars[pbar.progress_id].current == 15
+
+    def test_ewma_rate(self):
+        manager = ProgressManager()
+        pbar = ManagedTqdm(desc="test", total=None, initial=1000, manager=manager)
+        state = manager._progress_bars[pbar.progress_id]
+        # Resumed bytes are not counted as rate
+        state._rate_time -= 1
+        pbar.update(1000)
+        manager._sample_rates()
+        assert state.rate == pytest.approx(1000, rel=0.05)
+        # A stalled sample moves the rate smoothly instead of dropping it to zero
+        state._rate_time -= 0.5
+        manager._sample_rates()
+        assert 0 < state.rate < 1000
+
+    def test_redraw_changed_lines_only(self):
+        manager = ProgressManager(file=_TtyStringIO(), use_colors=False, use_emojis=False)
+        manager._running = True
+        manager._redraw(["a", "b", "c"])
+        manager.file.truncate(0)
+        manager.file.seek(0)
+        manager._redraw(["a", "B", "c"])
+        assert manager.file.getvalue() == "\033[3A\n\r\033[2KB\n\n"
+        # Line count changed, redraw all
+        manager._redraw(["a", "B"])
+        assert manager.file.getvalue().endswith("a\nB\n")
+
+    def test_render_interval_extended_when_slow(self):
+        manager = ProgressManager(file=_TtyStringIO(), update_interval=0.1, max_render_cpu=0.05)
+        manager._running = True
+        manager.set_job_totals(10)
+        with patch.object(manager, "_render_progress_bars", side_effect=lambda: time.sleep(0.02) or []):
+            manager.update_display()
+        assert manager.render_interval >= 0.4
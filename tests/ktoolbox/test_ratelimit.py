@@ -0,0 +1,109 @@
+import asyncio
+import time
+from datetime import time as dt_time
+
+import pytest
+
+from ktoolbox.configuration import config, DownloaderConfiguration
+from ktoolbox.downloader import TokenBucket, BandwidthLimiter, parse_schedule
+
+
+class TestSchedule:
+
+    def test_parse(self):
+        rules = parse_schedule(["01:00-07:00=1", "07:00-01:00=0.2", "00:00-24:00=0.5"])
+        assert rules[0].match(dt_time(3, 0)) is True
+        assert rules[0].match(dt_time(7, 0)) is False
+        # Wraps around midnight
+        assert rules[1].match(dt_time(23, 0)) is True
+        assert rules[1].match(dt_time(0, 30)) is True
+        assert rules[1].match(dt_time(3, 0)) is False
+        assert rules[2].match(dt_time(23, 59, 59)) is True
+
+    @pytest.mark.parametrize("rule", ["01:00=1", "01:00-07:00", "1-7=1", "01:00-07:00=0"])
+    def test_invalid(self, rule):
+        with pytest.raises(ValueError):
+            parse_schedule([rule])
+
+    def test_invalid_config_ignored(self):
+        original_downloader = config.downloader
+        config.downloader = DownloaderConfiguration(bandwidth_limit=1000, bandwidth_schedule=["bad"])
+        try:
+            limiter = BandwidthLimiter.from_config()
+        finally:
+            config.downloader = original_downloader
+        assert limiter.enabled is True
+
+
+class TestTokenBucket:
+
+    @pytest.mark.asyncio
+    async def test_rate(self):
+        bucket = TokenBucket(10000)
+        await bucket.acquire(10000)  # Drain the initial burst
+        started = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire(500)
+        assert 0.25 <= time.monotonic() - started < 0.6
+
+    @pytest.mark.asyncio
+    async def test_unlimited(self):
+        bucket = TokenBucket()
+        started = time.monotonic()
+        for _ in range(1000):
+            await bucket.acquire(1 << 30)
+        assert time.monotonic() - started < 0.5
+
+    @pytest.mark.asyncio
+    async def test_fair_between_flows(self):
+        bucket = TokenBucket(20000)
+        await bucket.acquire(20000)
+        finished = []
+
+        async def download(flow: str, chunks: int):
+            for _ in range(chunks):
+                await bucket.acquire(1000, flow)
+            finished.append(flow)
+
+        # Flow "a" has more concurrent downloads, but "b" is served in turn
+        await asyncio.gather(*[download("a", 3) for _ in range(4)], download("b", 3))
+        assert finished.index("b") < 3
+
+    @pytest.mark.asyncio
+    async def test_set_rate_at_runtime(self):
+        bucket = TokenBucket(100)
+        await bucket.acquire(100)
+        task = asyncio.create_task(bucket.acquire(100))
+        await asyncio.sleep(0.05)
+        bucket.set_rate(None)
+        await asyncio.wait_for(task, 0.5)
+
+
+class TestBandwidthLimiter:
+
+    @pytest.mark.asyncio
+    async def test_disabled(self):
+        limiter = BandwidthLimiter()
+        assert limiter.enabled is False
+        await limiter.acquire(1 << 30, host="n1.kemono.cr", creator="1")
+        assert limiter.stats().bytes == 1 << 30
+
+    @pytest.mark.asyncio
+    async def test_per_creator(self):
+        limiter = BandwidthLimiter(per_creator=10000)
+        await limiter.acquire(10000, creator=("fanbox", "1"))
+        started = time.monotonic()
+        await limiter.acquire(10000, creator=("fanbox", "2"))  # Another creator has its own bucket
+        await limiter.acquire(10000, creator=("patreon", "1"))  # Same ID on another service is another creator
+        assert time.monotonic() - started < 0.1
+        await limiter.acquire(3000, creator=("fanbox", "1"))
+        assert time.monotonic() - started >= 0.25
+
+    @pytest.mark.asyncio
+    async def test_schedule_factor(self):
+        limiter = BandwidthLimiter(10000, schedule=parse_schedule(["00:00-24:00=0.5"]))
+        await limiter.acquire(1)
+        assert limiter.factor == 0.5
+        assert limiter._global.rate == 5000
+        limiter.set_limits(20000)
+        assert limiter._global.rate == 10000
@@ -0,0 +1,93 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from ktoolbox._enum import RetCodeEnum
+from ktoolbox.configuration import config, DownloaderConfiguration
+from ktoolbox.downloader import Downloader, StagingArea, preallocate
+from ktoolbox.downloader import staging as staging_module
+
+
+def test_preallocate_keeps_size(tmp_path):
+    path = tmp_path / "file"
+    with open(path, "wb") as f:
+        f.write(b"data")
+        f.flush()
+        reserved = preallocate(f.fileno(), 4, 1 << 20)
+    assert os.stat(path).st_size == 4
+    if reserved:
+        assert os.stat(path).st_blocks * 512 >= 1 << 20
+
+
+class TestStagingArea:
+
+    def test_temp_path(self, tmp_path):
+        assert StagingArea().temp_path(tmp_path / "a.png") == tmp_path / "a.png.tmp"
+        staging = StagingArea(tmp_path / "staging")
+        temp_path = staging.temp_path(tmp_path / "a.png")
+        assert temp_path.parent == tmp_path / "staging"
+        assert temp_path == staging.temp_path(tmp_path / "a.png")
+        assert temp_path != staging.temp_path(tmp_path / "other" / "a.png")
+
+    @pytest.mark.asyncio
+    async def test_promote_bounded(self, tmp_path, monkeypatch):
+        staging = StagingArea(tmp_path / "staging", move_concurrency=1)
+        library = tmp_path / "library"
+        library.mkdir()
+        active = []
+        peak = []
+        original_move = staging_module._move
+
+        def move(src, dst):
+            active.append(src)
+            peak.append(len(active))
+            try:
+                return original_move(src, dst)
+            finally:
+                active.remove(src)
+
+        monkeypatch.setattr(staging_module, "_move", move)
+        temps = []
+        for i in range(4):
+            temp = staging.temp_path(library / f"{i}.bin")
+            temp.write_bytes(b"x" * i)
+            temps.append(temp)
+        results = await asyncio.gather(*[staging.promote(temps[i], library / f"{i}.bin") for i in range(4)])
+        assert results == [library / f"{i}.bin.tmp" for i in range(4)]
+        assert max(peak) == 1
+        assert list((tmp_path / "staging").iterdir()) == []
+        assert staging.stats().moved == 4
+        assert staging.stats().moved_bytes == 6
+
+
+@pytest.mark.asyncio
+async def test_download_through_staging(tmp_path):
+    original_downloader = config.downloader
+    config.downloader = DownloaderConfiguration(
+        tps_limit=1000,
+        keep_metadata=False,
+        preallocate=True,
+        staging_path=tmp_path / "staging"
+    )
+    library = tmp_path / "library"
+    library.mkdir()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=b"data" * 1000)
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            ret = await Downloader(
+                "https://n1.kemono.cr/data/ab/cd/file.bin",
+                library,
+                client,
+                server_path="/data/ab/cd/file.bin"
+            ).run()
+    finally:
+        config.downloader = original_downloader
+    assert ret.code == RetCodeEnum.Success
+    assert (library / "file.bin").read_bytes() == b"data" * 1000
+    assert [x.name for x in library.iterdir()] == ["file.bin"]
+    assert list((tmp_path / "staging").iterdir()) == []
@@ -0,0 +1,89 @@
+from datetime import datetime
+from unittest.mock import patch, AsyncMock
+
+import pytest
+
+from ktoolbox.action import generate_filename, generate_post_path_name
+from ktoolbox.action.template import PostTemplate, DateTemplate, TemplateError, validate_templates
+from ktoolbox.api.model import Post
+from ktoolbox.cli import KToolBoxCli
+from ktoolbox.configuration import config, JobConfiguration
+
+
+@pytest.fixture
+def post():
+    return Post(
+        id="123",
+        user="456",
+        service="fanbox",
+        title="HiEveryoneThisIsALongTitle",
+        published=datetime(2024, 1, 2)
+    )
+
+
+class TestPostTemplate:
+
+    def test_only_referenced_fields(self):
+        template = PostTemplate("[{published}]{id}", "`test`")
+        assert template.fields == ("published", "id")
+        assert template.positional is False
+
+    def test_render(self, post):
+        assert PostTemplate("[{published}]{title:.6}", "`test`")(post) == "[2024-01-02]HiEver"
+        assert PostTemplate("{id}_{}", "`test`", allow_positional=True)(post, "cover") == "123_cover"
+
+    def test_missing_date(self, post):
+        assert PostTemplate("{edited}_{id}", "`test`")(post) == "_123"
+
+    def test_memoized(self, post):
+        template = PostTemplate("{title}", "`test`")
+        template(post)
+        template(post.model_copy())
+        assert template._format.cache_info().hits == 1
+
+    @pytest.mark.parametrize("template", ["{name}", "{title", "{title:d}", "{}"])
+    def test_invalid(self, template):
+        with pytest.raises(TemplateError):
+            PostTemplate(template, "`test`")
+
+
+class TestDateTemplate:
+
+    def test_render(self):
+        assert DateTemplate("{year}-{month:02d}", "`test`")(datetime(2024, 3, 1)) == "2024-03"
+
+    def test_invalid(self):
+        with pytest.raises(TemplateError, match="invalid key"):
+            DateTemplate("{day}", "`test`")
+
+
+class TestValidateTemplates:
+
+    @pytest.fixture(autouse=True)
+    def reset_config(self):
+        original_job = config.job
+        config.job = JobConfiguration()
+        yield
+        config.job = original_job
+
+    def test_default_config_valid(self):
+        validate_templates()
+
+    def test_invalid_config(self):
+        with pytest.raises(TemplateError, match="post_dirname_format"):
+            validate_templates(JobConfiguration(post_dirname_format="{unknown}"))
+
+    def test_generate_functions(self, post):
+        config.job.post_dirname_format = "[{published}]{id}"
+        assert generate_post_path_name(post) == "[2024-01-02]123"
+        assert generate_filename(post, "image.png", "{title:.2}_{}") == "Hi_image.png"
+
+    @pytest.mark.asyncio
+    async def test_cli_fails_fast(self, tmp_path):
+        config.job.filename_format = "{unknown}_{}"
+        with patch("ktoolbox.cli.check_for_updates", new_callable=AsyncMock) as mock_update, \
+                patch("ktoolbox.cli.get_post_api", new_callable=AsyncMock) as mock_get_post:
+            ret = await KToolBoxCli.download_post(service="fanbox", creator_id="1", post_id="2", path=tmp_path)
+        assert "filename_format" in ret
+        mock_update.assert_not_called()
+        mock_get_post.assert_not_called()
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import pytest
+
+from ktoolbox.__main__ import pop_option
+from ktoolbox.monitor import Tracer, tracer, traced
+
+
+def test_disabled_span_is_shared():
+    disabled = Tracer()
+    assert disabled.span("a") is disabled.span("b")
+    with disabled.span("a"):
+        pass
+    assert disabled.summary() == []
+
+
+@pytest.mark.asyncio
+async def test_trace(tmp_path):
+    test_tracer = Tracer()
+    test_tracer.start()
+
+    async def stage(delay: float):
+        with test_tracer.span("stage", "test", delay=delay):
+            await asyncio.sleep(delay)
+
+    await asyncio.gather(stage(0.01), stage(0.02))
+    with pytest.raises(ValueError):
+        with test_tracer.span("failed"):
+            raise ValueError
+    test_tracer.stop()
+    with test_tracer.span("ignored"):
+        pass
+
+    summary = {x.name: x for x in test_tracer.summary()}
+    assert set(summary) == {"stage", "failed"}
+    assert summary["stage"].count == 2
+    assert summary["stage"].total >= 0.03
+    assert summary["stage"].max >= 0.02
+    assert "stage" in test_tracer.format_summary()
+
+    test_tracer.write(tmp_path / "trace.json")
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    spans = [x for x in events if x["ph"] == "X"]
+    assert len({x["tid"] for x in spans if x["name"] == "stage"}) == 2
+    assert next(x for x in spans if x["name"] == "failed")["args"] == {"error": "ValueError"}
+    assert len([x for x in events if x["name"] == "thread_name"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_traced():
+    @traced("decorated")
+    async def func(x):
+        return x
+
+    tracer.start()
+    try:
+        assert await func(1) == 1
+    finally:
+        tracer.stop()
+    assert [x.name for x in tracer.summary()] == ["decorated"]
+
+
+def test_pop_option():
+    assert pop_option(["download-post", "--trace", "out.json", "--url", "x"], "--trace") == \
+           (["download-post", "--url", "x"], "out.json")
+    assert pop_option(["--trace=out.json", "sync-creator"], "--trace") == (["sync-creator"], "out.json")
+    assert pop_option(["sync-creator", "--trace"], "--trace") == (["sync-creator", "--trace"], None)
+    assert pop_option(["sync-creator", "--profile-memory"], "--profile-memory", flag=True) == (["sync-creator"], True)
+    assert pop_option(["sync-creator"], "--profile-memory", flag=True) == (["sync-creator"], None)
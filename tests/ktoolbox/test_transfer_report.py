@@ -0,0 +1,90 @@
+import csv
+import json
+from functools import partial
+
+import httpx
+import pytest
+
+from ktoolbox.configuration import config, DownloaderConfiguration, MonitorConfiguration
+from ktoolbox.downloader import TransferRecord, TransferReport, percentile
+from ktoolbox.job import Job
+from ktoolbox.job.runner import JobRunner
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([3], 90) == 3
+    assert percentile([], 50) is None
+
+
+def test_csv_report(tmp_path):
+    report = TransferReport(tmp_path / "report.csv")
+    report.add(
+        TransferRecord(
+            server_path="/data/ab/cd/a.png",
+            hosts=["n1.kemono.cr", "n2.kemono.cr"],
+            transfer_bytes=100,
+            transfer_time=0.5,
+            retries=1,
+            retry_reasons=["Download failed"],
+            outcome="Success"
+        )
+    )
+    report.write()
+    with open(tmp_path / "report.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1
+    assert rows[0]["hosts"] == "n1.kemono.cr n2.kemono.cr"
+    assert rows[0]["retry_reasons"] == "Download failed"
+    assert float(rows[0]["throughput"]) == 200
+    assert not TransferReport()
+
+
+@pytest.mark.asyncio
+async def test_job_runner_report(tmp_path, monkeypatch):
+    original_downloader, original_monitor = config.downloader, config.monitor
+    config.downloader = DownloaderConfiguration(tps_limit=1000, keep_metadata=False)
+    config.monitor = MonitorConfiguration(transfer_report=tmp_path / "report.json")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=b"data")
+
+    monkeypatch.setattr(httpx, "AsyncClient", partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    (tmp_path / "b.png").write_bytes(b"data")
+    jobs = [
+        Job(path=tmp_path, alt_filename="a.png", server_path="/data/ab/cd/a.png"),
+        Job(path=tmp_path, alt_filename="b.png", server_path="/data/ab/cd/b.png"),
+        Job(path=tmp_path, alt_filename="c.png", server_path="/data/ab/cd/a.png")
+    ]
+    try:
+        await JobRunner(job_list=jobs, progress=False).start()
+    finally:
+        config.downloader, config.monitor = original_downloader, original_monitor
+
+    report = json.loads((tmp_path / "report.json").read_text(encoding="utf-8"))
+    records = {x["filename"]: x for x in report["records"]}
+    downloaded = records["a.png"]
+    assert downloaded["outcome"] == "Success"
+    assert downloaded["source"] == "origin"
+    assert downloaded["filename"] == "a.png"
+    assert downloaded["status"] == 200
+    assert downloaded["bytes"] == downloaded["transfer_bytes"] == 4
+    assert downloaded["offset"] == 0
+    assert downloaded["hosts"] == [downloaded["host"]]
+    assert downloaded["ttfb"] is not None
+    assert downloaded["duration"] >= downloaded["transfer_time"]
+    assert records["b.png"]["outcome"] == "FileExisted"
+    assert records["b.png"]["source"] is None
+    shared = records["c.png"]
+    assert (shared["source"], shared["host"], shared["bytes"]) == ("shared", None, 0)
+    assert shared["transfer_bytes"] == shared["total"] == 4
+    assert shared["transfer_time"] is not None
+    summary = report["summary"]
+    assert summary["jobs"] == 3
+    assert summary["outcomes"] == {"Success": 2, "FileExisted": 1}
+    assert summary["bytes"] == 4
+    assert list(summary["hosts"]) == [downloaded["host"]]
+    assert summary["throughput"]["p50"] == downloaded["throughput"]
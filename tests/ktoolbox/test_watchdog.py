@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+import pytest
+
+from ktoolbox.monitor import LoopWatchdog, metrics
+
+
+def block():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_attributes_blocking():
+    watchdog = LoopWatchdog(0.1, interval=0.01)
+    watchdog.start()
+    try:
+        await asyncio.sleep(0.05)
+        block()
+        await asyncio.sleep(0.05)
+    finally:
+        await watchdog.stop()
+    stats = watchdog.stats()
+    assert len(stats) == 1
+    assert stats[0].location.endswith("test_watchdog.py:10 (block)")
+    assert stats[0].count == 1
+    assert 0.25 < stats[0].total < 1
+    assert "block()" in stats[0].stack
+    assert metrics.loop_blocked.labels(stats[0].location).value == stats[0].total
+
+
+@pytest.mark.asyncio
+async def test_watchdog_disabled():
+    watchdog = LoopWatchdog(None)
+    assert not watchdog
+    watchdog.start()
+    block()
+    await watchdog.stop()
+    assert watchdog.stats() == []